@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
 from app.core.errors import forbidden, unauthorized
+from app.core.principals import Principal, resolve_principal
 from app.core.security import decode_token
 from app.db.models import User, UserRole
 from app.db.session import get_db
@@ -19,7 +20,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[Session, Depends(get_db)],
-) -> User:
+) -> Principal:
     settings = get_settings()
     try:
         payload = decode_token(token, secret=settings.jwt_secret, algorithm=settings.jwt_algorithm)
@@ -29,13 +30,14 @@ def get_current_user(
     except Exception:
         raise unauthorized()
 
-    user = db.get(User, user_id)
-    if not user:
+    # The session only opens a connection on a cache miss.
+    principal = resolve_principal(user_id, lambda uid: db.get(User, uid))
+    if principal is None:
         raise unauthorized()
-    return user
+    return principal
 
 
-def require_admin(user: Annotated[User, Depends(get_current_user)]) -> User:
+def require_admin(user: Annotated[Principal, Depends(get_current_user)]) -> Principal:
     if user.role != UserRole.admin:
         raise forbidden("Admin privileges required")
     return user
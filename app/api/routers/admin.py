@@ -6,8 +6,10 @@ from sqlalchemy.orm import Session
 
 from app.api.deps import require_admin
 from app.core.errors import bad_request, not_found, forbidden
+from app.core.principals import Principal, invalidate_principal
 from app.db.models import User, UserRole
 from app.db.session import get_db
+from app.services.storage import collect_garbage
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -25,7 +27,7 @@ def _to_out(user: User) -> dict:
 @router.get("/users", status_code=status.HTTP_200_OK)
 def list_users(
     db: Session = Depends(get_db),
-    me: User = Depends(require_admin),
+    me: Principal = Depends(require_admin),
 ) -> list[dict]:
     users = db.query(User).order_by(User.created_at.asc()).all()
     return [_to_out(u) for u in users]
@@ -34,7 +36,7 @@ def list_users(
 def promote_user(
     user_id: str,
     db: Session = Depends(get_db),
-    me: User = Depends(require_admin),
+    me: Principal = Depends(require_admin),
 ) -> dict:
     user = db.get(User, user_id)
     if not user:
@@ -42,6 +44,7 @@ def promote_user(
     if user.role != UserRole.admin:
         user.role = UserRole.admin
         db.commit()
+        invalidate_principal(user.id)
         db.refresh(user)
     return _to_out(user)
 
@@ -49,7 +52,7 @@ def promote_user(
 def demote_user(
     user_id: str,
     db: Session = Depends(get_db),
-    me: User = Depends(require_admin),
+    me: Principal = Depends(require_admin),
 ) -> dict:
     user = db.get(User, user_id)
     if not user:
@@ -69,6 +72,7 @@ def demote_user(
 
     user.role = UserRole.user
     db.commit()
+    invalidate_principal(user.id)
     db.refresh(user)
     return _to_out(user)
 
@@ -76,7 +80,7 @@ def demote_user(
 def delete_user(
     user_id: str,
     db: Session = Depends(get_db),
-    me: User = Depends(require_admin),
+    me: Principal = Depends(require_admin),
 ) -> dict:
     user = db.get(User, user_id)
     if not user:
@@ -92,4 +96,14 @@ def delete_user(
 
     db.delete(user)
     db.commit()
+    invalidate_principal(user_id)
     return {"id": user_id, "deleted": True}
+
+
+@router.post("/storage/gc", status_code=status.HTTP_200_OK)
+def collect_storage_garbage(
+    db: Session = Depends(get_db),
+    me: Principal = Depends(require_admin),
+) -> dict:
+    # Removes uploaded files no artifact references any more (e.g. after deleting a user).
+    return collect_garbage(db)
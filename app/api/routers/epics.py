@@ -1,32 +1,41 @@
 from __future__ import annotations
 
+import itertools
 import json
+from dataclasses import asdict
+from functools import partial
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
-from app.core.config import get_settings
 from app.core.errors import bad_request, forbidden, not_found
-from app.db.models import Epic, EpicBatch, EpicBatchStatus, EpicStatus, Project, ResearchAppendix, Run, RunStatus, User
+from app.core.principals import Principal
+from app.db.models import Epic, EpicBatch, EpicBatchStatus, EpicStatus, Project, ResearchAppendix, Run, RunStatus
 from app.db.session import get_db
 from app.schemas.epics import (
     EpicApproveRequest,
     EpicBatchResponse,
     EpicGenerateRequest,
+    EpicRegenerateRequest,
     EpicResponse,
     EpicUpdateRequest,
 )
-from app.services.epic_generation import generate_epics, make_mermaid_dependency_graph
+from app.services.epic_regeneration import changed_epic_ids, regenerate_epic_batch_job
+from app.services.late_upgrades import upgrade_epic_batch
+from app.services.llm_deadline import DeferredUpgrade
+from app.services.epic_generation import GeneratedEpic, generate_epics, make_mermaid_dependency_graph
+from app.services.llm_scheduler import llm_request_context
+from app.services.research_passages import relevant_passages
 from app.services.run_events import emit_run_event
-from app.services.storage import project_root
+from app.services.storage import get_storage, run_key
 
 
 router = APIRouter(prefix="/projects", tags=["epics"])
 
 
-def _ensure_project_owner(db: Session, *, project_id: str, user: User) -> Project:
+def _ensure_project_owner(db: Session, *, project_id: str, user: Principal) -> Project:
     project = db.get(Project, project_id)
     if not project:
         raise not_found("Project not found")
@@ -49,7 +58,7 @@ def generate_project_epics(
     project_id: str,
     payload: EpicGenerateRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> EpicBatchResponse:
     project = _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -67,14 +76,46 @@ def generate_project_epics(
 
     emit_run_event(db, run_id=run.id, event_type="epics.started", message="Epic generation started")
 
+    partial_index = itertools.count()
+
+    def _emit_partial(e: GeneratedEpic) -> None:
+        idx = next(partial_index)
+        emit_run_event(
+            db,
+            run_id=run.id,
+            event_type="epics.partial",
+            message=f"Epic {idx + 1} ready: {e.title}",
+            payload={"index": idx, "epic": asdict(e)},
+        )
+
+    def _reset_partials() -> None:
+        # The deadline fallback or a hedged request replaced what was streamed; clients drop it and start over.
+        nonlocal partial_index
+        partial_index = itertools.count()
+        emit_run_event(
+            db,
+            run_id=run.id,
+            event_type="epics.partial_reset",
+            message="Streamed epics discarded; replacements follow",
+        )
+
     citations = json.loads(research.urls_json) if research.urls_json else []
-    gen = generate_epics(
-        product_request=project.product_request,
-        research_summary=research.summary,
-        citations=citations,
-        constraints=constraints,
-        count=count,
+    passages = relevant_passages(
+        db, project_id=project_id, appendix=research, query=f"{project.product_request}\n{constraints}"
     )
+    upgrade = DeferredUpgrade()
+    with llm_request_context(user_id=str(user.id), run_id=str(run.id)):
+        gen = generate_epics(
+            product_request=project.product_request,
+            research_summary=research.summary,
+            citations=citations,
+            constraints=constraints,
+            count=count,
+            research_passages=passages,
+            on_epic=_emit_partial,
+            on_upgrade=upgrade.deliver,
+            on_reset=_reset_partials,
+        )
 
     batch = EpicBatch(project_id=project_id, run_id=run.id, constraints=constraints, status=EpicBatchStatus.generated)
     db.add(batch)
@@ -107,17 +148,17 @@ def generate_project_epics(
     mermaid = make_mermaid_dependency_graph(gen)
 
     # Persist Mermaid diagram artifact
-    settings = get_settings()
-    run_dir = project_root(project_id) / "runs" / run.id
-    run_dir.mkdir(parents=True, exist_ok=True)
-    mmd_path = run_dir / "epic_dependency_graph.mmd"
-    mmd_path.write_text(mermaid, encoding="utf-8")
+    storage = get_storage()
+    mmd_key = run_key(project_id, run.id, "epic_dependency_graph.mmd")
+    storage.write_text(mmd_key, mermaid)
 
     emit_run_event(db, run_id=run.id, event_type="epics.generated", message=f"Generated {len(epic_rows)} epics")
-    emit_run_event(db, run_id=run.id, event_type="epics.mermaid", message="Mermaid dependency graph saved", payload={"path": str(mmd_path)})
+    emit_run_event(db, run_id=run.id, event_type="epics.mermaid", message="Mermaid dependency graph saved", payload={"path": storage.uri(mmd_key)})
 
     run.status = RunStatus.completed
     db.commit()
+    # A fallback result is replaced in place if the LLM finishes after its deadline.
+    upgrade.bind(partial(upgrade_epic_batch, batch_id=batch.id, run_id=run.id))
 
     epics_resp: list[EpicResponse] = []
     for row in db.query(Epic).filter(Epic.batch_id == batch.id).order_by(Epic.created_at.asc()).all():
@@ -158,7 +199,7 @@ def generate_project_epics(
 def get_latest_epic_batch(
     project_id: str,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> EpicBatchResponse:
     _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -171,6 +212,11 @@ def get_latest_epic_batch(
     if not batch:
         raise not_found("No epic batch found. Generate epics first.")
 
+    return _batch_response(db, batch)
+
+
+def _batch_response(db: Session, batch: EpicBatch) -> EpicBatchResponse:
+    project_id = batch.project_id
     epics = db.query(Epic).filter(Epic.batch_id == batch.id).order_by(Epic.created_at.asc()).all()
     epics_resp = [
         EpicResponse(
@@ -199,10 +245,7 @@ def get_latest_epic_batch(
     if batch.run_id:
         run = db.get(Run, batch.run_id)
         if run:
-            settings = get_settings()
-            mmd_path = project_root(project_id) / "runs" / run.id / "epic_dependency_graph.mmd"
-            if mmd_path.exists():
-                mermaid = mmd_path.read_text(encoding="utf-8", errors="ignore")
+            mermaid = get_storage().read_text(run_key(project_id, run.id, "epic_dependency_graph.mmd")) or ""
 
     return EpicBatchResponse(
         batch_id=batch.id,
@@ -222,7 +265,7 @@ def approve_epic_batch(
     batch_id: str,
     payload: EpicApproveRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> dict:
     _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -247,7 +290,7 @@ def update_epic_status(
     epic_id: str,
     payload: EpicUpdateRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> dict:
     epic = db.get(Epic, epic_id)
     if not epic:
@@ -258,7 +301,38 @@ def update_epic_status(
         raise forbidden("You can only update your own epics")
 
     epic.status = payload.status
+    if payload.feedback is not None:
+        # Used as the revision brief by partial regeneration.
+        epic.feedback = payload.feedback.strip() or None
     db.commit()
 
-    # Feedback is accepted but not persisted yet (kept simple for Milestone 3).
     return {"message": "Updated", "epic_id": epic_id, "status": epic.status}
+
+
+@router.post("/{project_id}/epics/{batch_id}/regenerate", response_model=EpicBatchResponse, status_code=status.HTTP_201_CREATED)
+def regenerate_changed_epics(
+    project_id: str,
+    batch_id: str,
+    payload: EpicRegenerateRequest,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> EpicBatchResponse:
+    _ensure_project_owner(db, project_id=project_id, user=user)
+
+    source = db.get(EpicBatch, batch_id)
+    if not source or source.project_id != project_id:
+        raise not_found("Epic batch not found")
+    if not changed_epic_ids(db, batch_id=batch_id):
+        raise bad_request("No rejected or changes_requested epics to regenerate in this batch.")
+
+    constraints = (payload.constraints if payload.constraints is not None else source.constraints or "").strip()
+
+    run = Run(project_id=project_id, run_type="epic_regeneration", status=RunStatus.started)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+
+    result = regenerate_epic_batch_job(project_id=project_id, source_batch_id=batch_id, run_id=run.id, constraints=constraints)
+
+    db.expire_all()
+    return _batch_response(db, db.get(EpicBatch, result["batch_id"]))
@@ -3,23 +3,32 @@ from __future__ import annotations
 import uuid
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, UploadFile, status
+import anyio
+from fastapi import APIRouter, Depends, File, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
 from app.core.config import get_settings
 from app.core.errors import bad_request, forbidden, not_found
-from app.db.models import Artifact, Project, User
+from app.core.principals import Principal
+from app.db.models import Artifact, Project
 from app.db.session import get_db
 from app.schemas.projects import ProjectCreate, ProjectResponse, ProjectWithArtifactsResponse
-from app.services.storage import save_pdf_upload, validate_pdf_bytes
+from app.services.job_queue import enqueue_job
+from app.services.pdf_processing import PdfRejected, validate_pdf
+from app.services.pdf_text import JOB_PDF_TEXT, has_pdf_text
+from app.services.artifact_downloads import download_response
+from app.services.project_export import EXPORT_FORMATS, iter_project_ndjson, iter_project_zip
+from app.services.project_import import ImportResponse, import_projects
+from app.services.storage import UploadTooLarge, artifact_location, blob_key, discard_upload, get_storage, stage_upload, store_blob
 
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
 
 @router.post("", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
-def create_project(payload: ProjectCreate, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> ProjectResponse:
+def create_project(payload: ProjectCreate, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)) -> ProjectResponse:
     product_request = (payload.product_request or "").strip()
     if not product_request:
         raise bad_request("Product Request cannot be empty")
@@ -31,14 +40,29 @@ def create_project(payload: ProjectCreate, db: Session = Depends(get_db), user:
     return ProjectResponse.model_validate(project)
 
 
+@router.post("/import")
+async def import_projects_ndjson(
+    request: Request,
+    start_research: bool = Query(default=False),
+    user: Principal = Depends(get_current_user),
+) -> ImportResponse:
+    """
+    Bulk-creates projects from an NDJSON body, one {"product_request": "..."} per line, optionally starting backlog
+    research for each. Responds with an NDJSON stream: one result per input line, then a summary.
+    """
+    if start_research and not get_settings().tavily_api_key:
+        raise bad_request("Milestone 2 requires web research: set TAVILY_API_KEY in .env")
+    return ImportResponse(import_projects(request.stream(), owner_id=user.id, start_research=start_research))
+
+
 @router.get("", response_model=list[ProjectResponse])
-def list_my_projects(db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> list[ProjectResponse]:
+def list_my_projects(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)) -> list[ProjectResponse]:
     projects = db.query(Project).filter(Project.owner_id == user.id).order_by(Project.created_at.desc()).all()
     return [ProjectResponse.model_validate(p) for p in projects]
 
 
 @router.get("/{project_id}", response_model=ProjectWithArtifactsResponse)
-def get_project(project_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> ProjectWithArtifactsResponse:
+def get_project(project_id: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)) -> ProjectWithArtifactsResponse:
     project = db.get(Project, project_id)
     if not project:
         raise not_found("Project not found")
@@ -56,16 +80,67 @@ def get_project(project_id: str, db: Session = Depends(get_db), user: User = Dep
             "content_type": a.content_type,
             "size_bytes": a.size_bytes,
             "created_at": a.created_at,
+            "download_url": f"{get_settings().api_v1_prefix}/projects/{project_id}/artifacts/{a.id}/download",
         } for a in artifacts],
     )
 
 
+@router.get("/{project_id}/artifacts/{artifact_id}/download")
+def download_artifact(
+    project_id: str,
+    artifact_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> Response:
+    """The uploaded file itself; supports Range requests and conditional GET (ETag is the content SHA-256)."""
+    project = db.get(Project, project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only access your own projects")
+
+    artifact = db.get(Artifact, artifact_id)
+    if not artifact or artifact.project_id != project_id:
+        raise not_found("Artifact not found")
+
+    storage, key = artifact_location(artifact.path)
+    return download_response(request, key, filename=artifact.original_filename, media_type=artifact.content_type, storage=storage)
+
+
+@router.get("/{project_id}/export")
+def export_project(
+    project_id: str,
+    format: str = Query(default="zip"),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> StreamingResponse:
+    """
+    The whole project (research, epics, stories, specs, Mermaid graphs, uploads) as a zip, or as NDJSON records.
+    Streamed while it is generated, so memory use does not grow with the project.
+    """
+    project = db.get(Project, project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only export your own projects")
+    if format not in EXPORT_FORMATS:
+        raise bad_request(f"Unknown format: {format} (expected one of {', '.join(EXPORT_FORMATS)})")
+
+    if format == "ndjson":
+        body, media_type = iter_project_ndjson(project_id), "application/x-ndjson"
+    else:
+        body, media_type = iter_project_zip(project_id), "application/zip"
+    headers = {"Content-Disposition": f'attachment; filename="project-{project_id}.{format}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
 @router.post("/{project_id}/documents", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def upload_project_pdf(
     project_id: str,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> dict:
     project = db.get(Project, project_id)
     if not project:
@@ -79,29 +154,50 @@ async def upload_project_pdf(
     settings = get_settings()
     max_bytes = settings.max_upload_mb * 1024 * 1024
 
-    raw = await file.read()
-    if not raw:
-        raise bad_request("Uploaded file is empty")
-    if len(raw) > max_bytes:
+    # Streamed to a temp file in chunks: the size limit applies as bytes arrive and the SHA-256 is computed
+    # on the way, so memory per upload stays constant whatever the file size.
+    try:
+        staged = await stage_upload(file.read, max_bytes=max_bytes)
+    except UploadTooLarge:
         raise bad_request(f"File too large (max {settings.max_upload_mb}MB)")
+    if staged.size_bytes == 0:
+        discard_upload(staged)
+        raise bad_request("Uploaded file is empty")
 
-    try:
-        validate_pdf_bytes(raw)
-    except Exception:
-        raise bad_request("Unsupported or corrupted PDF document")
+    # Bytes already in the blob store were validated when first uploaded.
+    if not await get_storage().aexists(blob_key(staged.sha256)):
+        try:
+            await validate_pdf(staged.path)
+        except PdfRejected as ex:
+            discard_upload(staged)
+            if ex.reason == "timeout":
+                raise bad_request(f"PDF could not be processed in time (max {settings.pdf_timeout_seconds:g}s)")
+            raise bad_request("Unsupported or corrupted PDF document")
 
-    stored_path = save_pdf_upload(project_id=project_id, filename=file.filename, content=raw)
+    # Content-addressed: the same document uploaded to any number of projects is stored once.
+    stored_key, _ = await store_blob(db, staged)
 
     artifact = Artifact(
         project_id=project_id,
         kind="supporting_document_pdf",
-        path=str(stored_path.as_posix()),
+        path=stored_key,
         original_filename=file.filename,
         content_type=file.content_type or "application/pdf",
-        size_bytes=len(raw),
+        size_bytes=staged.size_bytes,
     )
     db.add(artifact)
     db.commit()
     db.refresh(artifact)
 
-    return {"artifact_id": artifact.id, "project_id": project_id, "message": "PDF uploaded"}
+    # Text is extracted in the background; a re-upload of the same content already has it.
+    text_extraction = "cached" if await anyio.to_thread.run_sync(has_pdf_text, stored_key) else "queued"
+    if text_extraction == "queued":
+        enqueue_job(db, kind=JOB_PDF_TEXT, payload={"path": artifact.path, "artifact_id": artifact.id})
+
+    return {
+        "artifact_id": artifact.id,
+        "project_id": project_id,
+        "sha256": staged.sha256,
+        "text_extraction": text_extraction,
+        "message": "PDF uploaded",
+    }
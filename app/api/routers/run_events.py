@@ -1,25 +1,28 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
+import gzip
+from email.utils import parsedate_to_datetime
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
-from app.core.config import get_settings
 from app.core.errors import forbidden, not_found
-from app.db.models import Project, ResearchAppendix, Run, RunEvent, User
+from app.core.principals import Principal
+from app.db.models import Project, ResearchAppendix, Run, RunEvent, RunUsage
 from app.db.session import get_db
 from app.schemas.research import ResearchAppendixResponse
-from app.schemas.run_events import RunEventResponse
+from app.schemas.run_events import RunEventResponse, RunUsageResponse
+from app.services.artifact_downloads import download_response
+from app.services.research_store import load_appendix, read_raw_notes_gzip
+from app.services.storage import run_key
 
 
 router = APIRouter(prefix="/runs", tags=["run-events"])
 
 
 @router.get("/{run_id}/events", response_model=list[RunEventResponse])
-def list_run_events(run_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> list[RunEventResponse]:
+def list_run_events(run_id: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)) -> list[RunEventResponse]:
     run = db.get(Run, run_id)
     if not run:
         raise not_found("Run not found")
@@ -45,8 +48,43 @@ def list_run_events(run_id: str, db: Session = Depends(get_db), user: User = Dep
     ]
 
 
-@router.get("/{run_id}/research", response_model=ResearchAppendixResponse)
-def get_research_appendix(run_id: str, db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> ResearchAppendixResponse:
+@router.get("/{run_id}/usage", response_model=RunUsageResponse)
+def get_run_usage(run_id: str, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)) -> RunUsageResponse:
+    run = db.get(Run, run_id)
+    if not run:
+        raise not_found("Run not found")
+
+    project = db.get(Project, run.project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only access your own runs")
+
+    # Runs that made no LLM calls (deterministic fallback, research) report zero usage.
+    usage = db.get(RunUsage, run_id)
+    return RunUsageResponse(
+        run_id=run_id,
+        llm_calls=usage.llm_calls if usage else 0,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0,
+        cost_usd=usage.cost_usd if usage else 0.0,
+    )
+
+
+def _not_modified(request: Request, *, etag: str, last_modified: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _own_appendix(db: Session, run_id: str, user: Principal) -> ResearchAppendix:
     run = db.get(Run, run_id)
     if not run:
         raise not_found("Run not found")
@@ -60,18 +98,97 @@ def get_research_appendix(run_id: str, db: Session = Depends(get_db), user: User
     appendix = db.query(ResearchAppendix).filter(ResearchAppendix.run_id == run_id).one_or_none()
     if not appendix:
         raise not_found("Research appendix not found for this run")
+    return appendix
+
+
+@router.get("/{run_id}/research", response_model=ResearchAppendixResponse)
+def get_research_appendix(
+    run_id: str,
+    request: Request,
+    response: Response,
+    include_raw_notes: bool = False,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> ResearchAppendixResponse | Response:
+    """
+    Research appendix with ETag/Last-Modified validators (304 when unchanged).
+    The raw search notes are left out unless include_raw_notes=true; GET /runs/{run_id}/research/raw_notes serves them alone.
+    """
+    appendix = _own_appendix(db, run_id, user)
+    parsed = load_appendix(appendix)
+    etag = parsed.etag if not include_raw_notes else f'{parsed.etag[:-1]}-raw"'
+    validators = {"ETag": etag, "Last-Modified": parsed.last_modified, "Cache-Control": "private, no-cache"}
+    if _not_modified(request, etag=etag, last_modified=parsed.last_modified):
+        return Response(status_code=304, headers=validators)
+    response.headers.update(validators)
 
-    settings = get_settings()
-    md_path = settings.storage_root / Path(appendix.markdown_path)
-    markdown = md_path.read_text(encoding="utf-8", errors="ignore") if md_path.exists() else ""
+    markdown = parsed.markdown
+    if include_raw_notes:
+        raw = read_raw_notes_gzip(appendix)
+        if raw is not None:
+            markdown += "\n## Raw Search Notes\n```json\n" + gzip.decompress(raw).decode("utf-8") + "\n```\n"
 
     return ResearchAppendixResponse(
         id=appendix.id,
         project_id=appendix.project_id,
         run_id=appendix.run_id,
         markdown=markdown,
-        urls=json.loads(appendix.urls_json),
+        urls=parsed.urls,
         summary=appendix.summary,
         impact=appendix.impact,
         created_at=appendix.created_at,
     )
+
+
+@router.get("/{run_id}/research/raw_notes")
+def get_research_raw_notes(
+    run_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> Response:
+    """Raw Tavily results (JSON) for the run; sent gzip-encoded as stored when the client accepts it."""
+    appendix = _own_appendix(db, run_id, user)
+    raw = read_raw_notes_gzip(appendix)
+    if raw is None:
+        raise not_found("Raw search notes not found for this run")
+
+    parsed = load_appendix(appendix)
+    etag = f'{parsed.etag[:-1]}-notes"'
+    validators = {"ETag": etag, "Last-Modified": parsed.last_modified, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if _not_modified(request, etag=etag, last_modified=parsed.last_modified):
+        return Response(status_code=304, headers=validators)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(content=raw, media_type="application/json", headers={**validators, "Content-Encoding": "gzip"})
+    return Response(content=gzip.decompress(raw), media_type="application/json", headers=validators)
+
+
+# Files a run leaves in storage that can be downloaded as-is.
+_RUN_FILES = {
+    "research.md": "text/markdown; charset=utf-8",
+    "epic_dependency_graph.mmd": "text/plain; charset=utf-8",
+}
+
+
+@router.get("/{run_id}/files/{name}")
+def download_run_file(
+    run_id: str,
+    name: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> Response:
+    """A run's research markdown or Mermaid graph as a file; supports Range requests and conditional GET."""
+    if name not in _RUN_FILES:
+        raise not_found("Unknown run file")
+    run = db.get(Run, run_id)
+    if not run:
+        raise not_found("Run not found")
+
+    project = db.get(Project, run.project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only access your own runs")
+
+    return download_response(request, run_key(run.project_id, run_id, name), filename=name, media_type=_RUN_FILES[name])
@@ -2,25 +2,67 @@ from __future__ import annotations
 
 import json
 
-from fastapi import APIRouter, BackgroundTasks, Depends, status
+from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
 from app.core.config import get_settings
 from app.core.errors import bad_request
 from app.core.errors import forbidden, not_found
-from app.db.models import Project, ResearchAppendix, Run, RunStatus, User
+from app.core.principals import Principal
+from app.db.models import Project, ResearchAppendix, Run, RunStatus
 from app.db.session import SessionLocal, get_db
-from app.schemas.runs import RunResponse
-from app.services.research import build_research_appendix_markdown, tavily_search
+from app.schemas.research import SimilarResearchResponse
+from app.schemas.runs import BacklogRunRequest, RunResponse
+from app.services.job_queue import JOB_RESEARCH, enqueue_job, job_handler
+from app.services.research import ResearchBatch, ResearchQueriesFailed, build_raw_search_notes, build_research_appendix_markdown, search_tavily_queries
+from app.services.research_cache import get_cached_searches, store_searches
+from app.services.research_similarity import find_similar_appendices, index_appendix, is_reusable_by, reuse_appendix, reused_summary
+from app.services.research_store import write_raw_notes
 from app.services.run_events import emit_run_event
-from app.services.storage import project_root
+from app.services.storage import get_storage, run_key
 
 
 router = APIRouter(prefix="/projects", tags=["runs"])
 
 
-def _run_research_job(*, project_id: str, run_id: str, product_request: str) -> None:
+def _finish_research(db: Session, *, run_id: str, payload: dict) -> None:
+    emit_run_event(db, run_id=run_id, event_type="research.completed", message="Research complete", payload=payload)
+    emit_run_event(db, run_id=run_id, event_type="epics.pending", message="Epic generation will start in Milestone 3")
+    run = db.get(Run, run_id)
+    if run:
+        run.status = RunStatus.completed
+        db.commit()
+
+
+def _reuse_source(db: Session, *, run_id: str, product_request: str, reuse_appendix_id: str | None) -> tuple[ResearchAppendix | None, float | None]:
+    """The appendix to copy instead of searching: the one asked for, or (RESEARCH_REUSE_MODE=auto) the best similar one."""
+    if reuse_appendix_id:
+        return db.get(ResearchAppendix, reuse_appendix_id), None
+    mode = get_settings().research_reuse_mode
+    if mode == "off":
+        return None, None
+    similar = find_similar_appendices(db, product_request=product_request)
+    if not similar:
+        return None, None
+    if mode == "auto":
+        return db.get(ResearchAppendix, similar[0].appendix_id), similar[0].similarity
+    emit_run_event(
+        db,
+        run_id=run_id,
+        event_type="research.similar_found",
+        message=f"{len(similar)} earlier research appendices match this product request",
+        payload={"candidates": [{"appendix_id": c.appendix_id, "similarity": c.similarity} for c in similar]},
+    )
+    return None, None
+
+
+@job_handler(JOB_RESEARCH)
+def _run_research_job(*, project_id: str, run_id: str, product_request: str, reuse_appendix_id: str | None = None) -> None:
+    """
+    Runs on a job-queue worker. Raising hands the failure to the queue, which retries with backoff and
+    marks the run failed once attempts are exhausted.
+    """
     settings = get_settings()
     if not settings.tavily_api_key:
         # Mandatory in Milestone 2.
@@ -42,37 +84,83 @@ def _run_research_job(*, project_id: str, run_id: str, product_request: str) ->
 
     db = SessionLocal()
     try:
+        # A retry of an attempt that failed after committing the appendix (while indexing or finishing) only
+        # completes what is left: a second appendix for the run would violate its unique run_id.
+        done = db.query(ResearchAppendix).filter(ResearchAppendix.run_id == run_id).one_or_none()
+        if done is not None:
+            index_appendix(db, appendix_id=done.id, product_request=product_request)
+            _finish_research(db, run_id=run_id, payload={"url_count": len(json.loads(done.urls_json)), "resumed": True})
+            return
+
         emit_run_event(db, run_id=run_id, event_type="research.started", message="Research in progress")
 
+        source, similarity = _reuse_source(db, run_id=run_id, product_request=product_request, reuse_appendix_id=reuse_appendix_id)
+        if source is not None:
+            appendix = reuse_appendix(db, source, project_id=project_id, run_id=run_id, product_request=product_request)
+            index_appendix(db, appendix_id=appendix.id, product_request=product_request)
+            _finish_research(
+                db,
+                run_id=run_id,
+                payload={
+                    "url_count": len(json.loads(appendix.urls_json)),
+                    "reused_from": {"appendix_id": source.id, "similarity": similarity},
+                },
+            )
+            return
+
         queries = [
             f"Best practices, security, and common requirements for: {product_request}",
             f"Risks, constraints, and edge cases for: {product_request}",
         ]
 
-        searches = [
-            tavily_search(
-                api_key=settings.tavily_api_key,
-                query=q,
-                max_results=settings.research_max_results,
-                search_depth=settings.research_search_depth,
-                include_answer="basic",
+        cached = get_cached_searches(
+            db, queries=queries, search_depth=settings.research_search_depth, max_results=settings.research_max_results
+        )
+        misses = [q for q in queries if q not in cached]
+        batch = ResearchBatch(searches=[], failures=[])
+        if misses:
+            # All queries go out at once; a failed or slow query is dropped rather than failing the run.
+            try:
+                batch = search_tavily_queries(
+                    api_key=settings.tavily_api_key,
+                    queries=misses,
+                    max_results=settings.research_max_results,
+                    search_depth=settings.research_search_depth,
+                    include_answer="basic",
+                    timeout_seconds=settings.research_query_timeout_seconds,
+                    search_url=settings.tavily_search_url,
+                    max_connections=settings.research_max_connections,
+                )
+            except ResearchQueriesFailed as ex:
+                # Only the run's own searches failing outright fails it; with cached results there is still research.
+                if not cached:
+                    raise
+                batch = ResearchBatch(searches=[], failures=ex.failures)
+        failed = {f.query for f in batch.failures}
+        fresh = dict(zip([q for q in misses if q not in failed], batch.searches))
+        store_searches(db, searches=fresh, search_depth=settings.research_search_depth, max_results=settings.research_max_results)
+        searches = [cached.get(q) or fresh[q] for q in queries if q in cached or q in fresh]
+        for failure in batch.failures:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="research.query_failed",
+                message=f"Research query failed: {failure.error}",
+                payload={"query": failure.query, "error": failure.error},
             )
-            for q in queries
-        ]
 
         md, urls, summary, impact = build_research_appendix_markdown(product_request=product_request, searches=searches)
 
-        # Persist markdown to filesystem
-        run_dir = project_root(project_id) / "runs" / run_id
-        run_dir.mkdir(parents=True, exist_ok=True)
-        md_path = run_dir / "research.md"
-        md_path.write_text(md, encoding="utf-8")
+        # Persist markdown to storage
+        md_key = run_key(project_id, run_id, "research.md")
+        get_storage().write_text(md_key, md)
+        write_raw_notes(project_id, run_id, build_raw_search_notes(searches))
 
         # Persist appendix row
         appendix = ResearchAppendix(
             project_id=project_id,
             run_id=run_id,
-            markdown_path=str(md_path.relative_to(settings.storage_root).as_posix()),
+            markdown_path=md_key,
             urls_json=json.dumps(urls, ensure_ascii=False),
             summary=summary,
             impact=impact,
@@ -80,30 +168,28 @@ def _run_research_job(*, project_id: str, run_id: str, product_request: str) ->
         db.add(appendix)
         db.commit()
         db.refresh(appendix)
+        index_appendix(db, appendix_id=appendix.id, product_request=product_request)
 
-        emit_run_event(
+        _finish_research(
             db,
             run_id=run_id,
-            event_type="research.completed",
-            message="Research complete",
-            payload={"url_count": len(urls)},
+            payload={
+                "url_count": len(urls),
+                "query_count": len(queries),
+                "failed_query_count": len(batch.failures),
+                "cached_query_count": len(cached),
+                "cache_hit": len(cached) == len(queries),
+            },
         )
-        emit_run_event(db, run_id=run_id, event_type="epics.pending", message="Epic generation will start in Milestone 3")
-        run = db.get(Run, run_id)
-        if run:
-            run.status = RunStatus.completed
-            db.commit()
     except Exception as ex:
+        db.rollback()
         emit_run_event(
             db,
             run_id=run_id,
             event_type="research.error",
             message=f"Research failed: {type(ex).__name__}",
         )
-        run = db.get(Run, run_id)
-        if run:
-            run.status = RunStatus.failed
-            db.commit()
+        raise
     finally:
         db.close()
 
@@ -111,9 +197,9 @@ def _run_research_job(*, project_id: str, run_id: str, product_request: str) ->
 @router.post("/{project_id}/runs/backlog", response_model=RunResponse, status_code=status.HTTP_202_ACCEPTED)
 def start_backlog_generation(
     project_id: str,
-    background_tasks: BackgroundTasks,
+    payload: BacklogRunRequest | None = None,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> RunResponse:
     project = db.get(Project, project_id)
     if not project:
@@ -125,17 +211,30 @@ def start_backlog_generation(
     if not settings.tavily_api_key:
         raise bad_request("Milestone 2 requires web research: set TAVILY_API_KEY in .env")
 
+    reuse_appendix_id = payload.reuse_appendix_id if payload else None
+    if reuse_appendix_id:
+        # Only the caller's own research, or research /research/similar offers for this project, can be copied.
+        source = db.get(ResearchAppendix, reuse_appendix_id)
+        if source is None or not is_reusable_by(db, source, owner_id=user.id, product_request=project.product_request):
+            raise not_found("Research appendix not found")
+
     run = Run(project_id=project_id, run_type="backlog_generation", status=RunStatus.started)
     db.add(run)
     db.commit()
     db.refresh(run)
 
     emit_run_event(db, run_id=run.id, event_type="run.started", message="Backlog Generation Started")
-    background_tasks.add_task(
-        _run_research_job,
-        project_id=project_id,
+    # Durable: picked up by an embedded or standalone worker, and re-run if that worker dies mid-job.
+    enqueue_job(
+        db,
+        kind=JOB_RESEARCH,
         run_id=run.id,
-        product_request=project.product_request,
+        payload={
+            "project_id": project_id,
+            "run_id": run.id,
+            "product_request": project.product_request,
+            "reuse_appendix_id": reuse_appendix_id,
+        },
     )
 
     return RunResponse(
@@ -145,3 +244,33 @@ def start_backlog_generation(
         status=run.status,
         message="Backlog Generation Started",
     )
+
+
+@router.get("/{project_id}/research/similar", response_model=list[SimilarResearchResponse])
+def list_similar_research(
+    project_id: str,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> list[SimilarResearchResponse]:
+    project = db.get(Project, project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only access your own projects")
+
+    # Candidates may come from other users' projects: expose the research, never their product request.
+    out: list[SimilarResearchResponse] = []
+    for match in find_similar_appendices(db, product_request=project.product_request):
+        if match.project_id == project_id:
+            continue
+        appendix = db.get(ResearchAppendix, match.appendix_id)
+        out.append(
+            SimilarResearchResponse(
+                appendix_id=appendix.id,
+                similarity=match.similarity,
+                summary=reused_summary(db, appendix, product_request=project.product_request),
+                url_count=len(json.loads(appendix.urls_json)),
+                created_at=appendix.created_at,
+            )
+        )
+    return out
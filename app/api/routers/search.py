@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user
+from app.core.errors import bad_request, forbidden, not_found
+from app.core.principals import Principal
+from app.db.models import Project
+from app.db.session import get_db
+from app.schemas.search import SearchHitResponse
+from app.services.search_index import SEARCH_KINDS, search_project
+
+
+router = APIRouter(prefix="/projects", tags=["search"])
+
+
+@router.get("/{project_id}/search", response_model=list[SearchHitResponse])
+def search_project_backlog(
+    project_id: str,
+    q: str = Query(min_length=1, max_length=200),
+    kind: list[str] | None = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> list[SearchHitResponse]:
+    project = db.get(Project, project_id)
+    if not project:
+        raise not_found("Project not found")
+    if project.owner_id != user.id:
+        raise forbidden("You can only search your own projects")
+    unknown = sorted(set(kind or []) - set(SEARCH_KINDS))
+    if unknown:
+        raise bad_request(f"Unknown kind: {', '.join(unknown)} (expected one of {', '.join(SEARCH_KINDS)})")
+
+    hits = search_project(db, project_id=project_id, query=q, kinds=kind, limit=limit)
+    return [SearchHitResponse(kind=h.kind, ref_id=h.ref_id, title=h.title, snippet=h.snippet, score=h.score) for h in hits]
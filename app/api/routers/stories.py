@@ -1,28 +1,38 @@
 
 from __future__ import annotations
 
+import itertools
 import json
+from dataclasses import asdict
 from functools import partial
 
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
+from app.core.config import get_settings
 from app.core.errors import bad_request, forbidden, not_found
+from app.core.principals import Principal
 from app.db.models import (
-    Project, Epic, EpicStatus, Run, RunStatus,
-    StoryBatch, Story, StoryBatchStatus, StoryStatus, User,
+    Project, Epic, EpicBatch, EpicStatus, Run, RunStatus,
+    StoryBatch, Story, StoryBatchStatus, StoryStatus,
 )
 from app.db.session import get_db
 from app.schemas.stories import (
     StoryGenerateRequest, StoryBatchResponse, StoryResponse, StoryApproveRequest, StoryUpdateRequest,
+    StoryGenerateAllRequest, StoryFanoutResponse,
 )
+from app.services.late_upgrades import upgrade_story_batch
+from app.services.llm_deadline import DeferredUpgrade
+from app.services.llm_scheduler import llm_request_context
+from app.services.research_passages import relevant_passages
 from app.services.run_events import emit_run_event
-from app.services.story_generation import generate_stories
+from app.services.story_fanout import approved_epic_ids, generate_stories_for_epic_batch_job
+from app.services.story_generation import GeneratedStory, generate_stories
 
 router = APIRouter(prefix="/projects", tags=["stories"])
 
-def _ensure_project_owner(db: Session, *, project_id: str, user: User) -> Project:
+def _ensure_project_owner(db: Session, *, project_id: str, user: Principal) -> Project:
     project = db.get(Project, project_id)
     if not project:
         raise not_found("Project not found")
@@ -35,7 +45,7 @@ def generate_epic_stories(
     project_id: str,
     payload: StoryGenerateRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> StoryBatchResponse:
     _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -55,13 +65,43 @@ def generate_epic_stories(
 
     emit_run_event(db, run_id=run.id, event_type="stories.started", message="Story generation started")
 
-    gen = generate_stories(
-        product_request=db.get(Project, project_id).product_request,
-        epic_title=epic.title,
-        epic_goal=epic.goal,
-        constraints=constraints,
-        count=count,
-    )
+    partial_index = itertools.count()
+
+    def _emit_partial(s: GeneratedStory) -> None:
+        idx = next(partial_index)
+        emit_run_event(
+            db,
+            run_id=run.id,
+            event_type="stories.partial",
+            message=f"Story {idx + 1} ready",
+            payload={"index": idx, "epic_id": epic.id, "story": asdict(s)},
+        )
+
+    def _reset_partials() -> None:
+        nonlocal partial_index
+        partial_index = itertools.count()
+        emit_run_event(
+            db,
+            run_id=run.id,
+            event_type="stories.partial_reset",
+            message="Streamed stories discarded; replacements follow",
+            payload={"epic_id": epic.id},
+        )
+
+    passages = relevant_passages(db, project_id=project_id, query=f"{epic.title}\n{epic.goal}\n{constraints}")
+    upgrade = DeferredUpgrade()
+    with llm_request_context(user_id=str(user.id), run_id=str(run.id)):
+        gen = generate_stories(
+            product_request=db.get(Project, project_id).product_request,
+            epic_title=epic.title,
+            epic_goal=epic.goal,
+            constraints=constraints,
+            count=count,
+            research_passages=passages,
+            on_story=_emit_partial,
+            on_upgrade=upgrade.deliver,
+            on_reset=_reset_partials,
+        )
 
     batch = StoryBatch(project_id=project_id, epic_id=epic.id, run_id=run.id, constraints=constraints, status=StoryBatchStatus.generated)
     db.add(batch)
@@ -91,6 +131,8 @@ def generate_epic_stories(
     emit_run_event(db, run_id=run.id, event_type="stories.generated", message=f"Generated {len(story_rows)} stories")
     run.status = RunStatus.completed
     db.commit()
+    # A fallback result is replaced in place if the LLM finishes after its deadline.
+    upgrade.bind(partial(upgrade_story_batch, batch_id=batch.id, run_id=run.id))
 
     stories_resp: list[StoryResponse] = []
     for row in db.query(Story).filter(Story.batch_id == batch.id).order_by(Story.created_at.asc()).all():
@@ -124,12 +166,69 @@ def generate_epic_stories(
         stories=stories_resp,
     )
 
+@router.post("/{project_id}/stories/generate_all", response_model=StoryFanoutResponse, status_code=status.HTTP_201_CREATED)
+def generate_all_epic_stories(
+    project_id: str,
+    payload: StoryGenerateAllRequest,
+    db: Session = Depends(get_db),
+    user: Principal = Depends(get_current_user),
+) -> StoryFanoutResponse:
+    _ensure_project_owner(db, project_id=project_id, user=user)
+
+    if payload.batch_id:
+        epic_batch = db.get(EpicBatch, payload.batch_id)
+        if not epic_batch or epic_batch.project_id != project_id:
+            raise not_found("Epic batch not found")
+    else:
+        epic_batch = (
+            db.query(EpicBatch)
+            .filter(EpicBatch.project_id == project_id)
+            .order_by(EpicBatch.created_at.desc())
+            .first()
+        )
+        if not epic_batch:
+            raise not_found("No epic batch found. Generate epics first.")
+
+    epic_ids = approved_epic_ids(db, epic_batch_id=epic_batch.id)
+    if not epic_ids:
+        raise bad_request("User stories require an approved epic (Milestone 3 approval gate).")
+
+    settings = get_settings()
+    cap = max(1, settings.story_fanout_concurrency)
+    concurrency = max(1, min(int(payload.concurrency or cap), cap))
+    constraints = (payload.constraints or "").strip()
+    count = max(1, min(int(payload.count), 25))
+
+    run = Run(project_id=project_id, run_type="story_generation_all", status=RunStatus.started)
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+
+    result = generate_stories_for_epic_batch_job(
+        project_id=project_id,
+        run_id=run.id,
+        epic_ids=epic_ids,
+        constraints=constraints,
+        count=count,
+        concurrency=concurrency,
+    )
+    db.refresh(run)
+
+    return StoryFanoutResponse(
+        run_id=run.id,
+        project_id=project_id,
+        epic_batch_id=epic_batch.id,
+        status=run.status,
+        batches=result["batches"],
+        failed=result["failed"],
+    )
+
 @router.get("/{project_id}/stories", response_model=StoryBatchResponse)
 def get_latest_story_batch(
     project_id: str,
     epic_id: str,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> StoryBatchResponse:
     _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -180,7 +279,7 @@ def approve_story_batch(
     batch_id: str,
     payload: StoryApproveRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> dict:
     _ensure_project_owner(db, project_id=project_id, user=user)
 
@@ -204,7 +303,7 @@ def update_story_status(
     story_id: str,
     payload: StoryUpdateRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> dict:
     row = db.get(Story, story_id)
     if not row:
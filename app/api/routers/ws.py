@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import asyncio
 import anyio
+import itertools
 import json
+from dataclasses import asdict
 from functools import partial
 from typing import Any, Iterable
 
@@ -15,6 +17,7 @@ from fastapi import status
 from app.core.config import get_settings
 from app.api.deps import get_current_user  # if used in this file
 from app.core.errors import forbidden, not_found, bad_request  # as used
+from app.core.principals import Principal, resolve_principal
 from app.core.events import broker
 from app.db.session import SessionLocal, get_db
 from app.db.models import (
@@ -23,8 +26,19 @@ from app.db.models import (
     ResearchAppendix,
     StoryBatch, Story, StoryBatchStatus, StoryStatus,SpecDocument, SpecStatus
 )
+from app.services.epic_generation import generate_epics, make_mermaid_dependency_graph
 from app.services.spec_generation import generate_spec_for_story
+from app.services.story_generation import generate_stories
+from app.services.epic_regeneration import changed_epic_ids, regenerate_epic_batch_job
+from app.services.late_upgrades import upgrade_epic_batch, upgrade_spec_document, upgrade_story_batch
+from app.services.llm_deadline import DeferredUpgrade
+from app.services.llm_scheduler import llm_request_context
+from app.services.research_passages import relevant_passages
 from app.services.run_events import emit_run_event
+from app.services.storage import get_storage, run_key
+from app.services.single_flight import flight_key, single_flight
+from app.services.spec_fanout import approved_story_ids, generate_specs_for_stories_job, save_spec_document
+from app.services.story_fanout import approved_epic_ids, generate_stories_for_epic_batch_job
 
 router = APIRouter(tags=["websocket"])
 
@@ -41,6 +55,22 @@ def _decode_ws_jwt_or_none(token: str | None) -> str | None:
         return None
 
 
+def _load_user(user_id: str) -> User | None:
+    db = SessionLocal()
+    try:
+        return db.get(User, user_id)
+    finally:
+        db.close()
+
+
+def _ws_principal(token: str | None) -> Principal | None:
+    """The principal of a valid token whose user still exists; served from the principal cache when possible."""
+    user_id = _decode_ws_jwt_or_none(token)
+    if not user_id:
+        return None
+    return resolve_principal(user_id, _load_user)
+
+
 def _latest_research(db: Session, *, project_id: str) -> ResearchAppendix | None:
     return (
         db.query(ResearchAppendix)
@@ -95,14 +125,45 @@ def _generate_epics_job(*, project_id: str, run_id: str, constraints: str, count
 
         emit_run_event(db, run_id=run_id, event_type="epics.started", message="Epic generation started")
 
+        partial_index = itertools.count()
+
+        def _emit_partial(e) -> None:
+            idx = next(partial_index)
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="epics.partial",
+                message=f"Epic {idx + 1} ready: {e.title}",
+                payload={"index": idx, "epic": asdict(e)},
+            )
+
+        def _reset_partials() -> None:
+            nonlocal partial_index
+            partial_index = itertools.count()
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="epics.partial_reset",
+                message="Streamed epics discarded; replacements follow",
+            )
+
         citations = json.loads(research.urls_json) if research.urls_json else []
-        gen = generate_epics(
-            product_request=project.product_request,
-            research_summary=research.summary,
-            citations=citations,
-            constraints=constraints,
-            count=count,
+        passages = relevant_passages(
+            db, project_id=project_id, appendix=research, query=f"{project.product_request}\n{constraints}"
         )
+        upgrade = DeferredUpgrade()
+        with llm_request_context(user_id=str(project.owner_id), run_id=run_id):
+            gen = generate_epics(
+                product_request=project.product_request,
+                research_summary=research.summary,
+                citations=citations,
+                constraints=constraints,
+                count=count,
+                research_passages=passages,
+                on_epic=_emit_partial,
+                on_upgrade=upgrade.deliver,
+                on_reset=_reset_partials,
+            )
 
         batch = EpicBatch(project_id=project_id, run_id=run_id, constraints=constraints, status=EpicBatchStatus.generated)
         db.add(batch)
@@ -133,10 +194,9 @@ def _generate_epics_job(*, project_id: str, run_id: str, constraints: str, count
 
         mermaid = make_mermaid_dependency_graph(gen)
 
-        run_dir = project_root(project_id) / "runs" / run_id
-        run_dir.mkdir(parents=True, exist_ok=True)
-        mmd_path = run_dir / "epic_dependency_graph.mmd"
-        mmd_path.write_text(mermaid, encoding="utf-8")
+        storage = get_storage()
+        mmd_key = run_key(project_id, run_id, "epic_dependency_graph.mmd")
+        storage.write_text(mmd_key, mermaid)
 
         epics_payload = _epics_summary(epic_rows)
 
@@ -152,15 +212,16 @@ def _generate_epics_job(*, project_id: str, run_id: str, constraints: str, count
             run_id=run_id,
             event_type="epics.mermaid",
             message="Mermaid dependency graph saved",
-            payload={"path": str(mmd_path)},
+            payload={"path": storage.uri(mmd_key)},
         )
 
         run = db.get(Run, run_id)
         if run:
             run.status = RunStatus.completed
             db.commit()
+        upgrade.bind(partial(upgrade_epic_batch, batch_id=str(batch.id), run_id=run_id))
 
-        return {"batch_id": str(batch.id), "constraints": constraints, "epics": epics_payload, "mermaid_path": str(mmd_path)}
+        return {"batch_id": str(batch.id), "constraints": constraints, "epics": epics_payload, "mermaid_path": storage.uri(mmd_key)}
 
     except Exception as ex:
         try:
@@ -181,6 +242,100 @@ def _generate_epics_job(*, project_id: str, run_id: str, constraints: str, count
         db.close()
 
 
+def _generate_spec_job(*, project_id: str, story_id: str, run_id: str, constraints: str, feedback: str) -> dict[str, Any]:
+    """
+    Worker thread job.
+    Generates and persists the next spec version; emits specs.started/partial/generated; returns the specs.summary message.
+    """
+    db = SessionLocal()
+    try:
+        story = db.get(Story, story_id)
+        project = db.get(Project, project_id)
+
+        emit_run_event(db, run_id=run_id, event_type="specs.started", message="Spec generation started")
+
+        def _emit_partial(section: str, value: Any) -> None:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="specs.partial",
+                message=f"Spec section ready: {section}",
+                payload={"story_id": story_id, "section": section, "value": value},
+            )
+
+        def _reset_partials() -> None:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="specs.partial_reset",
+                message="Streamed spec sections discarded; replacements follow",
+                payload={"story_id": story_id},
+            )
+
+        upgrade = DeferredUpgrade()
+        with llm_request_context(user_id=str(project.owner_id), run_id=run_id):
+            spec_payload = generate_spec_for_story(
+                product_request=project.product_request,
+                story_statement=story.statement,
+                acceptance_criteria=json.loads(story.acceptance_criteria_json or "[]"),
+                constraints=constraints,
+                feedback=feedback,
+                on_section=_emit_partial,
+                on_upgrade=upgrade.deliver,
+                on_reset=_reset_partials,
+            )
+        doc = save_spec_document(
+            db,
+            project_id=project_id,
+            story_id=story_id,
+            spec_payload=spec_payload,
+            constraints=constraints,
+            feedback=feedback,
+        )
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.generated",
+            message=f"Spec v{doc.version} generated",
+            payload={"spec_id": str(doc.id)},
+        )
+        run = db.get(Run, run_id)
+        if run:
+            run.status = RunStatus.completed
+            db.commit()
+        upgrade.bind(partial(upgrade_spec_document, spec_id=str(doc.id), run_id=run_id))
+
+        return {
+            "type": "specs.summary",
+            "spec_id": str(doc.id),
+            "story_id": story_id,
+            "version": doc.version,
+            "status": doc.status.value,
+            "constraints": doc.constraints,
+            "feedback": doc.feedback,
+            "mermaid_sequence": doc.mermaid_sequence,
+            "mermaid_er": doc.mermaid_er,
+        }
+    except Exception as ex:
+        try:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="specs.error",
+                message=f"Spec generation failed: {type(ex).__name__}: {ex}",
+            )
+            run = db.get(Run, run_id)
+            if run:
+                run.status = RunStatus.failed
+                db.commit()
+        except Exception:
+            pass
+        raise
+    finally:
+        db.close()
+
+
 def _approve_epics_job(*, project_id: str, batch_id: str, approve_all: bool) -> dict[str, Any]:
     """
     Worker thread job.
@@ -219,10 +374,11 @@ def _approve_epics_job(*, project_id: str, batch_id: str, approve_all: bool) ->
 @router.websocket("/ws/runs/{run_id}")
 async def ws_run_events(websocket: WebSocket, run_id: str) -> None:
     token = websocket.query_params.get("token")
-    user_id = _decode_ws_jwt_or_none(token)
-    if not user_id:
+    principal = _ws_principal(token)
+    if principal is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = principal.id
 
     db_gen = get_db()
     db: Session = next(db_gen)
@@ -262,16 +418,18 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
     Commands:
       - {"type":"epics.generate","constraints":"...","count":6}
       - {"type":"epics.regenerate","constraints":"...","count":6}
+      - {"type":"epics.regenerate","batch_id":"..."}      # only rejected/changes_requested epics; keeps the rest
       - {"type":"epics.approve","batch_id":"...","approve_all":true}
       - {"type":"epics.list","batch_id":"..."}             # fetch epics for a batch
       - {"type":"epics.latest"}                            # fetch latest batch + epics for project
       - {"type":"runs.attach","run_id":"..."}              # subscribe to an existing run's events
     """
     token = websocket.query_params.get("token")
-    user_id = _decode_ws_jwt_or_none(token)
-    if not user_id:
+    principal = _ws_principal(token)
+    if principal is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = principal.id
 
     db_gen = get_db()
     db: Session = next(db_gen)
@@ -300,6 +458,8 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
             forwarder_task.cancel()
             try:
                 await forwarder_task
+            except asyncio.CancelledError:
+                pass
             except Exception:
                 pass
             forwarder_task = None
@@ -359,29 +519,36 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
         constraints_norm = (constraints or "").strip()
         count_norm = max(1, min(int(count or 6), 12))
 
-        db_local = SessionLocal()
-        try:
-            run = Run(project_id=project_id, run_type="epic_generation", status=RunStatus.started)
-            db_local.add(run)
-            db_local.commit()
-            db_local.refresh(run)
-            run_id = str(run.id)
-        finally:
-            db_local.close()
+        def _create_run() -> str:
+            db_local = SessionLocal()
+            try:
+                run = Run(project_id=project_id, run_type="epic_generation", status=RunStatus.started)
+                db_local.add(run)
+                db_local.commit()
+                db_local.refresh(run)
+                return str(run.id)
+            finally:
+                db_local.close()
+
+        key = flight_key(project_id, "epics.generate", constraints=constraints_norm, count=count_norm)
+        flight, leader = single_flight.acquire(key, start=_create_run, window_seconds=get_settings().single_flight_window_seconds)
+        run_id = flight.run_id
 
         await _start_forwarding(run_id)
-        await websocket.send_json({"type": "epics.run.created", "run_id": run_id})
+        await websocket.send_json({"type": "epics.run.created" if leader else "epics.run.coalesced", "run_id": run_id})
 
         try:
-            result = await anyio.to_thread.run_sync(
-                partial(
+            if leader:
+                job = partial(
                     _generate_epics_job,
                     project_id=project_id,
                     run_id=run_id,
                     constraints=constraints_norm,
                     count=count_norm,
                 )
-            )
+                result = await anyio.to_thread.run_sync(partial(single_flight.run, key, flight, job))
+            else:
+                result = await anyio.to_thread.run_sync(flight.wait)
             batch_id = result["batch_id"]
             await websocket.send_json({"type": "epics.batch.created", "run_id": run_id, "batch_id": batch_id})
             # Also push a direct summary to this WS so the client immediately has the epics, regardless of run-event timing.
@@ -400,6 +567,52 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
                 {"type": "error", "run_id": run_id, "message": f"Generation failed: {type(ex).__name__}: {ex}"}
             )
 
+    async def _handle_regenerate_changed(*, batch_id: str, constraints: str | None) -> None:
+        db_local = SessionLocal()
+        try:
+            source = db_local.get(EpicBatch, batch_id)
+            if not source or str(source.project_id) != str(project_id):
+                await websocket.send_json({"type": "error", "message": "Epic batch not found"})
+                return
+            if not changed_epic_ids(db_local, batch_id=batch_id):
+                await websocket.send_json({"type": "error", "message": "No rejected or changes_requested epics to regenerate"})
+                return
+            constraints_norm = (constraints if constraints is not None else source.constraints or "").strip()
+            run = Run(project_id=project_id, run_type="epic_regeneration", status=RunStatus.started)
+            db_local.add(run)
+            db_local.commit()
+            db_local.refresh(run)
+            run_id = str(run.id)
+        finally:
+            db_local.close()
+
+        await _start_forwarding(run_id)
+        await websocket.send_json({"type": "epics.run.created", "run_id": run_id})
+
+        try:
+            result = await anyio.to_thread.run_sync(
+                partial(
+                    regenerate_epic_batch_job,
+                    project_id=project_id,
+                    source_batch_id=batch_id,
+                    run_id=run_id,
+                    constraints=constraints_norm,
+                )
+            )
+        except Exception as ex:
+            await websocket.send_json({"type": "error", "run_id": run_id, "message": f"Regeneration failed: {type(ex).__name__}: {ex}"})
+            return
+        await websocket.send_json(
+            {
+                "type": "epics.batch.created",
+                "run_id": run_id,
+                "batch_id": result["batch_id"],
+                "kept_epic_ids": result["kept_epic_ids"],
+                "regenerated_epic_ids": result["regenerated_epic_ids"],
+            }
+        )
+        await _send_batch_summary(result["batch_id"])
+
     async def _handle_approve(*, batch_id: str | None, approve_all: bool | None) -> None:
         if not batch_id:
             await websocket.send_json({"type": "error", "message": "batch_id is required"})
@@ -481,7 +694,9 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
 
             msg_type = str(msg.get("type") or "").strip()
 
-            if msg_type in ("epics.generate", "epics.regenerate"):
+            if msg_type == "epics.regenerate" and msg.get("batch_id"):
+                await _handle_regenerate_changed(batch_id=str(msg.get("batch_id")), constraints=msg.get("constraints"))
+            elif msg_type in ("epics.generate", "epics.regenerate"):
                 await _handle_generate(constraints=msg.get("constraints"), count=msg.get("count"))
             elif msg_type == "epics.approve":
                 await _handle_approve(batch_id=msg.get("batch_id"), approve_all=msg.get("approve_all"))
@@ -509,7 +724,7 @@ async def ws_epics_control(websocket: WebSocket, project_id: str) -> None:
 
 # strories
 
-def _ensure_project_owner(db: Session, *, project_id: str, user: User) -> Project:
+def _ensure_project_owner(db: Session, *, project_id: str, user: Principal) -> Project:
     project = db.get(Project, project_id)
     if not project:
         raise not_found("Project not found")
@@ -533,18 +748,15 @@ def _stories_summary(rows: list[Story]) -> list[dict[str, Any]]:
 @router.websocket("/ws/projects/{project_id}/stories")
 async def ws_stories(websocket: WebSocket, project_id: str) -> None:
     token = websocket.query_params.get("token")
-    user_id = _decode_ws_jwt_or_none(token)
-    if not user_id:
+    principal = _ws_principal(token)
+    if principal is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = principal.id
 
     db_check = SessionLocal()
     try:
-        user = db_check.get(User, user_id)
-        if not user:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-        _ensure_project_owner(db_check, project_id=project_id, user=user)
+        _ensure_project_owner(db_check, project_id=project_id, user=principal)
     finally:
         db_check.close()
 
@@ -561,6 +773,8 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
             forwarder_task.cancel()
             try:
                 await forwarder_task
+            except asyncio.CancelledError:
+                pass
             except Exception:
                 pass
             forwarder_task = None
@@ -606,31 +820,61 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
         finally:
             db_local.close()
 
-    async def _generate_job(*, project_id: str, epic_id: str, constraints: str, count: int) -> dict[str, Any]:
+    def _generate_job(*, project_id: str, epic_id: str, run_id: str, constraints: str, count: int) -> dict[str, Any]:
+        """
+        Worker thread job.
+        Persists stories + batch; emits run events (stories.partial per story); returns {"batch_id":..., "stories":[...], "run_id":...}.
+        """
         db_local = SessionLocal()
         try:
             epic = db_local.get(Epic, epic_id)
-            if not epic or str(epic.project_id) != str(project_id):
-                raise bad_request("Epic not found")
-            if epic.status != EpicStatus.approved:
-                raise bad_request("Epic must be approved before generating stories")
+            run = db_local.get(Run, run_id)
 
-            run = Run(project_id=project_id, run_type="story_generation", status=RunStatus.started)
-            db_local.add(run); db_local.commit(); db_local.refresh(run)
+            emit_run_event(db_local, run_id=run.id, event_type="stories.started", message="Story generation started")
 
-            await anyio.to_thread.run_sync(lambda: emit_run_event(db_local, run_id=run.id, event_type="stories.started", message="Story generation started"))
-            gen = generate_stories(
-                product_request=db_local.get(Project, project_id).product_request,
-                epic_title=epic.title,
-                epic_goal=epic.goal,
-                constraints=constraints,
-                count=count,
+            partial_index = itertools.count()
+
+            def _emit_partial(s) -> None:
+                idx = next(partial_index)
+                emit_run_event(
+                    db_local,
+                    run_id=run.id,
+                    event_type="stories.partial",
+                    message=f"Story {idx + 1} ready",
+                    payload={"index": idx, "epic_id": epic_id, "story": asdict(s)},
+                )
+
+            def _reset_partials() -> None:
+                nonlocal partial_index
+                partial_index = itertools.count()
+                emit_run_event(
+                    db_local,
+                    run_id=run.id,
+                    event_type="stories.partial_reset",
+                    message="Streamed stories discarded; replacements follow",
+                    payload={"epic_id": epic_id},
+                )
+
+            passages = relevant_passages(
+                db_local, project_id=project_id, query=f"{epic.title}\n{epic.goal}\n{constraints}"
             )
+            upgrade = DeferredUpgrade()
+            with llm_request_context(user_id=str(user_id), run_id=str(run.id)):
+                gen = generate_stories(
+                    product_request=db_local.get(Project, project_id).product_request,
+                    epic_title=epic.title,
+                    epic_goal=epic.goal,
+                    constraints=constraints,
+                    count=count,
+                    research_passages=passages,
+                    on_story=_emit_partial,
+                    on_upgrade=upgrade.deliver,
+                    on_reset=_reset_partials,
+                )
             batch = StoryBatch(project_id=project_id, epic_id=epic_id, run_id=run.id, constraints=constraints, status=StoryBatchStatus.generated)
             db_local.add(batch); db_local.commit(); db_local.refresh(batch)
 
             rows: list[Story] = []
-            import json as _json
             for s in gen:
                 rows.append(
                     Story(
@@ -638,12 +882,12 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
                         epic_id=epic_id,
                         batch_id=batch.id,
                         statement=s.statement,
-                        acceptance_criteria_json=_json.dumps(s.acceptance_criteria, ensure_ascii=False),
+                        acceptance_criteria_json=json.dumps(s.acceptance_criteria, ensure_ascii=False),
                         edge_cases=s.edge_cases,
                         non_functional=s.non_functional,
                         estimate=s.estimate,
                         estimate_reason=s.estimate_reason,
-                        dependencies_json=_json.dumps(s.dependencies, ensure_ascii=False),
+                        dependencies_json=json.dumps(s.dependencies, ensure_ascii=False),
                         status=StoryStatus.proposed,
                     )
                 )
@@ -651,7 +895,23 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
 
             emit_run_event(db_local, run_id=run.id, event_type="stories.generated", message=f"Generated {len(rows)} stories")
             run.status = RunStatus.completed; db_local.commit()
+            upgrade.bind(partial(upgrade_story_batch, batch_id=str(batch.id), run_id=str(run.id)))
             return {"batch_id": str(batch.id), "constraints": constraints, "stories": _stories_summary(rows), "run_id": str(run.id)}
+        except Exception as ex:
+            try:
+                emit_run_event(
+                    db_local,
+                    run_id=run_id,
+                    event_type="stories.error",
+                    message=f"Story generation failed: {type(ex).__name__}: {ex}",
+                )
+                run = db_local.get(Run, run_id)
+                if run:
+                    run.status = RunStatus.failed
+                    db_local.commit()
+            except Exception:
+                pass
+            raise
         finally:
             db_local.close()
 
@@ -662,13 +922,44 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
         constraints_norm = (constraints or "").strip()
         count_norm = max(1, min(int(count or 10), 25))
 
-        # Create run inside the job to get the run_id to attach
-        result = await anyio.to_thread.run_sync(
-            partial(_generate_job, project_id=project_id, epic_id=str(epic_id), constraints=constraints_norm, count=count_norm)
-        )
-        run_id = result.get("run_id")
-        if run_id:
-            await _start_forwarding(run_id)
+        db_local = SessionLocal()
+        try:
+            epic = db_local.get(Epic, str(epic_id))
+            if not epic or str(epic.project_id) != str(project_id):
+                await websocket.send_json({"type": "error", "message": "Epic not found"})
+                return
+            if epic.status != EpicStatus.approved:
+                await websocket.send_json({"type": "error", "message": "Epic must be approved before generating stories"})
+                return
+        finally:
+            db_local.close()
+
+        def _create_run() -> str:
+            db_local = SessionLocal()
+            try:
+                run = Run(project_id=project_id, run_type="story_generation", status=RunStatus.started)
+                db_local.add(run); db_local.commit(); db_local.refresh(run)
+                return str(run.id)
+            finally:
+                db_local.close()
+
+        key = flight_key(project_id, "stories.generate", epic_id=str(epic_id), constraints=constraints_norm, count=count_norm)
+        flight, leader = single_flight.acquire(key, start=_create_run, window_seconds=get_settings().single_flight_window_seconds)
+        run_id = flight.run_id
+
+        # Attach before generating so stories.partial events stream to this socket as they arrive.
+        await _start_forwarding(run_id)
+        await websocket.send_json({"type": "stories.run.created" if leader else "stories.run.coalesced", "run_id": run_id})
+
+        try:
+            if leader:
+                job = partial(_generate_job, project_id=project_id, epic_id=str(epic_id), run_id=run_id, constraints=constraints_norm, count=count_norm)
+                result = await anyio.to_thread.run_sync(partial(single_flight.run, key, flight, job))
+            else:
+                result = await anyio.to_thread.run_sync(flight.wait)
+        except Exception as ex:
+            await websocket.send_json({"type": "error", "run_id": run_id, "message": f"Generation failed: {type(ex).__name__}: {ex}"})
+            return
         await websocket.send_json({"type": "stories.batch.created", "batch_id": result.get("batch_id"), "run_id": run_id})
         await websocket.send_json(
             {
@@ -679,6 +970,62 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
             }
         )
 
+    async def _handle_generate_all(
+        *, batch_id: str | None, constraints: str | None, count: int | None, concurrency: int | None
+    ) -> None:
+        constraints_norm = (constraints or "").strip()
+        count_norm = max(1, min(int(count or 10), 25))
+        cap = max(1, get_settings().story_fanout_concurrency)
+        concurrency_norm = max(1, min(int(concurrency or cap), cap))
+
+        db_local = SessionLocal()
+        try:
+            q = db_local.query(EpicBatch).filter(EpicBatch.project_id == project_id)
+            if batch_id:
+                q = q.filter(EpicBatch.id == str(batch_id))
+            epic_batch = q.order_by(EpicBatch.created_at.desc()).first()
+            if not epic_batch:
+                await websocket.send_json({"type": "error", "message": "Epic batch not found"})
+                return
+            epic_ids = approved_epic_ids(db_local, epic_batch_id=epic_batch.id)
+            if not epic_ids:
+                await websocket.send_json({"type": "error", "message": "Approve at least one epic before generating stories"})
+                return
+            run = Run(project_id=project_id, run_type="story_generation_all", status=RunStatus.started)
+            db_local.add(run); db_local.commit(); db_local.refresh(run)
+            run_id = str(run.id)
+            epic_batch_id = str(epic_batch.id)
+        finally:
+            db_local.close()
+
+        await _start_forwarding(run_id)
+        await websocket.send_json({"type": "stories.run.created", "run_id": run_id, "epic_ids": epic_ids})
+
+        try:
+            result = await anyio.to_thread.run_sync(
+                partial(
+                    generate_stories_for_epic_batch_job,
+                    project_id=project_id,
+                    run_id=run_id,
+                    epic_ids=epic_ids,
+                    constraints=constraints_norm,
+                    count=count_norm,
+                    concurrency=concurrency_norm,
+                )
+            )
+        except Exception as ex:
+            await websocket.send_json({"type": "error", "run_id": run_id, "message": f"Generation failed: {type(ex).__name__}: {ex}"})
+            return
+        await websocket.send_json(
+            {
+                "type": "stories.generate_all.summary",
+                "run_id": run_id,
+                "epic_batch_id": epic_batch_id,
+                "batches": result.get("batches", []),
+                "failed": result.get("failed", []),
+            }
+        )
+
     async def _handle_approve(*, batch_id: str | None, approve_all: bool | None) -> None:
         if not batch_id:
             await websocket.send_json({"type": "error", "message": "batch_id is required"})
@@ -746,6 +1093,13 @@ async def ws_stories(websocket: WebSocket, project_id: str) -> None:
             t = str(msg.get("type") or "").strip()
             if t in ("stories.generate", "stories.regenerate"):
                 await _handle_generate(epic_id=msg.get("epic_id"), constraints=msg.get("constraints"), count=msg.get("count"))
+            elif t == "stories.generate_all":
+                await _handle_generate_all(
+                    batch_id=msg.get("batch_id"),
+                    constraints=msg.get("constraints"),
+                    count=msg.get("count"),
+                    concurrency=msg.get("concurrency"),
+                )
             elif t == "stories.approve":
                 await _handle_approve(batch_id=msg.get("batch_id"), approve_all=msg.get("approve_all"))
             elif t == "stories.latest":
@@ -774,6 +1128,7 @@ async def ws_specs_control(websocket: WebSocket, project_id: str) -> None:
     Commands:
       - {"type":"specs.generate","story_id":".","constraints":"."}
       - {"type":"specs.regenerate","story_id":".","constraints":".","feedback":"."}
+      - {"type":"specs.generate_batch","epic_id":"." | "batch_id":".","constraints":".","concurrency":4}
       - {"type":"specs.get","story_id":"."}
       - {"type":"specs.approve","spec_id":"."}
       - {"type":"specs.reject","spec_id":".","feedback":"."}
@@ -782,10 +1137,11 @@ async def ws_specs_control(websocket: WebSocket, project_id: str) -> None:
     """
     # Auth via JWT in query param (token)
     token = websocket.query_params.get("token")
-    user_id = _decode_ws_jwt_or_none(token)
-    if not user_id:
+    principal = _ws_principal(token)
+    if principal is None:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    user_id = principal.id
 
     # Ownership check
     db_gen = get_db()
@@ -850,6 +1206,8 @@ async def ws_specs_control(websocket: WebSocket, project_id: str) -> None:
         if not story_id:
             await websocket.send_json({"type": "error", "message": "story_id is required"})
             return
+        constraints_norm = (constraints or "").strip()
+        feedback_norm = (feedback or "").strip()
 
         db_local = SessionLocal()
         try:
@@ -857,90 +1215,110 @@ async def ws_specs_control(websocket: WebSocket, project_id: str) -> None:
             if not story or str(story.project_id) != str(project_id):
                 await websocket.send_json({"type": "error", "message": "story not found"})
                 return
+        finally:
+            db_local.close()
 
-            # FIX: started (not running) per enum in models.py
-            run = Run(project_id=project_id, run_type="spec_generation", status=RunStatus.started)
-            db_local.add(run)
-            db_local.commit()
-            db_local.refresh(run)
-            await websocket.send_json({"type": "runs.created", "run_id": str(run.id)})
+        def _create_run() -> str:
+            db_local = SessionLocal()
+            try:
+                # FIX: started (not running) per enum in models.py
+                run = Run(project_id=project_id, run_type="spec_generation", status=RunStatus.started)
+                db_local.add(run)
+                db_local.commit()
+                db_local.refresh(run)
+                return str(run.id)
+            finally:
+                db_local.close()
+
+        key = flight_key(project_id, "specs.generate", story_id=story_id, constraints=constraints_norm, feedback=feedback_norm)
+        flight, leader = single_flight.acquire(key, start=_create_run, window_seconds=get_settings().single_flight_window_seconds)
+        run_id = flight.run_id
+
+        # Forwarding starts before the job, so this socket streams specs.partial for its own run too.
+        await _start_forwarding(run_id)
+        if leader:
+            await websocket.send_json({"type": "runs.created", "run_id": run_id})
+        else:
+            # An identical request is already generating this spec; follow its run instead of starting another.
+            await websocket.send_json({"type": "runs.coalesced", "run_id": run_id})
 
-            await anyio.to_thread.run_sync(
-                lambda: emit_run_event(
-                    db_local,
-                    run_id=run.id,
-                    event_type="specs.started",
-                    message="Spec generation started",
+        try:
+            if leader:
+                job = partial(
+                    _generate_spec_job,
+                    project_id=project_id,
+                    story_id=story_id,
+                    run_id=run_id,
+                    constraints=constraints_norm,
+                    feedback=feedback_norm,
                 )
-            )
-
-            spec_payload = generate_spec_for_story(
-                product_request=db_local.get(Project, project_id).product_request,
-                story_statement=story.statement,
-                acceptance_criteria=json.loads(story.acceptance_criteria_json or "[]"),
-                constraints=(constraints or "").strip(),
-                feedback=(feedback or "").strip(),
-            )
+                summary = await anyio.to_thread.run_sync(partial(single_flight.run, key, flight, job))
+            else:
+                summary = await anyio.to_thread.run_sync(flight.wait)
+        except Exception as ex:
+            await websocket.send_json({"type": "error", "run_id": run_id, "message": f"Generation failed: {type(ex).__name__}: {ex}"})
+            return
+        await websocket.send_json(summary)
 
-            # Next version
-            latest_ver = (
-                db_local.query(SpecDocument)
-                .filter(SpecDocument.story_id == story_id)
-                .order_by(SpecDocument.version.desc())
-                .with_entities(SpecDocument.version)
-                .first()
-            )
-            next_ver = 1 if not latest_ver else int(latest_ver[0]) + 1
+    async def _generate_batch(*, epic_id: str, batch_id: str, constraints: str, concurrency: int | None) -> None:
+        if not epic_id and not batch_id:
+            await websocket.send_json({"type": "error", "message": "epic_id or batch_id is required"})
+            return
+        settings = get_settings()
+        cap = max(1, settings.spec_fanout_concurrency)
+        concurrency_norm = max(1, min(int(concurrency or cap), cap))
+        constraints_norm = (constraints or "").strip()
 
-            doc = SpecDocument(
-                project_id=project_id,
-                story_id=story_id,
-                version=next_ver,
-                constraints=(constraints or "").strip(),
-                feedback=(feedback or "").strip(),
-                status=SpecStatus.proposed,
-                overview=spec_payload.get("overview", ""),
-                goals=spec_payload.get("goals", ""),
-                functional_requirements_json=json.dumps(spec_payload.get("functional_requirements", []), ensure_ascii=False),
-                api_contracts_json=json.dumps(spec_payload.get("api_contracts", []), ensure_ascii=False),
-                data_model_changes_json=json.dumps(spec_payload.get("data_model_changes", []), ensure_ascii=False),
-                security_considerations=spec_payload.get("security_considerations", ""),
-                error_handling=spec_payload.get("error_handling", ""),
-                observability=spec_payload.get("observability", ""),
-                test_plan_json=json.dumps(spec_payload.get("test_plan", []), ensure_ascii=False),
-                implementation_plan_json=json.dumps(spec_payload.get("implementation_plan", []), ensure_ascii=False),
-                mermaid_sequence=spec_payload.get("mermaid_sequence", ""),
-                mermaid_er=spec_payload.get("mermaid_er", ""),
-            )
-            db_local.add(doc)
-            db_local.commit()
-            db_local.refresh(doc)
+        db_local = SessionLocal()
+        try:
+            q = db_local.query(StoryBatch).filter(StoryBatch.project_id == project_id)
+            if batch_id:
+                q = q.filter(StoryBatch.id == batch_id)
+            else:
+                q = q.filter(StoryBatch.epic_id == epic_id)
+            story_batch = q.order_by(StoryBatch.created_at.desc()).first()
+            if not story_batch:
+                await websocket.send_json({"type": "error", "message": "story batch not found"})
+                return
+            story_ids = approved_story_ids(db_local, story_batch_id=story_batch.id)
+            if not story_ids:
+                await websocket.send_json({"type": "error", "message": "Approve at least one story before generating specs"})
+                return
+            run = Run(project_id=project_id, run_type="spec_generation_batch", status=RunStatus.started)
+            db_local.add(run); db_local.commit(); db_local.refresh(run)
+            run_id = str(run.id)
+            story_batch_id = str(story_batch.id)
+        finally:
+            db_local.close()
 
-            emit_run_event(
-                db_local,
-                run_id=run.id,
-                event_type="specs.generated",
-                message=f"Spec v{doc.version} generated",
-                payload={"spec_id": str(doc.id)},
-            )
-            run.status = RunStatus.completed
-            db_local.commit()
+        # The job holds this handler until it finishes, so attach now to stream per-story progress.
+        await _start_forwarding(run_id)
+        await websocket.send_json({"type": "runs.created", "run_id": run_id, "story_ids": story_ids})
 
-            await websocket.send_json(
-                {
-                    "type": "specs.summary",
-                    "spec_id": str(doc.id),
-                    "story_id": story_id,
-                    "version": doc.version,
-                    "status": doc.status.value,
-                    "constraints": doc.constraints,
-                    "feedback": doc.feedback,
-                    "mermaid_sequence": doc.mermaid_sequence,
-                    "mermaid_er": doc.mermaid_er,
-                }
+        try:
+            result = await anyio.to_thread.run_sync(
+                partial(
+                    generate_specs_for_stories_job,
+                    project_id=project_id,
+                    run_id=run_id,
+                    story_ids=story_ids,
+                    constraints=constraints_norm,
+                    concurrency=concurrency_norm,
+                    rate_per_minute=settings.spec_fanout_rate_per_minute,
+                )
             )
-        finally:
-            db_local.close()
+        except Exception as ex:
+            await websocket.send_json({"type": "error", "run_id": run_id, "message": f"Generation failed: {type(ex).__name__}: {ex}"})
+            return
+        await websocket.send_json(
+            {
+                "type": "specs.batch.summary",
+                "run_id": run_id,
+                "batch_id": story_batch_id,
+                "specs": result.get("specs", []),
+                "failed": result.get("failed", []),
+            }
+        )
 
     try:
         while True:
@@ -963,6 +1341,15 @@ async def ws_specs_control(websocket: WebSocket, project_id: str) -> None:
                 )
                 continue
 
+            if t == "specs.generate_batch":
+                await _generate_batch(
+                    epic_id=str(msg.get("epic_id") or ""),
+                    batch_id=str(msg.get("batch_id") or ""),
+                    constraints=str(msg.get("constraints") or ""),
+                    concurrency=msg.get("concurrency"),
+                )
+                continue
+
             if t == "specs.get":
                 story_id = str(msg.get("story_id") or "")
                 if not story_id:
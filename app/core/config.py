@@ -16,6 +16,23 @@ class Settings(BaseSettings):
     # Storage
     storage_root: Path = Field(default=Path("data"), validation_alias="STORAGE_ROOT")
     max_upload_mb: int = Field(default=20, validation_alias="MAX_UPLOAD_MB")
+    # PDFs are parsed in separate processes: at most N at once, each killed after the timeout or past the memory cap
+    pdf_worker_processes: int = Field(default=2, validation_alias="PDF_WORKER_PROCESSES")
+    pdf_timeout_seconds: float = Field(default=10.0, validation_alias="PDF_TIMEOUT_SECONDS")
+    pdf_memory_limit_mb: int = Field(default=512, validation_alias="PDF_MEMORY_LIMIT_MB")
+    pdf_pages_per_task: int = Field(default=20, validation_alias="PDF_PAGES_PER_TASK")
+    blob_gc_grace_seconds: float = Field(default=3600.0, validation_alias="BLOB_GC_GRACE_SECONDS")
+    # "local" keeps artifacts under STORAGE_ROOT; "s3" puts them in an S3-compatible bucket shared by all nodes
+    # (STORAGE_ROOT then only holds upload staging and a download cache).
+    storage_backend: str = Field(default="local", validation_alias="STORAGE_BACKEND")
+    s3_endpoint_url: str = Field(default="https://s3.amazonaws.com", validation_alias="S3_ENDPOINT_URL")
+    s3_bucket: str = Field(default="", validation_alias="S3_BUCKET")
+    s3_region: str = Field(default="us-east-1", validation_alias="S3_REGION")
+    s3_access_key_id: str = Field(default="", validation_alias="S3_ACCESS_KEY_ID")
+    s3_secret_access_key: str = Field(default="", validation_alias="S3_SECRET_ACCESS_KEY")
+    s3_prefix: str = Field(default="", validation_alias="S3_PREFIX")
+    # Cap on the local copies of S3 objects kept for the PDF parser; least recently used files go first.
+    s3_cache_max_mb: int = Field(default=2048, validation_alias="S3_CACHE_MAX_MB")
 
     # Database
     database_url: str = Field(default="sqlite:///./data/app.db", validation_alias="DATABASE_URL")
@@ -24,6 +41,8 @@ class Settings(BaseSettings):
     jwt_secret: str = Field(default="change-me", validation_alias="JWT_SECRET")
     jwt_algorithm: str = Field(default="HS256", validation_alias="JWT_ALGORITHM")
     access_token_expire_minutes: int = Field(default=60 * 24, validation_alias="ACCESS_TOKEN_EXPIRE_MINUTES")
+    # Token subject -> user id + role, cached to skip the users lookup per request (0 = always look up)
+    principal_cache_ttl_seconds: float = Field(default=30.0, validation_alias="PRINCIPAL_CACHE_TTL_SECONDS")
 
     # Optional: seed an admin account
     seed_admin_email: str | None = Field(default=None, validation_alias="SEED_ADMIN_EMAIL")
@@ -33,10 +52,61 @@ class Settings(BaseSettings):
     tavily_api_key: str | None = Field(default=None, validation_alias="TAVILY_API_KEY")
     research_max_results: int = Field(default=8, validation_alias="RESEARCH_MAX_RESULTS")
     research_search_depth: str = Field(default="basic", validation_alias="RESEARCH_SEARCH_DEPTH")
+    # Research queries run concurrently over one pooled client; each query has its own timeout
+    tavily_search_url: str = Field(default="https://api.tavily.com/search", validation_alias="TAVILY_SEARCH_URL")
+    research_query_timeout_seconds: float = Field(default=20.0, validation_alias="RESEARCH_QUERY_TIMEOUT_SECONDS")
+    research_max_connections: int = Field(default=10, validation_alias="RESEARCH_MAX_CONNECTIONS")
+    # Cross-project research cache keyed by normalized query + depth + max_results (TTL 0 = disabled)
+    research_cache_ttl_seconds: int = Field(default=86_400, validation_alias="RESEARCH_CACHE_TTL_SECONDS")
+    research_cache_max_entries: int = Field(default=1000, validation_alias="RESEARCH_CACHE_MAX_ENTRIES")
+    # Near-duplicate product requests: "off", "offer" (report similar appendices) or "auto" (reuse the best match)
+    research_reuse_mode: str = Field(default="offer", validation_alias="RESEARCH_REUSE_MODE")
+    research_reuse_threshold: float = Field(default=0.6, validation_alias="RESEARCH_REUSE_THRESHOLD")
+    # Research/PDF passages picked by BM25 for each epic or story prompt: at most top_k, within max_tokens in total
+    research_passages_top_k: int = Field(default=4, validation_alias="RESEARCH_PASSAGES_TOP_K")
+    research_passages_max_tokens: int = Field(default=600, validation_alias="RESEARCH_PASSAGES_MAX_TOKENS")
 
     # Milestone 3+: LLM (optional; falls back to deterministic generation if unset)
     openai_api_key: str | None = Field(default=None, validation_alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4o-mini", validation_alias="OPENAI_MODEL")
+    # LLM scheduler: provider budget (0 = unlimited), retries on 429, and expected completion size for budgeting
+    llm_requests_per_minute: int = Field(default=500, validation_alias="LLM_REQUESTS_PER_MINUTE")
+    llm_tokens_per_minute: int = Field(default=200_000, validation_alias="LLM_TOKENS_PER_MINUTE")
+    llm_max_retries: int = Field(default=3, validation_alias="LLM_MAX_RETRIES")
+    llm_completion_token_estimate: int = Field(default=1500, validation_alias="LLM_COMPLETION_TOKEN_ESTIMATE")
+    # Deadline (0 = none) after which the deterministic result is returned and upgraded later;
+    # optional hedged second request after the observed p95 (LLM_HEDGE_AFTER_SECONDS until enough samples)
+    llm_deadline_seconds: float = Field(default=45.0, validation_alias="LLM_DEADLINE_SECONDS")
+    llm_hedge_enabled: bool = Field(default=False, validation_alias="LLM_HEDGE_ENABLED")
+    llm_hedge_after_seconds: float = Field(default=15.0, validation_alias="LLM_HEDGE_AFTER_SECONDS")
+    # Prompt budgets per operation (tokens; inputs are trimmed to fit) and USD prices used for run cost accounting
+    llm_prompt_budget_epics: int = Field(default=6000, validation_alias="LLM_PROMPT_BUDGET_EPICS")
+    llm_prompt_budget_stories: int = Field(default=3000, validation_alias="LLM_PROMPT_BUDGET_STORIES")
+    llm_prompt_budget_specs: int = Field(default=4000, validation_alias="LLM_PROMPT_BUDGET_SPECS")
+    llm_prompt_cost_per_1k: float = Field(default=0.00015, validation_alias="LLM_PROMPT_COST_PER_1K")
+    llm_completion_cost_per_1k: float = Field(default=0.0006, validation_alias="LLM_COMPLETION_COST_PER_1K")
+
+    # Fan-out generation (max epics generated concurrently in one stories.generate_all run)
+    story_fanout_concurrency: int = Field(default=4, validation_alias="STORY_FANOUT_CONCURRENCY")
+    # Batch spec generation (parallel specs per run; starts per minute, 0 = unpaced)
+    spec_fanout_concurrency: int = Field(default=4, validation_alias="SPEC_FANOUT_CONCURRENCY")
+    spec_fanout_rate_per_minute: int = Field(default=60, validation_alias="SPEC_FANOUT_RATE_PER_MINUTE")
+
+    # Single-flight: identical generate commands attach to the in-flight run (and reuse it this long after)
+    single_flight_window_seconds: float = Field(default=2.0, validation_alias="SINGLE_FLIGHT_WINDOW_SECONDS")
+
+    # Durable job queue (backlog research). The API runs an embedded worker unless disabled; run more with
+    # `python -m app.worker`. A job whose lease is not renewed in time is reclaimed by another worker.
+    job_worker_embedded: bool = Field(default=True, validation_alias="JOB_WORKER_EMBEDDED")
+    job_worker_concurrency: int = Field(default=2, validation_alias="JOB_WORKER_CONCURRENCY")
+    job_poll_interval_seconds: float = Field(default=1.0, validation_alias="JOB_POLL_INTERVAL_SECONDS")
+    job_lease_seconds: float = Field(default=60.0, validation_alias="JOB_LEASE_SECONDS")
+    job_max_attempts: int = Field(default=3, validation_alias="JOB_MAX_ATTEMPTS")
+    job_retry_backoff_seconds: float = Field(default=5.0, validation_alias="JOB_RETRY_BACKOFF_SECONDS")
+    # Research jobs running at once across all workers (0 = only limited by worker threads)
+    research_job_concurrency: int = Field(default=4, validation_alias="RESEARCH_JOB_CONCURRENCY")
+    # Bulk project import (POST /projects/import): projects inserted per transaction
+    import_batch_size: int = Field(default=100, validation_alias="IMPORT_BATCH_SIZE")
 
 
 @lru_cache
@@ -11,9 +11,12 @@ class EventBroker:
         # Map run_id -> set of subscriber queues
         self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
         self._lock = asyncio.Lock()
+        # Loop the subscribers live on; lets plain worker threads publish safely.
+        self._loop: asyncio.AbstractEventLoop | None = None
 
     async def subscribe(self, run_id: str) -> asyncio.Queue:
         queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
         async with self._lock:
             self._subscribers[run_id].add(queue)
         return queue
@@ -31,5 +34,12 @@ class EventBroker:
         for q in queues:
             await q.put(event)
 
+    def publish_threadsafe(self, run_id: str, event: dict[str, Any]) -> None:
+        # For threads not managed by AnyIO (e.g. ThreadPoolExecutor workers).
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return
+        asyncio.run_coroutine_threadsafe(self.publish(run_id, event), loop)
+
 
 broker = EventBroker()
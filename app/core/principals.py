@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+from app.core.config import get_settings
+from app.db.models import User, UserRole
+
+
+# Who a valid token belongs to (user id + current role), cached for PRINCIPAL_CACHE_TTL_SECONDS so authenticated
+# requests and WebSocket connections skip the users-table lookup. The JWT signature and expiry are still checked
+# on every request. Admin role changes and deletions invalidate the entry at once in this process; other processes
+# pick them up when their entry expires.
+
+_MAX_ENTRIES = 10_000
+
+_entries: OrderedDict[str, tuple[float, "Principal"]] = OrderedDict()
+_lock = threading.Lock()
+# Bumped by every invalidation: a load that started before one is not cached, so it cannot put back a stale role.
+_generation = 0
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: str
+    role: UserRole
+
+
+def _from_user(user: User | None) -> Principal | None:
+    return None if user is None else Principal(id=str(user.id), role=user.role)
+
+
+def resolve_principal(user_id: str, load_user: Callable[[str], User | None]) -> Principal | None:
+    """The principal for `user_id` from the cache, else from `load_user`; None if the user no longer exists."""
+    ttl = get_settings().principal_cache_ttl_seconds
+    now = time.monotonic()
+    with _lock:
+        hit = _entries.get(user_id)
+        if hit is not None and hit[0] > now:
+            _entries.move_to_end(user_id)
+            return hit[1]
+        generation = _generation
+
+    principal = _from_user(load_user(user_id))
+    if principal is None or ttl <= 0:
+        return principal
+    with _lock:
+        if generation == _generation:
+            _entries[user_id] = (now + ttl, principal)
+            _entries.move_to_end(user_id)
+            while len(_entries) > _MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return principal
+
+
+def invalidate_principal(user_id: str) -> None:
+    """Call after committing a change to the user's role, or deleting the user."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.pop(user_id, None)
@@ -6,7 +6,7 @@ import json
 import uuid
 from sqlalchemy import DateTime, Enum, ForeignKey, String, Text, func, Column
 from sqlalchemy import (
-    Column, String, Text, DateTime, Enum, Integer, ForeignKey, Index
+    Column, String, Text, DateTime, Enum, Integer, Float, ForeignKey, Index
 )
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -63,6 +63,20 @@ class Artifact(Base):
     project: Mapped[Project] = relationship(back_populates="artifacts")
 
 
+class Blob(Base):
+    """Content-addressed stored file (STORAGE_ROOT/blobs/), shared by every artifact with the same bytes."""
+
+    __tablename__ = "blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size_bytes: Mapped[int] = mapped_column(Integer)
+    # Artifacts pointing at this blob; kept in step by mapper events in app/services/storage.py.
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Naive UTC; refreshed on every upload of these bytes so garbage collection leaves in-flight uploads alone.
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Run(Base):
     __tablename__ = "runs"
 
@@ -94,6 +108,48 @@ class RunEvent(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+class RunUsage(Base):
+    """LLM token/cost totals for a run (one row per run, accumulated across its calls)."""
+
+    __tablename__ = "run_usage"
+
+    run_id: Mapped[str] = mapped_column(String(36), ForeignKey("runs.id"), primary_key=True)
+    llm_calls: Mapped[int] = mapped_column(Integer, default=0)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0.0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Job(Base):
+    """Durable background job (e.g. backlog research), claimed by workers under a renewable lease."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_claim", "status", "available_at"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind: Mapped[str] = mapped_column(String(50))
+    run_id: Mapped[str | None] = mapped_column(String(36), ForeignKey("runs.id"), index=True, nullable=True)
+    payload_json: Mapped[str] = mapped_column(Text, default="{}")
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.queued)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    lease_owner: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    # Naive UTC, set in Python so lease and backoff checks don't depend on the database clock.
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class ResearchAppendix(Base):
     __tablename__ = "research_appendices"
 
@@ -107,6 +163,40 @@ class ResearchAppendix(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+class ResearchSignature(Base):
+    """MinHash signature of the product request a research appendix was produced for."""
+
+    __tablename__ = "research_signatures"
+
+    appendix_id: Mapped[str] = mapped_column(String(36), ForeignKey("research_appendices.id"), primary_key=True)
+    signature_json: Mapped[str] = mapped_column(Text)
+
+
+class ResearchLshBucket(Base):
+    """LSH band -> appendix; appendices sharing any band are similarity candidates."""
+
+    __tablename__ = "research_lsh_buckets"
+
+    band_key: Mapped[str] = mapped_column(String(40), primary_key=True)
+    appendix_id: Mapped[str] = mapped_column(String(36), ForeignKey("research_appendices.id"), primary_key=True)
+
+
+class ResearchCacheEntry(Base):
+    """Tavily result for one normalized (query, search_depth, max_results), shared across projects."""
+
+    __tablename__ = "research_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of the normalized inputs
+    query: Mapped[str] = mapped_column(Text)
+    search_depth: Mapped[str] = mapped_column(String(20))
+    max_results: Mapped[int] = mapped_column(Integer)
+    result_json: Mapped[str] = mapped_column(Text)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    # Naive UTC, set in Python so TTL checks don't depend on the database clock.
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
 class EpicBatchStatus(str, enum.Enum):
     generated = "generated"
     approved = "approved"
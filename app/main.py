@@ -4,10 +4,13 @@ from __future__ import annotations
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routers import auth, projects, runs, run_events, epics, ws ,stories,admin
+from app.api.routers import auth, projects, runs, run_events, epics, ws ,stories,admin, search
 from app.core.config import get_settings
 from app.db.base import Base
+from app.db import session as db_session
 from app.db.session import engine
+from app.services.job_queue import Worker, recover_orphaned_runs
+from app.services.search_index import init_search_index
 from app.services.seed import seed_admin_if_configured
 
 
@@ -26,8 +29,26 @@ def create_app() -> FastAPI:
     @app.on_event("startup")
     def _startup() -> None:
         Base.metadata.create_all(bind=engine)
+        init_search_index(engine)
         seed_admin_if_configured()
 
+        settings = get_settings()
+        if settings.job_worker_embedded:
+            db = db_session.SessionLocal()
+            try:
+                recover_orphaned_runs(db)
+            finally:
+                db.close()
+            app.state.job_worker = Worker(concurrency=settings.job_worker_concurrency)
+            app.state.job_worker.start()
+
+    @app.on_event("shutdown")
+    def _shutdown() -> None:
+        worker = getattr(app.state, "job_worker", None)
+        if worker is not None:
+            worker.stop()
+            app.state.job_worker = None
+
     app.include_router(auth.router, prefix=settings.api_v1_prefix)
     app.include_router(admin.router, prefix=settings.api_v1_prefix) 
     app.include_router(projects.router, prefix=settings.api_v1_prefix)
@@ -36,6 +57,7 @@ def create_app() -> FastAPI:
     app.include_router(epics.router, prefix=settings.api_v1_prefix)
     app.include_router(ws.router, prefix=settings.api_v1_prefix)
     app.include_router(stories.router, prefix=settings.api_v1_prefix)
+    app.include_router(search.router, prefix=settings.api_v1_prefix)
 
 
     @app.get("/health")
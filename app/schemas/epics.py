@@ -12,6 +12,10 @@ class EpicGenerateRequest(BaseModel):
     count: int = 6
 
 
+class EpicRegenerateRequest(BaseModel):
+    constraints: str | None = None  # defaults to the source batch's constraints
+
+
 class EpicResponse(BaseModel):
     id: str
     project_id: str
@@ -26,6 +26,7 @@ class ArtifactResponse(BaseModel):
     content_type: str
     size_bytes: int
     created_at: datetime
+    download_url: str
 
 
 class ProjectWithArtifactsResponse(ProjectResponse):
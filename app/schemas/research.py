@@ -14,3 +14,11 @@ class ResearchAppendixResponse(BaseModel):
     summary: str
     impact: str
     created_at: datetime
+
+
+class SimilarResearchResponse(BaseModel):
+    appendix_id: str
+    similarity: float
+    summary: str
+    url_count: int
+    created_at: datetime
@@ -15,3 +15,11 @@ class RunEventResponse(BaseModel):
     message: str
     payload_json: str | None
     created_at: datetime
+
+
+class RunUsageResponse(BaseModel):
+    run_id: str
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    cost_usd: float
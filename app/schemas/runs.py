@@ -5,6 +5,11 @@ from pydantic import BaseModel
 from app.db.models import RunStatus
 
 
+class BacklogRunRequest(BaseModel):
+    # Reuse an earlier research appendix (e.g. one listed by GET /projects/{id}/research/similar) instead of new web research.
+    reuse_appendix_id: str | None = None
+
+
 class RunResponse(BaseModel):
     id: str
     project_id: str
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+
+class SearchHitResponse(BaseModel):
+    kind: str  # research | epic | story | spec
+    ref_id: str
+    title: str
+    snippet: str  # matched terms wrapped in [ ]
+    score: float
@@ -2,13 +2,19 @@
 from __future__ import annotations
 from datetime import datetime
 from pydantic import BaseModel
-from app.db.models import StoryBatchStatus, StoryStatus
+from app.db.models import RunStatus, StoryBatchStatus, StoryStatus
 
 class StoryGenerateRequest(BaseModel):
     epic_id: str
     constraints: str | None = None
     count: int = 10
 
+class StoryGenerateAllRequest(BaseModel):
+    batch_id: str | None = None  # epic batch; defaults to the project's latest
+    constraints: str | None = None
+    count: int = 10
+    concurrency: int | None = None  # bounded by STORY_FANOUT_CONCURRENCY
+
 class StoryResponse(BaseModel):
     id: str
     project_id: str
@@ -41,3 +47,20 @@ class StoryApproveRequest(BaseModel):
 class StoryUpdateRequest(BaseModel):
     status: StoryStatus
     feedback: str | None = None
+
+class StoryFanoutBatch(BaseModel):
+    epic_id: str
+    batch_id: str
+    story_count: int
+
+class StoryFanoutFailure(BaseModel):
+    epic_id: str
+    error: str
+
+class StoryFanoutResponse(BaseModel):
+    run_id: str
+    project_id: str
+    epic_batch_id: str
+    status: RunStatus
+    batches: list[StoryFanoutBatch]
+    failed: list[StoryFanoutFailure]
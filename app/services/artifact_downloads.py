@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import OrderedDict
+from email.utils import formatdate
+from threading import Lock
+from typing import Iterator
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.core.errors import not_found
+from app.services.storage import blob_sha, get_storage
+from app.services.storage_backends import LocalBackend, ObjectInfo, StorageBackend
+
+
+# Artifact downloads never load the file into Python memory. From local storage they are sent by Starlette's
+# FileResponse, which uses the server's zero-copy path (pathsend/sendfile) when there is one and handles
+# Range/If-Range since Starlette 0.39 (hence fastapi>=0.115.3). From a remote backend the requested range is
+# fetched and relayed chunk by chunk. Either way the ETag is the SHA-256 of the content, so it is strong and
+# identical across backends and nodes.
+
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+_HASH_CACHE_SIZE = 1024
+_hashes: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+_hashes_lock = Lock()
+
+
+def _content_disposition(filename: str) -> str:
+    # Uploaded names are user input: quotes, control and non-Latin-1 characters can't go in the header as is.
+    # filename* (RFC 6266) carries the real name; the quoted ASCII fallback is for clients that ignore it.
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in filename) or "download"
+    return f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(filename)}"
+
+
+def _content_sha256(storage: StorageBackend, key: str, info: ObjectInfo) -> str:
+    sha256 = blob_sha(key)
+    if sha256 is not None:
+        return sha256  # the key is the hash
+    # Mutable objects (a regenerated Mermaid graph) are hashed once per version.
+    cache_key = (storage.uri(key), info.mtime_ns, info.size)
+    with _hashes_lock:
+        if cache_key in _hashes:
+            _hashes.move_to_end(cache_key)
+            return _hashes[cache_key]
+    digest = hashlib.sha256()
+    with storage.open_read(key) as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_BYTES):
+            digest.update(chunk)
+    with _hashes_lock:
+        _hashes[cache_key] = digest.hexdigest()
+        while len(_hashes) > _HASH_CACHE_SIZE:
+            _hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def _matches(header: str, etag: str) -> bool:
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def _single_range(header: str, size: int) -> tuple[int, int] | None:
+    """[start, end) for a single satisfiable `bytes=` range; None to send the whole object; ValueError if unsatisfiable."""
+    m = _RANGE.fullmatch(header.strip())
+    if not m or (not m[1] and not m[2]):
+        return None  # malformed or multiple ranges: a full response is always allowed
+    if not m[1]:
+        start, end = max(size - int(m[2]), 0), size
+    else:
+        start, end = int(m[1]), min(int(m[2]) + 1, size) if m[2] else size
+    if start >= size or start >= end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _stream(storage: StorageBackend, key: str, start: int, end: int) -> Iterator[bytes]:
+    with storage.open_read(key, start=start, end=end) as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_BYTES):
+            yield chunk
+
+
+def download_response(
+    request: Request, key: str, *, filename: str, media_type: str, storage: StorageBackend | None = None
+) -> Response:
+    """
+    Streams the object at `key` (in the configured backend unless `storage` is given): strong ETag (content
+    SHA-256), 304 for a matching If-None-Match, and 206 for a single Range (honouring If-Range).
+    Raises 404 if the object does not exist.
+    """
+    storage = storage or get_storage()
+    info = storage.stat(key)
+    if info is None:
+        raise not_found("Artifact file not found")
+
+    etag = f'"{_content_sha256(storage, key, info)}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(info.mtime_ns / 1e9, usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": _content_disposition(filename),
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if isinstance(storage, LocalBackend):
+        return FileResponse(storage.local_path(key), media_type=media_type, filename=filename, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if "range" in request.headers and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _single_range(request.headers["range"], info.size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{info.size}"})
+    if byte_range is None:
+        headers["Content-Length"] = str(info.size)
+        return StreamingResponse(_stream(storage, key, 0, info.size), media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers.update({"Content-Range": f"bytes {start}-{end - 1}/{info.size}", "Content-Length": str(end - start)})
+    return StreamingResponse(_stream(storage, key, start, end), status_code=206, media_type=media_type, headers=headers)
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
-from typing import Any, List
-import httpx
-from openai import OpenAI
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Callable
 from app.core.config import get_settings
+from app.services.json_stream import JsonStreamScanner
+from app.services.llm import stream_chat_json
+from app.services.llm_deadline import call_with_deadline
+from app.services.llm_schemas import EPIC_ADAPTER, validate_or_none
+from app.services.prompt_budget import budget_prompt
 
 
 @dataclass(frozen=True)
@@ -61,6 +64,39 @@ def _heuristic_epics(*, product_request: str, constraints: str, count: int) -> l
         )
     return epics
 
+def _epic_from_dict(e: Any) -> GeneratedEpic | None:
+    # One compiled validation pass: coerces odd field types, strips text, rejects items without a title.
+    out = validate_or_none(EPIC_ADAPTER, e)
+    return GeneratedEpic(**out.model_dump()) if out is not None else None
+
+
+def _stream_epics(
+    *, system: str, user: dict[str, Any], limit: int, on_epic: Callable[[GeneratedEpic], None] | None
+) -> list[GeneratedEpic]:
+    # Stream the completion and hand each epic to the caller as soon as its JSON object closes.
+    scanner = JsonStreamScanner(mode="items", array_key="epics")
+    epics: list[GeneratedEpic] = []
+    seen = 0
+
+    def _accept(item: Any) -> None:
+        epic = _epic_from_dict(item) if len(epics) < limit else None
+        if epic is None:
+            return
+        epics.append(epic)
+        if on_epic:
+            on_epic(epic)
+
+    for delta in stream_chat_json(system=system, user=json.dumps(user, ensure_ascii=False)):
+        for item in scanner.feed(delta):
+            seen += 1
+            _accept(item)
+    if not scanner.complete:
+        # Truncated completion (token limit / dropped stream): keep what the repaired JSON still holds.
+        for item in scanner.salvage_items(seen):
+            _accept(item)
+    return epics
+
+
 def _openai_generate_epics(
     *,
     product_request: str,
@@ -68,73 +104,73 @@ def _openai_generate_epics(
     citations: list[str],
     constraints: str,
     count: int,
+    research_passages: list[dict[str, str]] | None = None,
+    on_epic: Callable[[GeneratedEpic], None] | None = None,
 ) -> list[GeneratedEpic]:
-    settings = get_settings()
-    if not settings.openai_api_key:
-        return _heuristic_epics(product_request=product_request, constraints=constraints, count=count)
-
-    client = OpenAI(api_key=settings.openai_api_key)
-
     system = (
-        "You are a product planning assistant. "
-        "Generate a prioritized epic backlog grounded in the provided research. "
-        "Return STRICT JSON ONLY using the schema: "
-        "{ \"epics\": [ {"
-        "\"title\": str, \"goal\": str, \"in_scope\": str, \"out_of_scope\": str, "
-        "\"priority\": str, \"priority_reason\": str, "
-        "\"dependencies\": [str], \"risks\": str, \"assumptions\": str, "
-        "\"open_questions\": str, \"success_metrics\": str } ] }"
+        "You are a product planning assistant. Generate a prioritized epic backlog grounded in provided research. "
+        "Return STRICT JSON only, no markdown, as an object: { \"epics\": [ { ...fields... } ] }."
     )
 
-    user_payload = {
-        "product_request": product_request,
-        "research_summary": research_summary,
-        "citations": citations,
-        "constraints": constraints,
-        "count": count,
-        "notes": "Prioritize epics that unblock others. Use P0/P1/P2. Keep dependencies as titles of prerequisite epics.",
-    }
-
-    # Use Chat Completions for broad compatibility. If you prefer, move to Responses API.
-    resp = client.chat.completions.create(
-        model=settings.openai_model,
-        temperature=0.2,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
+    output_requirements = {
+        "epic_count": count,
+        "fields": [
+            "title",
+            "goal",
+            "in_scope",
+            "out_of_scope",
+            "priority",
+            "priority_reason",
+            "dependencies",
+            "risks",
+            "assumptions",
+            "open_questions",
+            "success_metrics",
         ],
+        "priority_values": ["P0", "P1", "P2"],
+        "dependencies": "List epic titles this epic depends on (strings).",
+    }
+    inputs = budget_prompt(
+        "epics",
+        {
+            "product_request": product_request,
+            "constraints": constraints,
+            "research_summary": research_summary,
+            "citations": citations,
+            "research_passages": research_passages or [],
+        },
+        fixed=system + json.dumps(output_requirements),
     )
+    user = {
+        "product_request": inputs["product_request"],
+        "constraints": inputs["constraints"],
+        "research": {
+            "summary": inputs["research_summary"],
+            "citations": inputs["citations"],
+            "relevant_passages": inputs["research_passages"],
+        },
+        "output_requirements": output_requirements,
+    }
 
-    content = resp.choices[0].message.content or "{}"
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        # Defensive: fall back to heuristic to avoid breaking the flow
-        return _heuristic_epics(product_request=product_request, constraints=constraints, count=count)
+    epics = _stream_epics(system=system, user=user, limit=count, on_epic=on_epic)
 
-    items: List[dict[str, Any]] = list(data.get("epics") or [])
-    if not items:
-        return _heuristic_epics(product_request=product_request, constraints=constraints, count=count)
+    if not epics:
+        # Defensive: the stream produced no parsable items; fall back to heuristic to avoid breaking the flow
+        return _emit_all(_heuristic_epics(product_request=product_request, constraints=constraints, count=count), on_epic)
 
-    out: list[GeneratedEpic] = []
-    for e in items[: max(1, count)]:
-        out.append(
-            GeneratedEpic(
-                title=str(e.get("title", "")).strip(),
-                goal=str(e.get("goal", "")).strip(),
-                in_scope=str(e.get("in_scope", "")).strip(),
-                out_of_scope=str(e.get("out_of_scope", "")).strip(),
-                priority=str(e.get("priority", "P1")).strip(),
-                priority_reason=str(e.get("priority_reason", "")).strip(),
-                dependencies=[str(x).strip() for x in (e.get("dependencies") or [])],
-                risks=str(e.get("risks", "")).strip(),
-                assumptions=str(e.get("assumptions", "")).strip(),
-                open_questions=str(e.get("open_questions", "")).strip(),
-                success_metrics=str(e.get("success_metrics", "")).strip(),
-            )
-        )
-    return out
+    # If model returned too few, pad deterministically.
+    if len(epics) < count:
+        padding = _heuristic_epics(product_request=product_request, constraints=constraints, count=count - len(epics))
+        epics.extend(_emit_all(padding, on_epic))
+
+    return epics
+
+
+def _emit_all(epics: list[GeneratedEpic], on_epic: Callable[[GeneratedEpic], None] | None) -> list[GeneratedEpic]:
+    if on_epic:
+        for e in epics:
+            on_epic(e)
+    return epics
 
 
 def generate_epics(
@@ -144,110 +180,132 @@ def generate_epics(
     citations: list[str],
     constraints: str,
     count: int,
+    research_passages: list[dict[str, str]] | None = None,
+    on_epic: Callable[[GeneratedEpic], None] | None = None,
+    on_upgrade: Callable[[list[GeneratedEpic]], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
 ) -> list[GeneratedEpic]:
+    # Prefer OpenAI if configured; otherwise deterministic fallback.
+    # research_passages: research/PDF excerpts ranked for this request (see research_passages.relevant_passages).
+    # on_epic is called once per epic, in order, as soon as it is available; on_reset means discard those
+    # streamed so far, the returned epics are streamed again from the first.
+    # If the LLM misses its deadline the heuristic epics are returned; on_upgrade gets the LLM epics if they arrive later.
     settings = get_settings()
     if settings.openai_api_key:
-        return _openai_generate_epics(
-            product_request=product_request,
-            research_summary=research_summary,
-            citations=citations,
-            constraints=constraints,
-            count=count,
+        return call_with_deadline(
+            "epics",
+            lambda cb, _reset: _openai_generate_epics(
+                product_request=product_request,
+                research_summary=research_summary,
+                citations=citations,
+                constraints=constraints,
+                count=count,
+                research_passages=research_passages,
+                on_epic=cb,
+            ),
+            fallback=lambda: _emit_all(_heuristic_epics(product_request=product_request, constraints=constraints, count=count), on_epic),
+            on_item=on_epic,
+            on_late_result=on_upgrade,
+            on_reset=on_reset,
+            replay=lambda epics: _emit_all(epics, on_epic),
         )
-    return _heuristic_epics(product_request=product_request, constraints=constraints, count=count)
+    return _emit_all(_heuristic_epics(product_request=product_request, constraints=constraints, count=count), on_epic)
 
 
-def _openai_generate_epics(*, product_request: str, research_summary: str, citations: list[str], constraints: str, count: int) -> list[GeneratedEpic]:
-    settings = get_settings()
-    if not settings.openai_api_key:
-        return _heuristic_epics(product_request=product_request, constraints=constraints, count=count)
+def _heuristic_revisions(changed: list[tuple[GeneratedEpic, str]]) -> list[GeneratedEpic]:
+    # Deterministic fallback: keep the epic's shape and fold the reviewer feedback into it.
+    out: list[GeneratedEpic] = []
+    for epic, feedback in changed:
+        note = feedback.strip() or "Reviewer requested changes."
+        out.append(
+            replace(
+                epic,
+                goal=f"{epic.goal} (Revised: {note})",
+                assumptions=f"{epic.assumptions} Revised per feedback: {note}".strip(),
+            )
+        )
+    return out
+
 
+def _openai_regenerate_epics(
+    *,
+    product_request: str,
+    research_summary: str,
+    constraints: str,
+    kept: list[GeneratedEpic],
+    changed: list[tuple[GeneratedEpic, str]],
+    research_passages: list[dict[str, str]] | None = None,
+    on_epic: Callable[[GeneratedEpic], None] | None = None,
+) -> list[GeneratedEpic]:
     system = (
-        "You are a product planning assistant. Generate a prioritized epic backlog grounded in provided research. "
-        "Return STRICT JSON only, no markdown."
+        "You are a product planning assistant revising an epic backlog. Rewrite ONLY the epics listed under "
+        "'revise', applying each one's reviewer feedback, and keep them consistent with the epics that stay. "
+        "Return STRICT JSON only, no markdown: { \"epics\": [ ...one revised epic per item in 'revise', same order... ] }."
     )
-
-    user = {
-        "product_request": product_request,
-        "constraints": constraints,
-        "research": {
-            "summary": research_summary,
-            "citations": citations,
-        },
-        "output_requirements": {
-            "epic_count": count,
-            "fields": [
-                "title",
-                "goal",
-                "in_scope",
-                "out_of_scope",
-                "priority",
-                "priority_reason",
-                "dependencies",
-                "risks",
-                "assumptions",
-                "open_questions",
-                "success_metrics",
-            ],
-            "priority_values": ["P0", "P1", "P2"],
-            "dependencies": "List epic titles this epic depends on (strings).",
+    inputs = budget_prompt(
+        "epics.regenerate",
+        {
+            "product_request": product_request,
+            "constraints": constraints,
+            "research_summary": research_summary,
+            "research_passages": research_passages or [],
         },
+        fixed=system + json.dumps({"revise": [{"epic": asdict(e), "feedback": f} for e, f in changed]}),
+    )
+    user = {
+        "product_request": inputs["product_request"],
+        "constraints": inputs["constraints"],
+        "research_summary": inputs["research_summary"],
+        "relevant_research_passages": inputs["research_passages"],
+        # Kept epics only need enough context for consistency and dependency names.
+        "keep": [{"title": e.title, "priority": e.priority, "dependencies": e.dependencies} for e in kept],
+        "revise": [{"epic": asdict(e), "feedback": feedback} for e, feedback in changed],
+        "fields": list(GeneratedEpic.__dataclass_fields__),
     }
 
-    payload: dict[str, Any] = {
-        "model": settings.openai_model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user, ensure_ascii=False)},
-        ],
-        "temperature": 0.2,
-    }
+    revised = _stream_epics(system=system, user=user, limit=len(changed), on_epic=on_epic)
 
-    headers = {"Authorization": f"Bearer {settings.openai_api_key}", "Content-Type": "application/json"}
-    with httpx.Client(timeout=60.0) as client:
-        r = client.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    # Anything the model skipped falls back to a deterministic revision of that epic.
+    if len(revised) < len(changed):
+        revised.extend(_emit_all(_heuristic_revisions(changed[len(revised):]), on_epic))
+    return revised
 
-    content = data["choices"][0]["message"]["content"]
-    parsed = json.loads(content)
-    epics_raw = parsed["epics"] if isinstance(parsed, dict) and "epics" in parsed else parsed
 
-    epics: list[GeneratedEpic] = []
-    for e in epics_raw[:count]:
-        epics.append(
-            GeneratedEpic(
-                title=str(e.get("title", "")),
-                goal=str(e.get("goal", "")),
-                in_scope=str(e.get("in_scope", "")),
-                out_of_scope=str(e.get("out_of_scope", "")),
-                priority=str(e.get("priority", "P1")),
-                priority_reason=str(e.get("priority_reason", "")),
-                dependencies=list(e.get("dependencies", []) or []),
-                risks=str(e.get("risks", "")),
-                assumptions=str(e.get("assumptions", "")),
-                open_questions=str(e.get("open_questions", "")),
-                success_metrics=str(e.get("success_metrics", "")),
-            )
+def regenerate_epics(
+    *,
+    product_request: str,
+    research_summary: str,
+    constraints: str,
+    kept: list[GeneratedEpic],
+    changed: list[tuple[GeneratedEpic, str]],
+    research_passages: list[dict[str, str]] | None = None,
+    on_epic: Callable[[GeneratedEpic], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
+) -> list[GeneratedEpic]:
+    """
+    Partial regeneration: returns one revised epic per (epic, feedback) in `changed`, in order.
+    Only the changed epics (plus a compact outline of the kept ones) are sent to the LLM.
+    on_reset means discard the revised epics streamed so far; they are streamed again from the first.
+    """
+    settings = get_settings()
+    if settings.openai_api_key:
+        return call_with_deadline(
+            "epics.regenerate",
+            lambda cb, _reset: _openai_regenerate_epics(
+                product_request=product_request,
+                research_summary=research_summary,
+                constraints=constraints,
+                kept=kept,
+                changed=changed,
+                research_passages=research_passages,
+                on_epic=cb,
+            ),
+            fallback=lambda: _emit_all(_heuristic_revisions(changed), on_epic),
+            on_item=on_epic,
+            on_reset=on_reset,
+            replay=lambda revised: _emit_all(revised, on_epic),
         )
-
-    # If model returned too few, pad deterministically.
-    if len(epics) < count:
-        epics.extend(_heuristic_epics(product_request=product_request, constraints=constraints, count=count - len(epics)))
-
-    return epics
-
-
-def generate_epics(*, product_request: str, research_summary: str, citations: list[str], constraints: str, count: int) -> list[GeneratedEpic]:
-    # Prefer OpenAI if configured; otherwise deterministic fallback.
-    return _openai_generate_epics(
-        product_request=product_request,
-        research_summary=research_summary,
-        citations=citations,
-        constraints=constraints,
-        count=count,
-    )
-
+    return _emit_all(_heuristic_revisions(changed), on_epic)
 
 
 def make_mermaid_dependency_graph(epics: list[GeneratedEpic]) -> str:
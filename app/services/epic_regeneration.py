@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import itertools
+import json
+from dataclasses import asdict
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.db import session as db_session
+from app.db.models import Epic, EpicBatch, EpicBatchStatus, EpicStatus, Project, ResearchAppendix, Run, RunStatus
+from app.services.epic_generation import GeneratedEpic, make_mermaid_dependency_graph, regenerate_epics
+from app.services.llm_scheduler import llm_request_context
+from app.services.research_passages import relevant_passages
+from app.services.run_events import emit_run_event
+from app.services.storage import get_storage, run_key
+
+
+CHANGED_EPIC_STATUSES = (EpicStatus.rejected, EpicStatus.changes_requested)
+
+
+def _generated_from_row(row: Epic) -> GeneratedEpic:
+    return GeneratedEpic(
+        title=row.title,
+        goal=row.goal,
+        in_scope=row.in_scope,
+        out_of_scope=row.out_of_scope,
+        priority=row.priority,
+        priority_reason=row.priority_reason,
+        dependencies=json.loads(row.dependencies_json or "[]"),
+        risks=row.risks,
+        assumptions=row.assumptions,
+        open_questions=row.open_questions,
+        success_metrics=row.success_metrics,
+    )
+
+
+def changed_epic_ids(db: Session, *, batch_id: str) -> list[str]:
+    rows = (
+        db.query(Epic.id)
+        .filter(Epic.batch_id == batch_id, Epic.status.in_(CHANGED_EPIC_STATUSES))
+        .order_by(Epic.created_at.asc())
+        .all()
+    )
+    return [str(r[0]) for r in rows]
+
+
+def regenerate_epic_batch_job(*, project_id: str, source_batch_id: str, run_id: str, constraints: str) -> dict[str, Any]:
+    """
+    Worker thread job for partial epic regeneration.
+    Writes a new batch: unchanged epics (proposed/approved) are moved into it as-is, so their ids and any
+    stories hanging off them stay valid; rejected/changes_requested epics are revised by the LLM and
+    inserted as new rows. The source batch keeps only the superseded epics.
+    Returns {"batch_id":..., "kept_epic_ids":[...], "regenerated_epic_ids":[...], "mermaid_path": "..."}.
+    """
+    db = db_session.SessionLocal()
+    try:
+        project = db.get(Project, project_id)
+        research = (
+            db.query(ResearchAppendix)
+            .filter(ResearchAppendix.project_id == project_id)
+            .order_by(ResearchAppendix.created_at.desc())
+            .first()
+        )
+        rows = db.query(Epic).filter(Epic.batch_id == source_batch_id).order_by(Epic.created_at.asc()).all()
+        kept_rows = [r for r in rows if r.status not in CHANGED_EPIC_STATUSES]
+        changed_rows = [r for r in rows if r.status in CHANGED_EPIC_STATUSES]
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="epics.started",
+            message=f"Regenerating {len(changed_rows)} of {len(rows)} epics",
+            payload={"mode": "partial", "source_batch_id": source_batch_id, "kept": len(kept_rows), "changed": len(changed_rows)},
+        )
+
+        partial_index = itertools.count()
+
+        def _emit_partial(e: GeneratedEpic) -> None:
+            idx = next(partial_index)
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="epics.partial",
+                message=f"Revised epic {idx + 1} ready: {e.title}",
+                payload={"index": idx, "epic": asdict(e), "replaces": str(changed_rows[idx].id) if idx < len(changed_rows) else None},
+            )
+
+        def _reset_partials() -> None:
+            nonlocal partial_index
+            partial_index = itertools.count()
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="epics.partial_reset",
+                message="Streamed epics discarded; replacements follow",
+            )
+
+        # Passages are ranked against what is being revised: the changed epics and their feedback.
+        passages = relevant_passages(
+            db,
+            project_id=project_id,
+            appendix=research,
+            query="\n".join(f"{r.title}\n{r.goal}\n{r.feedback or ''}" for r in changed_rows),
+        )
+        with llm_request_context(user_id=str(project.owner_id), run_id=run_id):
+            revised = regenerate_epics(
+                product_request=project.product_request,
+                research_summary=research.summary if research else "",
+                constraints=constraints,
+                kept=[_generated_from_row(r) for r in kept_rows],
+                changed=[(_generated_from_row(r), r.feedback or "") for r in changed_rows],
+                research_passages=passages,
+                on_epic=_emit_partial,
+                on_reset=_reset_partials,
+            )
+
+        # The graph covers the whole new batch, in the original order with revisions in their slots. It is
+        # written before the rows so that nothing fallible is left between their commit and the events.
+        revised_iter = iter(revised)
+        ordered = [next(revised_iter) if r.status in CHANGED_EPIC_STATUSES else _generated_from_row(r) for r in rows]
+        mermaid = make_mermaid_dependency_graph(ordered)
+        storage = get_storage()
+        mmd_key = run_key(project_id, run_id, "epic_dependency_graph.mmd")
+        storage.write_text(mmd_key, mermaid)
+
+        # One transaction: the new batch, the kept epics moving into it and the revised rows land together or
+        # not at all, so a failure never leaves the source batch stripped of its kept epics.
+        batch = EpicBatch(project_id=project_id, run_id=run_id, constraints=constraints, status=EpicBatchStatus.generated)
+        db.add(batch)
+        db.flush()
+
+        for row in kept_rows:
+            row.batch_id = batch.id
+        new_rows: list[Epic] = []
+        for e in revised:
+            row = Epic(
+                project_id=project_id,
+                batch_id=batch.id,
+                title=e.title,
+                goal=e.goal,
+                in_scope=e.in_scope,
+                out_of_scope=e.out_of_scope,
+                priority=e.priority,
+                priority_reason=e.priority_reason,
+                dependencies_json=json.dumps(e.dependencies, ensure_ascii=False),
+                risks=e.risks,
+                assumptions=e.assumptions,
+                open_questions=e.open_questions,
+                success_metrics=e.success_metrics,
+                status=EpicStatus.proposed,
+            )
+            new_rows.append(row)
+            db.add(row)
+        db.commit()
+
+        kept_ids = [str(r.id) for r in kept_rows]
+        regenerated_ids = [str(r.id) for r in new_rows]
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="epics.generated",
+            message=f"Regenerated {len(new_rows)} epics, kept {len(kept_rows)}",
+            payload={
+                "batch_id": str(batch.id),
+                "source_batch_id": source_batch_id,
+                "kept_epic_ids": kept_ids,
+                "regenerated_epic_ids": regenerated_ids,
+                "replaced_epic_ids": [str(r.id) for r in changed_rows],
+            },
+        )
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="epics.mermaid",
+            message="Mermaid dependency graph saved",
+            payload={"path": storage.uri(mmd_key)},
+        )
+
+        run = db.get(Run, run_id)
+        if run:
+            run.status = RunStatus.completed
+            db.commit()
+
+        return {
+            "batch_id": str(batch.id),
+            "kept_epic_ids": kept_ids,
+            "regenerated_epic_ids": regenerated_ids,
+            "mermaid_path": storage.uri(mmd_key),
+        }
+    except Exception as ex:
+        db.rollback()
+        try:
+            emit_run_event(db, run_id=run_id, event_type="epics.error", message=f"Epic regeneration failed: {type(ex).__name__}: {ex}")
+            run = db.get(Run, run_id)
+            if run:
+                run.status = RunStatus.failed
+                db.commit()
+        except Exception:
+            pass
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import BigInteger, and_, bindparam, func, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.models import Job, JobStatus, Project, Run, RunStatus
+from app.services.run_events import emit_run_event
+
+
+# Durable jobs live in the `jobs` table, so they survive API restarts and can be run by separate worker
+# processes. A worker claims a job with a compare-and-set UPDATE (works on SQLite and Postgres alike) and
+# holds it under a lease that a heartbeat renews while the handler runs. If the worker dies, the lease
+# lapses and any other worker reclaims the job; failures are retried with exponential backoff.
+
+JOB_RESEARCH = "research"
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict[str, Callable[..., None]] = {}
+# Set on enqueue so in-process workers pick new jobs up at once instead of on their next poll.
+_wakeup = threading.Event()
+
+
+def job_handler(kind: str) -> Callable[[Callable[..., None]], Callable[..., None]]:
+    """Registers the function that runs jobs of `kind`; it is called with the job payload as keyword arguments."""
+
+    def _register(fn: Callable[..., None]) -> Callable[..., None]:
+        _handlers[kind] = fn
+        return fn
+
+    return _register
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def enqueue_job(db: Session, *, kind: str, payload: dict[str, Any], run_id: str | None = None, commit: bool = True) -> Job:
+    """
+    Adds a job and commits (together with anything else pending on `db`, e.g. its run). With commit=False the
+    caller commits, e.g. a batch of jobs in one transaction, and then calls wake_workers().
+    """
+    job = Job(
+        kind=kind,
+        run_id=run_id,
+        payload_json=json.dumps(payload, ensure_ascii=False),
+        max_attempts=max(1, get_settings().job_max_attempts),
+        available_at=_utcnow(),
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+        db.refresh(job)
+        _wakeup.set()
+    return job
+
+
+def wake_workers() -> None:
+    _wakeup.set()
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(Job.status == JobStatus.queued, Job.available_at <= now),
+        # A running job whose lease lapsed belongs to a worker that died or hung.
+        and_(Job.status == JobStatus.running, Job.lease_expires_at < now),
+    )
+
+
+def _kind_limits() -> dict[str, int]:
+    # Global caps across all workers, so e.g. a bulk import's research cannot occupy every worker thread.
+    limit = get_settings().research_job_concurrency
+    return {JOB_RESEARCH: limit} if limit > 0 else {}
+
+
+def _running(kind: str, now: datetime):
+    return (
+        select(func.count())
+        .select_from(Job)
+        .where(Job.kind == kind, Job.status == JobStatus.running, Job.lease_expires_at >= now)
+        .scalar_subquery()
+    )
+
+
+def _serialize_claims(db: Session, kind: str) -> None:
+    # SQLite runs one writer at a time, so the cap re-check inside the claiming UPDATE is exact there. Under
+    # Postgres READ COMMITTED two concurrent claims would each miss the other's; a transaction-scoped advisory
+    # lock per kind (released by the claim's commit) makes them take turns instead.
+    if db.get_bind().dialect.name == "postgresql":
+        key = int.from_bytes(hashlib.blake2b(f"job-claim:{kind}".encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)").bindparams(bindparam("key", key, type_=BigInteger)))
+
+
+def claim_job(db: Session, *, worker_id: str, kinds: list[str] | None = None) -> Job | None:
+    """
+    Claims the oldest available job (or one with an expired lease) for `worker_id`, or returns None.
+    Kinds already running at their global cap (RESEARCH_JOB_CONCURRENCY) are skipped.
+    """
+    lease = timedelta(seconds=get_settings().job_lease_seconds)
+    limits = _kind_limits()
+    for _ in range(5):
+        now = _utcnow()
+        full = [kind for kind, limit in limits.items() if db.scalar(select(_running(kind, now))) >= limit]
+        q = db.query(Job.id, Job.kind).filter(_claimable(now))
+        if kinds:
+            q = q.filter(Job.kind.in_(kinds))
+        if full:
+            q = q.filter(Job.kind.not_in(full))
+        row = q.order_by(Job.available_at.asc(), Job.created_at.asc()).limit(1).first()
+        if row is None:
+            return None
+        job_id, kind = row
+        conditions = [Job.id == job_id, _claimable(now)]
+        if kind in limits:
+            # Re-checked in the claiming UPDATE itself, so concurrent claims cannot overshoot the cap.
+            _serialize_claims(db, kind)
+            conditions.append(_running(kind, now) < limits[kind])
+        # Only one worker's UPDATE can still match the claimable condition; the others retry with the next job.
+        claimed = db.execute(
+            update(Job)
+            .where(*conditions)
+            .values(
+                status=JobStatus.running,
+                lease_owner=worker_id,
+                lease_expires_at=now + lease,
+                attempts=Job.attempts + 1,
+                updated_at=now,
+            )
+        ).rowcount
+        db.commit()
+        if claimed == 1:
+            return db.get(Job, job_id)
+    return None
+
+
+def heartbeat(db: Session, *, job_id: str, worker_id: str) -> bool:
+    """Renews the lease; False means the job was reclaimed by another worker and this one should give it up."""
+    now = _utcnow()
+    renewed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.lease_owner == worker_id, Job.status == JobStatus.running)
+        .values(lease_expires_at=now + timedelta(seconds=get_settings().job_lease_seconds), updated_at=now)
+    ).rowcount
+    db.commit()
+    return renewed == 1
+
+
+def complete_job(db: Session, *, job: Job, worker_id: str) -> None:
+    db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.lease_owner == worker_id)
+        .values(status=JobStatus.succeeded, lease_owner=None, lease_expires_at=None, updated_at=_utcnow())
+    )
+    db.commit()
+
+
+def fail_job(db: Session, *, job: Job, worker_id: str, error: str) -> bool:
+    """Records a failed attempt. Returns True if the job was requeued with backoff, False if it failed for good."""
+    settings = get_settings()
+    now = _utcnow()
+    retry = job.attempts < job.max_attempts
+    values: dict[str, Any] = {"last_error": error[:2000], "lease_owner": None, "lease_expires_at": None, "updated_at": now}
+    if retry:
+        delay = settings.job_retry_backoff_seconds * (2 ** (job.attempts - 1))
+        values.update(status=JobStatus.queued, available_at=now + timedelta(seconds=delay))
+    else:
+        values.update(status=JobStatus.failed)
+    updated = db.execute(update(Job).where(Job.id == job.id, Job.lease_owner == worker_id).values(**values)).rowcount
+    db.commit()
+    if not updated or job.run_id is None:
+        return retry
+
+    if retry:
+        emit_run_event(
+            db,
+            run_id=job.run_id,
+            event_type="job.retrying",
+            message=f"Attempt {job.attempts} of {job.max_attempts} failed; retrying in {delay:g}s",
+            payload={"job_id": job.id, "attempt": job.attempts, "delay_seconds": delay, "error": error},
+        )
+    else:
+        # The run is marked failed before the event goes out, so whoever reacts to job.failed sees it.
+        run = db.get(Run, job.run_id)
+        if run and run.status == RunStatus.started:
+            run.status = RunStatus.failed
+            db.commit()
+        emit_run_event(
+            db,
+            run_id=job.run_id,
+            event_type="job.failed",
+            message=f"Job failed after {job.attempts} attempts",
+            payload={"job_id": job.id, "attempts": job.attempts, "error": error},
+        )
+    return retry
+
+
+def recover_orphaned_runs(db: Session) -> int:
+    """
+    Backlog runs left in `started` with no job (e.g. started as in-process background tasks before the
+    queue existed, then lost on restart) are queued again. Returns how many were recovered.
+    """
+    orphans = (
+        db.query(Run)
+        .outerjoin(Job, Job.run_id == Run.id)
+        .filter(Run.run_type == "backlog_generation", Run.status == RunStatus.started, Job.id.is_(None))
+        .all()
+    )
+    for run in orphans:
+        project = db.get(Project, run.project_id)
+        if project is None:
+            continue
+        enqueue_job(
+            db,
+            kind=JOB_RESEARCH,
+            run_id=run.id,
+            payload={"project_id": run.project_id, "run_id": run.id, "product_request": project.product_request},
+        )
+        emit_run_event(db, run_id=run.id, event_type="run.recovered", message="Run had no worker; research queued again")
+    return len(orphans)
+
+
+class Worker:
+    """
+    Claims and runs jobs on `concurrency` threads until stopped.
+    Used embedded in the API process (JOB_WORKER_EMBEDDED) and by the standalone `python -m app.worker`.
+    """
+
+    def __init__(self, *, concurrency: int = 1, kinds: list[str] | None = None, name: str | None = None) -> None:
+        self.concurrency = max(1, concurrency)
+        self.kinds = kinds
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def run_once(self, *, worker_id: str | None = None) -> bool:
+        """Claims and runs at most one job; returns whether there was one."""
+        worker_id = worker_id or self.name
+        db = db_session.SessionLocal()
+        try:
+            job = claim_job(db, worker_id=worker_id, kinds=self.kinds)
+            if job is None:
+                return False
+            if job.attempts > job.max_attempts:
+                # Reclaimed after its last attempt's worker died: don't run it again.
+                fail_job(db, job=job, worker_id=worker_id, error=job.last_error or "Worker lost during final attempt")
+                return True
+            self._execute(db, job, worker_id)
+            return True
+        finally:
+            db.close()
+
+    def _execute(self, db: Session, job: Job, worker_id: str) -> None:
+        handler = _handlers.get(job.kind)
+        done = threading.Event()
+
+        def _beat() -> None:
+            interval = max(get_settings().job_lease_seconds / 3, 0.05)
+            beat_db = db_session.SessionLocal()
+            try:
+                while not done.wait(interval):
+                    if not heartbeat(beat_db, job_id=job.id, worker_id=worker_id):
+                        logger.warning("Lost lease on job %s", job.id)
+                        return
+            finally:
+                beat_db.close()
+
+        beat = threading.Thread(target=_beat, name=f"job-heartbeat-{job.id[:8]}", daemon=True)
+        beat.start()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {job.kind!r}")
+            handler(**json.loads(job.payload_json or "{}"))
+        except Exception as ex:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            done.set()
+            fail_job(db, job=job, worker_id=worker_id, error=f"{type(ex).__name__}: {ex}")
+        else:
+            done.set()
+            complete_job(db, job=job, worker_id=worker_id)
+        finally:
+            beat.join()
+
+    def _loop(self, worker_id: str) -> None:
+        poll = get_settings().job_poll_interval_seconds
+        while not self._stop.is_set():
+            _wakeup.clear()
+            try:
+                if self.run_once(worker_id=worker_id):
+                    continue
+            except Exception:
+                logger.exception("Job worker %s failed to claim a job", worker_id)
+            _wakeup.wait(poll)
+
+    def start(self) -> None:
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._loop, args=(f"{self.name}/{i}",), name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def request_stop(self) -> None:
+        self._stop.set()
+        _wakeup.set()
+
+    def stop(self, timeout: float | None = 10.0) -> None:
+        """Stops claiming; waits up to `timeout` for running jobs (unfinished ones are reclaimed after their lease)."""
+        self.request_stop()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+
+    def run_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self.stop()
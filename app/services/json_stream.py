@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+
+_MEMBER_KEY_RE = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*$', re.DOTALL)
+_MAX_REPAIR_ATTEMPTS = 64
+
+
+def repair_truncated_json(text: str) -> Any | None:
+    """
+    Best-effort parse of a JSON document cut off mid-stream (e.g. max_tokens or a dropped connection).
+    Closes an open string and any open containers; if that does not parse, backs off to the previous
+    structural boundary (comma or bracket) and closes from there. Returns None if nothing parses.
+    """
+    stack: list[str] = []
+    cuts: list[tuple[int, tuple[str, ...]]] = []  # (prefix length to keep, containers open at that point)
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+            cuts.append((i + 1, tuple(stack)))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cuts.append((i + 1, tuple(stack)))
+        elif ch == ",":
+            cuts.append((i, tuple(stack)))
+
+    def _close(open_containers: tuple[str, ...] | list[str]) -> str:
+        return "".join("}" if c == "{" else "]" for c in reversed(open_containers))
+
+    head = text
+    if in_string:
+        head = (text[:-1] if escape else text) + '"'
+    candidates = [head + _close(stack)]
+    candidates.extend(text[:end] + _close(open_at) for end, open_at in reversed(cuts[-_MAX_REPAIR_ATTEMPTS:]))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class JsonStreamScanner:
+    """
+    Incremental scanner over a streamed JSON completion.
+
+    Feed text deltas as they arrive; each call returns the values that became complete:
+      - mode="items":   elements of the array stored under `array_key` (or a top-level array)
+      - mode="members": (key, value) pairs of the top-level object
+    Values that fail to parse are skipped; the full text stays available via `text`.
+    """
+
+    def __init__(self, *, mode: str = "items", array_key: str | None = None) -> None:
+        if mode not in ("items", "members"):
+            raise ValueError(f"Unknown scanner mode: {mode}")
+        self.mode = mode
+        self.array_key = array_key
+
+        # Every delta is kept for `text`/`repair`, but scanning only ever touches the "window": the deltas from
+        # the earliest still-open item/member onward, so a long completion is not re-copied on each delta.
+        self._chunks: list[str] = []
+        self._window: list[str] = []
+        self._window_start = 0  # absolute offset of self._window[0]
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+
+        self._member_start: int | None = None  # start of the current depth-1 member (None once emitted)
+        self._target_depth: int | None = None  # depth of the array whose items we emit
+        self._item_start: int | None = None
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    @property
+    def complete(self) -> bool:
+        """True once the target array (items) or the top-level object (members) has closed."""
+        return self._done
+
+    def repair(self) -> Any | None:
+        """Parses the text received so far as if the stream had ended cleanly; see repair_truncated_json."""
+        return repair_truncated_json(self.text)
+
+    def salvage_items(self, seen: int) -> list[Any]:
+        """Items mode, after a truncated stream: elements of the repaired array beyond the `seen` already yielded."""
+        doc = self.repair()
+        if isinstance(doc, dict):
+            doc = doc.get(self.array_key) if self.array_key else None
+        return doc[seen:] if isinstance(doc, list) else []
+
+    def feed(self, chunk: str) -> list[Any]:
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        out: list[Any] = []
+        offset = self._pos
+        self._pos += len(chunk)
+        if self._done:
+            return out
+        self._window.append(chunk)
+
+        for i, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._open(ch, offset + i)
+            elif ch in "}]":
+                self._close(offset + i, out)
+                if self._done:
+                    self._window = []
+                    return out
+            elif ch == ",":
+                self._separator(offset + i, out)
+
+        self._trim_window()
+        return out
+
+    def _slice(self, start: int, end: int) -> str:
+        if len(self._window) > 1:
+            self._window = ["".join(self._window)]
+        return self._window[0][start - self._window_start : end - self._window_start]
+
+    def _trim_window(self) -> None:
+        keep = min(p for p in (self._member_start, self._item_start, self._pos) if p is not None)
+        while self._window and self._window_start + len(self._window[0]) <= keep:
+            self._window_start += len(self._window.pop(0))
+        if self._window and self._window_start < keep:
+            self._window[0] = self._window[0][keep - self._window_start :]
+            self._window_start = keep
+
+    def _open(self, ch: str, pos: int) -> None:
+        depth_before = len(self._stack)
+        self._stack.append(ch)
+
+        if self.mode == "members":
+            if depth_before == 0 and ch == "{":
+                self._member_start = pos + 1
+            return
+
+        if self._target_depth is not None or ch != "[":
+            if depth_before == 0 and ch == "{":
+                self._member_start = pos + 1
+            return
+
+        if depth_before == 0:
+            # Bare top-level array: its elements are the items.
+            self._target_depth = 1
+            self._item_start = pos + 1
+        elif depth_before == 1 and self._stack[0] == "{" and self._member_start is not None:
+            m = _MEMBER_KEY_RE.match(self._slice(self._member_start, pos))
+            if m and (self.array_key is None or m.group(1) == self.array_key):
+                self._target_depth = 2
+                self._item_start = pos + 1
+                self._member_start = None  # only needed to read the key; don't pin the whole array in the window
+
+    def _close(self, pos: int, out: list[Any]) -> None:
+        depth = len(self._stack)
+        if self.mode == "members":
+            if depth == 1:
+                self._emit_member(pos, out)
+                self._done = True
+            elif depth == 2:
+                # An object/array member value just closed: emit without waiting for the next separator.
+                self._emit_member(pos + 1, out)
+        elif self._target_depth is not None:
+            if depth == self._target_depth:
+                self._emit_item(pos, out)
+                self._done = True
+            elif depth == self._target_depth + 1:
+                self._emit_item(pos + 1, out)
+        if self._stack:
+            self._stack.pop()
+
+    def _separator(self, pos: int, out: list[Any]) -> None:
+        depth = len(self._stack)
+        if depth == 1 and self._stack[0] == "{":
+            if self.mode == "members":
+                self._emit_member(pos, out)
+            self._member_start = pos + 1
+        if self.mode == "items" and self._target_depth is not None and depth == self._target_depth:
+            self._emit_item(pos, out)
+            self._item_start = pos + 1
+
+    def _emit_member(self, end: int, out: list[Any]) -> None:
+        if self._member_start is None:
+            return
+        raw = self._slice(self._member_start, end).strip()
+        self._member_start = None
+        if not raw:
+            return
+        try:
+            parsed = json.loads("{" + raw + "}")
+        except json.JSONDecodeError:
+            return
+        for key, value in parsed.items():
+            out.append((key, value))
+
+    def _emit_item(self, end: int, out: list[Any]) -> None:
+        if self._item_start is None:
+            return
+        raw = self._slice(self._item_start, end).strip()
+        self._item_start = None
+        if not raw:
+            return
+        try:
+            out.append(json.loads(raw))
+        except json.JSONDecodeError:
+            return
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from app.db import session as db_session
+from app.db.models import (
+    Epic, EpicBatch, EpicBatchStatus, EpicStatus,
+    SpecDocument, SpecStatus,
+    Story, StoryBatch, StoryBatchStatus, StoryStatus,
+)
+from app.services.epic_generation import GeneratedEpic, make_mermaid_dependency_graph
+from app.services.run_events import emit_run_event
+from app.services.storage import get_storage, run_key
+from app.services.story_generation import GeneratedStory
+
+# Late LLM results replace a deterministic fallback only while nobody has acted on it yet:
+# the batch/spec is untouched (still generated/proposed, no feedback). Row ids are kept where
+# possible so clients holding them stay valid.
+
+
+def upgrade_epic_batch(epics: list[GeneratedEpic], *, batch_id: str, run_id: str) -> bool:
+    db = db_session.SessionLocal()
+    try:
+        batch = db.get(EpicBatch, batch_id)
+        rows = db.query(Epic).filter(Epic.batch_id == batch_id).order_by(Epic.created_at.asc()).all()
+        if (
+            not batch
+            or batch.status != EpicBatchStatus.generated
+            or any(r.status != EpicStatus.proposed or r.feedback for r in rows)
+        ):
+            emit_run_event(db, run_id=run_id, event_type="epics.upgrade_skipped", message="LLM epics arrived after the batch was reviewed")
+            return False
+
+        for i, e in enumerate(epics):
+            row = rows[i] if i < len(rows) else Epic(project_id=batch.project_id, batch_id=batch_id, status=EpicStatus.proposed)
+            row.title = e.title
+            row.goal = e.goal
+            row.in_scope = e.in_scope
+            row.out_of_scope = e.out_of_scope
+            row.priority = e.priority
+            row.priority_reason = e.priority_reason
+            row.dependencies_json = json.dumps(e.dependencies, ensure_ascii=False)
+            row.risks = e.risks
+            row.assumptions = e.assumptions
+            row.open_questions = e.open_questions
+            row.success_metrics = e.success_metrics
+            db.add(row)
+        for row in rows[len(epics):]:
+            db.delete(row)
+        db.commit()
+
+        get_storage().write_text(run_key(batch.project_id, run_id, "epic_dependency_graph.mmd"), make_mermaid_dependency_graph(epics))
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="epics.upgraded",
+            message=f"Replaced fallback epics with {len(epics)} LLM epics",
+            payload={"batch_id": batch_id, "epic_count": len(epics)},
+        )
+        return True
+    finally:
+        db.close()
+
+
+def upgrade_story_batch(stories: list[GeneratedStory], *, batch_id: str, run_id: str) -> bool:
+    db = db_session.SessionLocal()
+    try:
+        batch = db.get(StoryBatch, batch_id)
+        rows = db.query(Story).filter(Story.batch_id == batch_id).order_by(Story.created_at.asc()).all()
+        if (
+            not batch
+            or batch.status != StoryBatchStatus.generated
+            or any(r.status != StoryStatus.proposed or r.feedback for r in rows)
+        ):
+            emit_run_event(db, run_id=run_id, event_type="stories.upgrade_skipped", message="LLM stories arrived after the batch was reviewed")
+            return False
+
+        for i, s in enumerate(stories):
+            row = rows[i] if i < len(rows) else Story(
+                project_id=batch.project_id, epic_id=batch.epic_id, batch_id=batch_id, status=StoryStatus.proposed
+            )
+            row.statement = s.statement
+            row.acceptance_criteria_json = json.dumps(s.acceptance_criteria, ensure_ascii=False)
+            row.edge_cases = s.edge_cases
+            row.non_functional = s.non_functional
+            row.estimate = s.estimate
+            row.estimate_reason = s.estimate_reason
+            row.dependencies_json = json.dumps(s.dependencies, ensure_ascii=False)
+            db.add(row)
+        for row in rows[len(stories):]:
+            db.delete(row)
+        db.commit()
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.upgraded",
+            message=f"Replaced fallback stories with {len(stories)} LLM stories",
+            payload={"batch_id": batch_id, "epic_id": str(batch.epic_id), "story_count": len(stories)},
+        )
+        return True
+    finally:
+        db.close()
+
+
+def upgrade_spec_document(spec_payload: dict[str, Any], *, spec_id: str, run_id: str) -> bool:
+    db = db_session.SessionLocal()
+    try:
+        doc = db.get(SpecDocument, spec_id)
+        if not doc or doc.status != SpecStatus.proposed:
+            emit_run_event(db, run_id=run_id, event_type="specs.upgrade_skipped", message="LLM spec arrived after the spec was reviewed")
+            return False
+
+        doc.overview = spec_payload.get("overview", "")
+        doc.goals = spec_payload.get("goals", "")
+        doc.functional_requirements_json = json.dumps(spec_payload.get("functional_requirements", []), ensure_ascii=False)
+        doc.api_contracts_json = json.dumps(spec_payload.get("api_contracts", []), ensure_ascii=False)
+        doc.data_model_changes_json = json.dumps(spec_payload.get("data_model_changes", []), ensure_ascii=False)
+        doc.security_considerations = spec_payload.get("security_considerations", "")
+        doc.error_handling = spec_payload.get("error_handling", "")
+        doc.observability = spec_payload.get("observability", "")
+        doc.test_plan_json = json.dumps(spec_payload.get("test_plan", []), ensure_ascii=False)
+        doc.implementation_plan_json = json.dumps(spec_payload.get("implementation_plan", []), ensure_ascii=False)
+        # Keep the fallback diagrams if the model left these out.
+        doc.mermaid_sequence = spec_payload.get("mermaid_sequence") or doc.mermaid_sequence
+        doc.mermaid_er = spec_payload.get("mermaid_er") or doc.mermaid_er
+        db.commit()
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.upgraded",
+            message=f"Replaced fallback spec v{doc.version} with the LLM spec",
+            payload={"spec_id": spec_id, "story_id": str(doc.story_id)},
+        )
+        return True
+    finally:
+        db.close()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+from app.core.config import get_settings
+from app.services.llm_scheduler import Admission, llm_scheduler
+from app.services.llm_usage import emit_llm_event, record_llm_usage
+from app.services.prompt_budget import count_tokens
+
+
+def _retry_after_seconds(ex: Exception, attempt: int) -> float:
+    """Honours Retry-After(-ms) from a 429 response; otherwise exponential backoff capped at 30s."""
+    response = getattr(ex, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return float(min(30, 2**attempt))
+
+
+def _report_admission(admission: Admission) -> None:
+    wait_ms = int(admission.wait_seconds * 1000)
+    emit_llm_event(
+        "llm.scheduled",
+        f"LLM request admitted after {wait_ms} ms ({admission.lane})",
+        {"lane": admission.lane, "queue_depth": admission.queue_depth, "wait_ms": wait_ms},
+    )
+
+
+def stream_chat_json(*, system: str, user: str, temperature: float = 0.2) -> Iterator[str]:
+    """
+    Streams a JSON-mode chat completion from OpenAI, yielding content deltas as they arrive.
+    Callers feed the deltas to a JsonStreamScanner to act on each item as soon as it closes.
+    Every call is admitted by the LLM scheduler (rate limits, priority lanes, per-user fairness);
+    a 429 before the first delta pauses the scheduler for Retry-After and the request is retried.
+    Token usage (provider-reported when available, counted locally otherwise) and cost are recorded on the run.
+    """
+    settings = get_settings()
+    from openai import OpenAI, RateLimitError
+
+    # Retries are ours so Retry-After is applied to every queued request, not just this one.
+    client = OpenAI(api_key=settings.openai_api_key, max_retries=0)
+    prompt_tokens = count_tokens(system) + count_tokens(user)
+    estimated = prompt_tokens + settings.llm_completion_token_estimate
+
+    for attempt in range(settings.llm_max_retries + 1):
+        _report_admission(llm_scheduler.acquire(tokens=estimated))
+        try:
+            stream = client.chat.completions.create(
+                model=settings.openai_model,
+                temperature=temperature,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True},
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user},
+                ],
+            )
+        except RateLimitError as ex:
+            if attempt >= settings.llm_max_retries:
+                raise
+            delay = _retry_after_seconds(ex, attempt)
+            llm_scheduler.pause(delay)
+            emit_llm_event(
+                "llm.rate_limited",
+                f"Provider rate limit hit; retrying in {delay:.1f}s",
+                {"attempt": attempt + 1, "retry_after_s": delay},
+            )
+            continue
+
+        completion: list[str] = []
+        usage = None
+        for chunk in stream:
+            # With include_usage the final chunk carries usage and no choices.
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                completion.append(delta)
+                yield delta
+        if usage is not None:
+            used_prompt, used_completion, source = usage.prompt_tokens, usage.completion_tokens, "provider"
+        else:
+            used_prompt, used_completion, source = prompt_tokens, count_tokens("".join(completion)), "estimate"
+        llm_scheduler.reconcile(estimated=estimated, actual=used_prompt + used_completion)
+        record_llm_usage(prompt_tokens=used_prompt, completion_tokens=used_completion, source=source)
+        return
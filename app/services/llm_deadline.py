@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, TypeVar
+
+from app.core.config import get_settings
+
+
+T = TypeVar("T")
+
+_MIN_SAMPLES_FOR_P95 = 20
+_latencies: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=200))
+_latencies_lock = threading.Lock()
+
+
+def record_latency(operation: str, seconds: float) -> None:
+    with _latencies_lock:
+        _latencies[operation].append(seconds)
+
+
+def observed_p95(operation: str) -> float | None:
+    with _latencies_lock:
+        samples = sorted(_latencies[operation])
+    if len(samples) < _MIN_SAMPLES_FOR_P95:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def _hedge_delay(operation: str) -> float:
+    # Until enough calls have been observed, the configured threshold stands in for p95.
+    return observed_p95(operation) or get_settings().llm_hedge_after_seconds
+
+
+class _ItemGate:
+    """Forwards streamed items (and resets) from the primary attempt until the call is resolved by another path."""
+
+    def __init__(self, on_item: Callable[..., None] | None, on_reset: Callable[[], None] | None) -> None:
+        self._on_item = on_item
+        self._on_reset = on_reset
+        self._lock = threading.Lock()
+        self._open = True
+        self.forwarded = 0
+
+    def emit(self, *args: Any) -> None:
+        with self._lock:
+            if self._open and self._on_item:
+                self._on_item(*args)
+                self.forwarded += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            if self._open and self.forwarded and self._on_reset:
+                self._on_reset()
+            self.forwarded = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._open = False
+
+
+def _start_attempt(fn: Callable[[], T], *, operation: str) -> Future:
+    # A dedicated daemon thread per attempt: a stuck provider call must not starve a shared pool.
+    future: Future = Future()
+    ctx = contextvars.copy_context()  # keep the LLM scheduler lane/user/run labels
+
+    def _run() -> None:
+        started = time.monotonic()
+        try:
+            result = ctx.run(fn)
+        except BaseException as ex:
+            future.set_exception(ex)
+            return
+        record_latency(operation, time.monotonic() - started)
+        future.set_result(result)
+
+    threading.Thread(target=_run, name=f"llm-{operation}", daemon=True).start()
+    return future
+
+
+class DeferredUpgrade:
+    """
+    Pairs a late LLM result with the rows it should replace.
+    The result (deliver) and the persisted target (bind) can arrive in either order; the upgrade runs once both exist.
+    """
+
+    _MISSING = object()
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._result: Any = self._MISSING
+        self._apply: Callable[[Any], None] | None = None
+
+    def deliver(self, result: Any) -> None:
+        with self._lock:
+            self._result = result
+            apply = self._apply
+        if apply is not None:
+            apply(result)
+
+    def bind(self, apply: Callable[[Any], None]) -> None:
+        with self._lock:
+            self._apply = apply
+            result = self._result
+        if result is not self._MISSING:
+            apply(result)
+
+
+def call_with_deadline(
+    operation: str,
+    attempt: Callable[[Callable[..., None] | None, Callable[[], None] | None], T],
+    *,
+    fallback: Callable[[], T],
+    on_item: Callable[..., None] | None = None,
+    on_late_result: Callable[[T], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
+    replay: Callable[[T], None] | None = None,
+) -> T:
+    """
+    Runs attempt(on_item, on_reset) with a deadline and an optional hedged second request. The attempt calls
+    on_reset itself if it replaces items it already streamed (e.g. with a heuristic result).
+      - After the operation's p95 latency, a second attempt (without streamed items) races the first.
+        If it wins, replay(result) streams its items through on_item.
+      - At LLM_DEADLINE_SECONDS the deterministic fallback is returned instead; if an attempt still
+        succeeds later, on_late_result receives it so the caller can upgrade what it persisted.
+    Whenever the fallback or the hedge replaces a first attempt that already streamed items, on_reset()
+    is called first so the caller can tell clients to discard them.
+    Errors from every attempt propagate as before.
+    """
+    settings = get_settings()
+    deadline = settings.llm_deadline_seconds
+    if deadline <= 0 and not settings.llm_hedge_enabled:
+        return attempt(on_item, on_reset)
+
+    gate = _ItemGate(on_item, on_reset)
+    started = time.monotonic()
+    primary = _start_attempt(lambda: attempt(gate.emit if on_item else None, gate.reset if on_item else None), operation=operation)
+    pending = {primary}
+    hedge_at = _hedge_delay(operation) if settings.llm_hedge_enabled else None
+    last_error: BaseException | None = None
+
+    while pending:
+        elapsed = time.monotonic() - started
+        timeouts = []
+        if deadline > 0:
+            timeouts.append(max(0.0, deadline - elapsed))
+        if hedge_at is not None:
+            timeouts.append(max(0.0, hedge_at - elapsed))
+        done, pending = wait(pending, timeout=min(timeouts) if timeouts else None, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            if fut.exception() is None:
+                gate.close()
+                if fut is not primary:
+                    _discard_streamed(gate, on_reset)
+                    if replay is not None and on_item is not None:
+                        replay(fut.result())
+                return fut.result()
+            last_error = fut.exception()
+
+        elapsed = time.monotonic() - started
+        if hedge_at is not None and elapsed >= hedge_at:
+            hedge_at = None
+            if pending:
+                pending.add(_start_attempt(lambda: attempt(None, None), operation=operation))
+
+        if pending and deadline > 0 and elapsed >= deadline:
+            gate.close()
+            if on_late_result is not None:
+                _deliver_first_success(pending, on_late_result)
+            _discard_streamed(gate, on_reset)
+            return fallback()
+
+    assert last_error is not None
+    raise last_error
+
+
+def _discard_streamed(gate: _ItemGate, on_reset: Callable[[], None] | None) -> None:
+    # Called after gate.close(): nothing more from the first attempt can follow the reset.
+    if gate.forwarded and on_reset is not None:
+        on_reset()
+
+
+def _deliver_first_success(futures: set[Future], on_late_result: Callable[[Any], None]) -> None:
+    delivered = threading.Event()
+    lock = threading.Lock()
+
+    def _done(fut: Future) -> None:
+        if fut.exception() is not None:
+            return
+        with lock:
+            if delivered.is_set():
+                return
+            delivered.set()
+        try:
+            on_late_result(fut.result())
+        except Exception:
+            # The on-time fallback already stands; a failed upgrade must not surface anywhere else.
+            pass
+
+    for fut in futures:
+        fut.add_done_callback(_done)
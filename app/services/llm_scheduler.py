@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from app.core.config import get_settings
+
+
+LANE_INTERACTIVE = "interactive"  # a user is waiting on a socket/request
+LANE_BULK = "bulk"  # fan-out jobs (stories.generate_all, specs.generate_batch)
+
+_LANE_RANK = {LANE_INTERACTIVE: 0, LANE_BULK: 1}
+
+
+@dataclass(frozen=True)
+class LLMRequestContext:
+    lane: str = LANE_INTERACTIVE
+    user_id: str | None = None
+    run_id: str | None = None
+
+
+_current_context: ContextVar[LLMRequestContext] = ContextVar("llm_request_context", default=LLMRequestContext())
+
+
+@contextmanager
+def llm_request_context(*, lane: str = LANE_INTERACTIVE, user_id: str | None = None, run_id: str | None = None) -> Iterator[None]:
+    """Labels LLM calls made inside the block with their lane, owner (for fairness) and run (for events)."""
+    token = _current_context.set(LLMRequestContext(lane=lane, user_id=user_id, run_id=run_id))
+    try:
+        yield
+    finally:
+        _current_context.reset(token)
+
+
+def current_llm_context() -> LLMRequestContext:
+    return _current_context.get()
+
+
+def estimate_tokens(*texts: str) -> int:
+    # ~4 characters per token is close enough for budgeting; actual usage is reconciled afterwards.
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.per_minute > 0:
+            self.level = min(float(self.per_minute), self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def delay_for(self, amount: int, now: float) -> float:
+        """Seconds until `amount` can be taken (0 when available or unlimited)."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(float(amount), float(self.per_minute))  # a single huge request must not wait forever
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: int) -> None:
+        # Negative amounts refund; the level may dip below zero when usage exceeded the estimate.
+        if self.per_minute > 0:
+            self.level = min(float(self.per_minute), self.level - amount)
+
+
+@dataclass
+class _Ticket:
+    rank: int
+    user: str
+    seq: int
+    tokens: int
+
+
+@dataclass
+class Admission:
+    lane: str
+    queue_depth: int  # requests waiting (including this one) when it was queued
+    wait_seconds: float
+
+
+class LLMScheduler:
+    """
+    Admission control in front of every LLM call.
+    Keeps requests-per-minute and tokens-per-minute buckets, admits interactive requests before bulk ones,
+    round-robins between users within a lane, and honours provider Retry-After pauses for everyone.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._waiting: list[_Ticket] = []
+        self._seq = itertools.count()
+        self._served = itertools.count()
+        self._last_served: dict[str, int] = {}
+        self._requests = _TokenBucket(0)
+        self._tokens = _TokenBucket(0)
+        self._paused_until = 0.0
+
+    def _sync_limits(self) -> None:
+        settings = get_settings()
+        if self._requests.per_minute != settings.llm_requests_per_minute:
+            self._requests = _TokenBucket(settings.llm_requests_per_minute)
+        if self._tokens.per_minute != settings.llm_tokens_per_minute:
+            self._tokens = _TokenBucket(settings.llm_tokens_per_minute)
+
+    def _head(self) -> _Ticket:
+        # Highest-priority lane first; within it the user served least recently; then arrival order.
+        return min(self._waiting, key=lambda t: (t.rank, self._last_served.get(t.user, -1), t.seq))
+
+    def acquire(self, *, tokens: int, context: LLMRequestContext | None = None) -> Admission:
+        ctx = context or current_llm_context()
+        queued_at = time.monotonic()
+        with self._cond:
+            self._sync_limits()
+            ticket = _Ticket(
+                rank=_LANE_RANK.get(ctx.lane, _LANE_RANK[LANE_BULK]),
+                user=ctx.user_id or "",
+                seq=next(self._seq),
+                tokens=tokens,
+            )
+            self._waiting.append(ticket)
+            depth = len(self._waiting)
+            try:
+                while True:
+                    if self._head() is ticket:
+                        now = time.monotonic()
+                        delay = max(
+                            self._paused_until - now,
+                            self._requests.delay_for(1, now),
+                            self._tokens.delay_for(tokens, now),
+                        )
+                        if delay <= 0:
+                            self._requests.take(1)
+                            self._tokens.take(tokens)
+                            self._last_served[ticket.user] = next(self._served)
+                            break
+                        self._cond.wait(timeout=delay)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+        return Admission(lane=ctx.lane, queue_depth=depth, wait_seconds=time.monotonic() - queued_at)
+
+    def reconcile(self, *, estimated: int, actual: int) -> None:
+        """Charges (or refunds) the difference between the admission estimate and observed usage."""
+        with self._cond:
+            self._tokens.take(actual - estimated)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Provider said 429: hold every lane until Retry-After elapses."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+            self._cond.notify_all()
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+from typing import Annotated, Any
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError
+
+
+def _as_text(value: Any) -> Any:
+    # Models sometimes return numbers, lists or objects where prose is expected; store them readably.
+    if value is None:
+        return ""
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    if isinstance(value, list):
+        return "\n".join(v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _as_list(value: Any) -> Any:
+    if value is None or value == "":
+        return []
+    if isinstance(value, (str, dict)):
+        return [value]
+    return value
+
+
+Text = Annotated[str, BeforeValidator(_as_text)]
+TextList = Annotated[list[Text], BeforeValidator(_as_list)]
+AnyList = Annotated[list[Any], BeforeValidator(_as_list)]
+
+
+class _LLMOutput(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra="ignore")
+
+
+class EpicOut(_LLMOutput):
+    title: Text = Field(min_length=1)
+    goal: Text = ""
+    in_scope: Text = ""
+    out_of_scope: Text = ""
+    priority: Text = "P1"
+    priority_reason: Text = ""
+    dependencies: TextList = []
+    risks: Text = ""
+    assumptions: Text = ""
+    open_questions: Text = ""
+    success_metrics: Text = ""
+
+
+class StoryOut(_LLMOutput):
+    statement: Text = Field(min_length=1)
+    acceptance_criteria: TextList = []
+    edge_cases: Text = ""
+    non_functional: Text = ""
+    estimate: Text = "M"
+    estimate_reason: Text = ""
+    dependencies: TextList = []
+
+
+class SpecOut(_LLMOutput):
+    # Required so that an unrelated JSON object is rejected (and the heuristic spec used) rather than saved blank.
+    overview: Text = Field(min_length=1)
+    goals: Text = ""
+    functional_requirements: AnyList = []
+    api_contracts: AnyList = []
+    data_model_changes: AnyList = []
+    security_considerations: Text = ""
+    error_handling: Text = ""
+    observability: Text = ""
+    test_plan: AnyList = []
+    implementation_plan: AnyList = []
+    mermaid_sequence: Text = ""
+    mermaid_er: Text = ""
+
+
+# Built once at import: validation + coercion of each LLM item runs in a single compiled pass.
+EPIC_ADAPTER = TypeAdapter(EpicOut)
+STORY_ADAPTER = TypeAdapter(StoryOut)
+SPEC_ADAPTER = TypeAdapter(SpecOut)
+
+
+def validate_or_none(adapter: TypeAdapter, value: Any) -> Any | None:
+    """Validated model for `value`, or None when it cannot be coerced (the item is then skipped)."""
+    try:
+        return adapter.validate_python(value)
+    except ValidationError:
+        return None
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.models import RunUsage
+from app.services.llm_scheduler import current_llm_context
+from app.services.run_events import emit_run_event
+
+
+# Fan-out runs make many concurrent calls against the same usage row.
+_usage_lock = threading.Lock()
+
+
+def emit_llm_event(event_type: str, message: str, payload: dict[str, Any]) -> None:
+    """Records an event on the run the current LLM call belongs to (no-op outside a run)."""
+    run_id = current_llm_context().run_id
+    if not run_id:
+        return
+    db = db_session.SessionLocal()
+    try:
+        emit_run_event(db, run_id=run_id, event_type=event_type, message=message, payload=payload)
+    finally:
+        db.close()
+
+
+def llm_cost_usd(prompt_tokens: int, completion_tokens: int) -> float:
+    settings = get_settings()
+    cost = prompt_tokens * settings.llm_prompt_cost_per_1k + completion_tokens * settings.llm_completion_cost_per_1k
+    return round(cost / 1000, 6)
+
+
+def record_llm_usage(*, prompt_tokens: int, completion_tokens: int, source: str) -> None:
+    """
+    Adds one call's token usage and cost to the current run's totals and emits `llm.usage`.
+    source is "provider" when the API reported usage, "estimate" when it was counted locally.
+    """
+    run_id = current_llm_context().run_id
+    if not run_id:
+        return
+    cost = llm_cost_usd(prompt_tokens, completion_tokens)
+    db = db_session.SessionLocal()
+    try:
+        with _usage_lock:
+            usage = db.get(RunUsage, run_id)
+            if usage is None:
+                usage = RunUsage(run_id=run_id, llm_calls=0, prompt_tokens=0, completion_tokens=0, cost_usd=0.0)
+                db.add(usage)
+            usage.llm_calls += 1
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+            usage.cost_usd = round(usage.cost_usd + cost, 6)
+            db.commit()
+            totals = {
+                "llm_calls": usage.llm_calls,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "cost_usd": usage.cost_usd,
+            }
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="llm.usage",
+            message=f"LLM call used {prompt_tokens} prompt + {completion_tokens} completion tokens (${cost:.6f})",
+            payload={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": cost,
+                "source": source,
+                "run_totals": totals,
+            },
+        )
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import threading
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any
+
+import anyio
+from pypdf import PdfReader
+
+from app.core.config import get_settings
+
+try:  # POSIX only; elsewhere the timeout still applies but memory is not capped
+    import resource
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None
+
+
+# Parsing a PDF is CPU-bound and a crafted file can take minutes or gigabytes, so it never runs in the API
+# process. Each document gets its own short-lived process (forked from a clean, pypdf-preloaded forkserver
+# where available). A stuck parse is killed at the deadline without affecting other documents, which a
+# shared ProcessPoolExecutor cannot do. At most PDF_WORKER_PROCESSES parses run at once.
+
+
+class PdfRejected(ValueError):
+    def __init__(self, reason: str, detail: str) -> None:
+        super().__init__(f"{reason}: {detail}")
+        self.reason = reason  # "invalid" | "timeout" | "memory" | "crashed"
+        self.detail = detail
+
+
+def _context() -> mp.context.BaseContext:
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return mp.get_context("spawn")
+
+
+_ctx = _context()
+_slots_lock = threading.Lock()
+_slots: threading.BoundedSemaphore | None = None
+_slots_size = 0
+
+
+def _limit() -> threading.BoundedSemaphore:
+    global _slots, _slots_size
+    size = max(1, get_settings().pdf_worker_processes)
+    with _slots_lock:
+        if _slots is None or _slots_size != size:
+            _slots, _slots_size = threading.BoundedSemaphore(size), size
+        return _slots
+
+
+def _child(task: str, path: str, memory_limit_mb: int, conn: Connection, pages: tuple[int, int] | None = None) -> None:
+    try:
+        if memory_limit_mb > 0 and resource is not None:
+            cap = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+        reader = PdfReader(path, strict=False)
+        if task == "pages":
+            result: Any = len(reader.pages)
+        elif task == "page_texts":
+            start, stop = pages or (0, len(reader.pages))
+            result = [reader.pages[i].extract_text() or "" for i in range(start, min(stop, len(reader.pages)))]
+        else:
+            result = "\n".join(page.extract_text() or "" for page in reader.pages)
+        conn.send(("ok", result))
+    except MemoryError:
+        conn.send(("memory", f"exceeded {memory_limit_mb}MB"))
+    except Exception as ex:
+        conn.send(("invalid", f"{type(ex).__name__}: {ex}"))
+    finally:
+        conn.close()
+
+
+def _run(task: str, path: Path, pages: tuple[int, int] | None = None) -> Any:
+    settings = get_settings()
+    with _limit():
+        receiver, sender = _ctx.Pipe(duplex=False)
+        proc = _ctx.Process(target=_child, args=(task, str(path), settings.pdf_memory_limit_mb, sender, pages), daemon=True)
+        proc.start()
+        sender.close()
+        try:
+            if not receiver.poll(settings.pdf_timeout_seconds):
+                raise PdfRejected("timeout", f"not parsed within {settings.pdf_timeout_seconds:g}s")
+            try:
+                status, value = receiver.recv()
+            except EOFError:
+                # Died before answering, e.g. killed by the OS for memory.
+                proc.join(1.0)
+                raise PdfRejected("crashed", f"parser exited with code {proc.exitcode}") from None
+        finally:
+            if proc.is_alive():
+                proc.kill()
+            proc.join()
+            receiver.close()
+    if status != "ok":
+        raise PdfRejected(status, value)
+    return value
+
+
+def count_pdf_pages(path: Path) -> int:
+    """Validates a PDF in an isolated process; returns its page count or raises PdfRejected."""
+    return _run("pages", path)
+
+
+def extract_pdf_text(path: Path) -> str:
+    """Text of every page, extracted in an isolated process; raises PdfRejected."""
+    return _run("text", path)
+
+
+def extract_pdf_pages(path: Path, start: int, stop: int) -> list[str]:
+    """Text of pages [start, stop), one string per page, extracted in an isolated process; raises PdfRejected."""
+    return _run("page_texts", path, (start, stop))
+
+
+async def validate_pdf(path: Path) -> int:
+    # The event loop only waits on the worker; the parse itself never runs in the API process.
+    return await anyio.to_thread.run_sync(count_pdf_pages, path)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+from app.core.config import get_settings
+from app.services.job_queue import job_handler
+from app.services.pdf_processing import PdfRejected, count_pdf_pages, extract_pdf_pages
+from app.services.storage import artifact_local_path, blob_key, blob_sha, get_storage
+
+
+# Uploaded PDFs are stored as content-addressed blobs (see storage.py). After upload a job extracts their text
+# page by page, in batches spread over the PDF worker processes, into a sidecar object <blob key>.pages.jsonl.gz
+# (one JSON line per page). The sidecar is keyed by content hash, so re-uploading a file costs nothing, and
+# readers stream it a page at a time instead of loading the whole document.
+
+JOB_PDF_TEXT = "pdf.text"
+
+logger = logging.getLogger(__name__)
+
+# Striped rather than one lock per document, so the table stays fixed-size for the life of the process; two
+# documents that share a stripe only wait for each other's extraction.
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def text_key(source: str) -> str | None:
+    """Storage key of the extracted text for an Artifact.path; None for uploads stored before the blob store."""
+    sha256 = blob_sha(source)
+    return f"{blob_key(sha256)}.pages.jsonl.gz" if sha256 else None
+
+
+def has_pdf_text(source: str) -> bool:
+    key = text_key(source)
+    return key is not None and get_storage().exists(key)
+
+
+def _lock_for(source: str) -> threading.Lock:
+    return _locks[hash(source) % len(_locks)]
+
+
+def _extract_batch(pdf_path: Path, start: int, stop: int) -> list[str]:
+    try:
+        return extract_pdf_pages(pdf_path, start, stop)
+    except PdfRejected as ex:
+        # One pathological page range (timeout, memory) should not cost the rest of the document.
+        logger.warning("Pages %d-%d of %s could not be extracted: %s", start + 1, stop, pdf_path.name, ex)
+        return [""] * (stop - start)
+
+
+def _extract_pages(pdf_path: Path) -> list[str]:
+    settings = get_settings()
+    n_pages = count_pdf_pages(pdf_path)
+    step = max(1, settings.pdf_pages_per_task)
+    batches = [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+    # Batches run concurrently; pdf_processing caps how many parser processes exist at once.
+    with ThreadPoolExecutor(max_workers=max(1, settings.pdf_worker_processes)) as pool:
+        return [text for texts in pool.map(lambda b: _extract_batch(pdf_path, *b), batches) for text in texts]
+
+
+def ensure_pdf_text(source: str) -> str | None:
+    """
+    Extracts the text of the PDF at `source` (an Artifact.path) into storage unless already there, and returns
+    its key (None for legacy uploads, whose text is not cached). Raises PdfRejected.
+    """
+    key = text_key(source)
+    if key is None:
+        return None
+    storage = get_storage()
+    if storage.exists(key):
+        return key
+    with _lock_for(source):
+        # Another thread (the upload job, or a prompt that needed the text first) may have just written it.
+        if storage.exists(key):
+            return key
+        pages = _extract_pages(artifact_local_path(source))
+        with storage.open_write(key) as raw, gzip.GzipFile(fileobj=raw, mode="wb") as out:
+            for page, text in enumerate(pages, start=1):
+                out.write((json.dumps({"page": page, "text": text}, ensure_ascii=False) + "\n").encode("utf-8"))
+    return key
+
+
+def iter_pdf_pages(source: str) -> Iterator[tuple[int, str]]:
+    """(page number, text) for each page, streamed from storage; extracts first if the job has not run yet."""
+    key = ensure_pdf_text(source)
+    if key is None:
+        yield from enumerate(_extract_pages(artifact_local_path(source)), start=1)
+        return
+    with get_storage().open_read(key) as raw, gzip.open(raw, "rt", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            yield row["page"], row["text"]
+
+
+def iter_pdf_chunks(source: str, *, max_chars: int = 4000) -> Iterator[str]:
+    """The document's text in chunks of about max_chars, cut at page boundaries unless a single page is longer."""
+    buf: list[str] = []
+    size = 0
+    for _, text in iter_pdf_pages(source):
+        if not text:
+            continue
+        if buf and size + len(text) > max_chars:
+            yield "\n".join(buf)
+            buf, size = [], 0
+        while len(text) > max_chars:
+            yield text[:max_chars]
+            text = text[max_chars:]
+        buf.append(text)
+        size += len(text)
+    if buf:
+        yield "\n".join(buf)
+
+
+@job_handler(JOB_PDF_TEXT)
+def _extract_uploaded_pdf(*, path: str, artifact_id: str | None = None) -> None:
+    sha256 = blob_sha(path)
+    if sha256 is None or not get_storage().exists(blob_key(sha256)):
+        logger.info("PDF %s (artifact %s) is gone; nothing to extract", path, artifact_id)
+        return
+    try:
+        ensure_pdf_text(path)
+    except PdfRejected as ex:
+        # It passed validation on upload, so a retry would fail the same way.
+        logger.warning("Text extraction for %s (artifact %s) failed: %s", path, artifact_id, ex)
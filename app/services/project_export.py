@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import enum
+import io
+import json
+import zipfile
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, Iterator
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session, lazyload
+
+from app.db import session as db_session
+from app.db.models import Artifact, Epic, EpicBatch, Project, ResearchAppendix, SpecDocument, Story
+from app.services.research_store import RAW_NOTES_FILENAME, read_raw_notes_gzip
+from app.services.storage import artifact_location, blob_sha, get_storage, run_key
+from app.services.storage_backends import StorageBackend
+
+
+# A project export is generated while it is sent: rows come from `yield_per` queries (a bounded batch in memory at
+# a time) and files are copied from storage in chunks. The zip is written to a non-seekable sink, so zipfile uses
+# data descriptors and every entry's bytes can go out as soon as they are compressed. Memory stays constant
+# however large the project is, and the first bytes leave before the last row is read.
+
+EXPORT_FORMATS = ("zip", "ndjson")
+
+_BATCH_ROWS = 200
+_COPY_CHUNK_BYTES = 256 * 1024
+
+
+def _value(v: Any) -> Any:
+    if isinstance(v, enum.Enum):
+        return v.value
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def _row(obj: Any) -> dict[str, Any]:
+    """Column values of a model row; `*_json` columns are decoded under their name without the suffix."""
+    out: dict[str, Any] = {}
+    for attr in inspect(obj).mapper.column_attrs:
+        value = getattr(obj, attr.key)
+        if attr.key.endswith("_json"):
+            try:
+                out[attr.key[: -len("_json")]] = json.loads(value) if value else []
+            except ValueError:
+                out[attr.key] = value
+        else:
+            out[attr.key] = _value(value)
+    return out
+
+
+def _rows(db: Session, model: type, project_id: str) -> Iterator[Any]:
+    stmt = (
+        select(model)
+        .where(model.project_id == project_id)
+        .order_by(model.created_at, model.id)
+        .options(lazyload("*"))
+        .execution_options(yield_per=_BATCH_ROWS)
+    )
+    yield from db.scalars(stmt)
+
+
+def _spec_markdown(spec: dict[str, Any]) -> str:
+    lines = [f"# Spec v{spec['version']} ({spec['status']})", "", f"Story: `{spec['story_id']}`", ""]
+    for title, key in (("Overview", "overview"), ("Goals", "goals")):
+        if spec.get(key):
+            lines += [f"## {title}", "", spec[key], ""]
+    for title, key in (
+        ("Functional requirements", "functional_requirements"),
+        ("API contracts", "api_contracts"),
+        ("Data model changes", "data_model_changes"),
+        ("Test plan", "test_plan"),
+        ("Implementation plan", "implementation_plan"),
+    ):
+        items = spec.get(key) or []
+        if items:
+            lines += [f"## {title}", ""]
+            lines += [f"- {item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)}" for item in items]
+            lines.append("")
+    for title, key in (
+        ("Security considerations", "security_considerations"),
+        ("Error handling", "error_handling"),
+        ("Observability", "observability"),
+    ):
+        if spec.get(key):
+            lines += [f"## {title}", "", spec[key], ""]
+    for title, key in (("Sequence diagram", "mermaid_sequence"), ("ER diagram", "mermaid_er")):
+        if spec.get(key):
+            lines += [f"## {title}", "", "```mermaid", spec[key].strip(), "```", ""]
+    return "\n".join(lines)
+
+
+def _project_rows(db: Session, project_id: str) -> Iterator[tuple[str, Any]]:
+    project = db.get(Project, project_id)
+    if project is None:
+        return
+    yield "project", project
+    for model, kind in (
+        (ResearchAppendix, "research"),
+        (EpicBatch, "epic_batch"),
+        (Epic, "epic"),
+        (Story, "story"),
+        (SpecDocument, "spec"),
+        (Artifact, "artifact"),
+    ):
+        for obj in _rows(db, model, project_id):
+            yield kind, obj
+
+
+def iter_project_ndjson(project_id: str) -> Iterator[bytes]:
+    """
+    NDJSON export, one record per line with a `type`: project, research (with the appendix markdown),
+    epic_batch, epic, story, spec, artifact (listed with its sha256, not embedded).
+    """
+    db = db_session.SessionLocal()
+    try:
+        storage = get_storage()
+        buf: list[bytes] = []
+        for kind, obj in _project_rows(db, project_id):
+            record = {"type": kind, **_row(obj)}
+            if kind == "research":
+                record["markdown"] = storage.read_text(obj.markdown_path) or ""
+            elif kind == "artifact":
+                record["sha256"] = blob_sha(obj.path)
+            buf.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            if len(buf) >= _BATCH_ROWS:
+                yield b"".join(buf)
+                buf.clear()
+        if buf:
+            yield b"".join(buf)
+    finally:
+        db.close()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer that the zip generator drains after every write."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _copy(zf: zipfile.ZipFile, sink: _Sink, name: str, storage: StorageBackend, key: str, *, compress: bool = True) -> Iterator[bytes]:
+    info = storage.stat(key)
+    if info is None:
+        return
+    entry = zipfile.ZipInfo(name, date_time=datetime.fromtimestamp(info.mtime_ns / 1e9).timetuple()[:6])
+    entry.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with storage.open_read(key) as src, zf.open(entry, "w", force_zip64=info.size >= zipfile.ZIP64_LIMIT) as dst:
+        while chunk := src.read(_COPY_CHUNK_BYTES):
+            dst.write(chunk)
+            if out := sink.drain():
+                yield out
+    if out := sink.drain():
+        yield out
+
+
+def _write(zf: zipfile.ZipFile, sink: _Sink, name: str, data: str | bytes, *, compress: bool = True) -> bytes:
+    zf.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED)
+    return sink.drain()
+
+
+def iter_project_zip(project_id: str) -> Iterator[bytes]:
+    """
+    Zip export: project.json, research/<run_id>/ (appendix JSON, markdown and raw notes), epics/, stories/ and
+    specs/ as JSON (specs also as Markdown and .mmd diagrams), graphs/<run_id>/epic_dependency_graph.mmd and
+    uploads/<artifact_id>/<filename>.
+    """
+    db = db_session.SessionLocal()
+    sink = _Sink()
+    try:
+        storage = get_storage()
+        with zipfile.ZipFile(sink, "w") as zf:
+            for kind, obj in _project_rows(db, project_id):
+                record = _row(obj)
+                as_json = json.dumps(record, ensure_ascii=False, indent=2)
+                if kind == "project":
+                    yield _write(zf, sink, "project.json", as_json)
+                elif kind == "research":
+                    base = f"research/{obj.run_id}"
+                    yield _write(zf, sink, f"{base}/appendix.json", as_json)
+                    yield from _copy(zf, sink, f"{base}/research.md", storage, obj.markdown_path)
+                    raw = read_raw_notes_gzip(obj)
+                    if raw is not None:
+                        yield _write(zf, sink, f"{base}/{RAW_NOTES_FILENAME}", raw, compress=False)
+                elif kind == "epic_batch":
+                    yield _write(zf, sink, f"epics/batches/{obj.id}.json", as_json)
+                    if obj.run_id:
+                        mmd = run_key(project_id, obj.run_id, "epic_dependency_graph.mmd")
+                        yield from _copy(zf, sink, f"graphs/{obj.run_id}/epic_dependency_graph.mmd", storage, mmd)
+                elif kind == "epic":
+                    yield _write(zf, sink, f"epics/{obj.id}.json", as_json)
+                elif kind == "story":
+                    yield _write(zf, sink, f"stories/{obj.id}.json", as_json)
+                elif kind == "spec":
+                    yield _write(zf, sink, f"specs/{obj.id}.json", as_json)
+                    yield _write(zf, sink, f"specs/{obj.id}.md", _spec_markdown(record))
+                    for suffix, diagram in (("sequence", obj.mermaid_sequence), ("er", obj.mermaid_er)):
+                        if diagram:
+                            yield _write(zf, sink, f"specs/{obj.id}.{suffix}.mmd", diagram)
+                elif kind == "artifact":
+                    backend, key = artifact_location(obj.path)
+                    name = PurePosixPath(obj.original_filename.replace("\\", "/")).name or "upload"
+                    # PDFs are already compressed; storing them is as small and much cheaper.
+                    yield from _copy(zf, sink, f"uploads/{obj.id}/{name}", backend, key, compress=False)
+        yield sink.drain()  # central directory
+    finally:
+        db.close()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator
+
+import anyio
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.models import Project, Run, RunEvent, RunStatus
+from app.schemas.projects import ProjectCreate
+from app.services.job_queue import JOB_RESEARCH, enqueue_job, wake_workers
+
+
+# Bulk import reads the NDJSON body as it arrives, one line at a time, and inserts valid records in batches of
+# IMPORT_BATCH_SIZE per transaction (projects, and optionally their backlog runs and research jobs). Each line's
+# result is streamed back once its batch is committed, in line order. Research goes through the job queue, where
+# RESEARCH_JOB_CONCURRENCY caps how many run at once however many projects were imported.
+
+MAX_LINE_BYTES = 64 * 1024
+
+
+class ImportResponse(StreamingResponse):
+    """
+    Streams results while the request body is still being read. StreamingResponse would also listen for a
+    disconnect (on servers below ASGI spec 2.4), and that listener consumes the body messages the import is
+    waiting for. Here a client that goes away is noticed by request.stream() instead (ClientDisconnect).
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes | None]]:
+    """(line number, bytes) for every non-blank line; None for a line over MAX_LINE_BYTES, which is never buffered."""
+    buf = bytearray()
+    line_no = 0
+    too_long = False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            nl = chunk.find(b"\n", start)
+            if not too_long:
+                buf += chunk[start:] if nl < 0 else chunk[start:nl]
+                if len(buf) > MAX_LINE_BYTES:
+                    too_long = True
+                    buf.clear()
+            if nl < 0:
+                break
+            line_no += 1
+            if too_long:
+                yield line_no, None
+            elif buf.strip():
+                yield line_no, bytes(buf)
+            buf.clear()
+            too_long = False
+            start = nl + 1
+    if too_long or buf.strip():
+        yield line_no + 1, None if too_long else bytes(buf)
+
+
+def _parse(raw: bytes | None) -> str:
+    """The product request of one NDJSON record; ValueError with a client-facing message if it is invalid."""
+    if raw is None:
+        raise ValueError(f"Line too long (max {MAX_LINE_BYTES} bytes)")
+    try:
+        record = ProjectCreate.model_validate_json(raw)
+    except ValidationError as ex:
+        err = ex.errors()[0]
+        loc = ".".join(str(p) for p in err["loc"])
+        raise ValueError(f"{loc}: {err['msg']}" if loc else err["msg"])
+    product_request = record.product_request.strip()
+    if not product_request:
+        raise ValueError("Product Request cannot be empty")
+    return product_request
+
+
+def _insert_batch(owner_id: str, batch: list[tuple[int, str]], start_research: bool) -> dict[int, dict[str, Any]]:
+    """Creates one batch in a single transaction; returns each line's result."""
+    db = db_session.SessionLocal()
+    try:
+        projects = [Project(owner_id=owner_id, product_request=text) for _, text in batch]
+        db.add_all(projects)
+        db.flush()
+        results = {line: {"line": line, "status": "created", "project_id": p.id} for (line, _), p in zip(batch, projects)}
+        if start_research:
+            runs = [Run(project_id=p.id, run_type="backlog_generation", status=RunStatus.started) for p in projects]
+            db.add_all(runs)
+            db.flush()
+            for (line, _), project, run in zip(batch, projects, runs):
+                # Written with the run rather than via emit_run_event: nobody can be subscribed to a run that
+                # does not exist yet, and one commit per event would undo the batching.
+                db.add(RunEvent(run_id=run.id, event_type="run.started", message="Backlog Generation Started"))
+                enqueue_job(
+                    db,
+                    kind=JOB_RESEARCH,
+                    run_id=run.id,
+                    payload={"project_id": project.id, "run_id": run.id, "product_request": project.product_request},
+                    commit=False,
+                )
+                results[line]["run_id"] = run.id
+        db.commit()
+    except Exception as ex:
+        db.rollback()
+        return {line: {"line": line, "status": "error", "error": f"Could not save: {type(ex).__name__}"} for line, _ in batch}
+    finally:
+        db.close()
+    if start_research:
+        wake_workers()
+    return results
+
+
+async def import_projects(chunks: AsyncIterator[bytes], *, owner_id: str, start_research: bool = False) -> AsyncIterator[bytes]:
+    """
+    Creates a project per NDJSON line of `chunks` ({"product_request": "..."}) and yields one NDJSON result per
+    line ({"line", "status": "created"|"error", "project_id"/"run_id" or "error"}), then a final {"summary": ...}.
+    """
+    batch_size = max(1, get_settings().import_batch_size)
+    pending: list[int | dict[str, Any]] = []  # line order: a line number awaiting its batch, or an error result
+    batch: list[tuple[int, str]] = []
+    summary = {"created": 0, "failed": 0, "runs_started": 0}
+
+    async def _flush() -> bytes:
+        saved = await anyio.to_thread.run_sync(_insert_batch, owner_id, list(batch), start_research) if batch else {}
+        out = []
+        for item in pending:
+            result = saved[item] if isinstance(item, int) else item
+            if result["status"] == "created":
+                summary["created"] += 1
+                summary["runs_started"] += "run_id" in result
+            else:
+                summary["failed"] += 1
+            out.append(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+        batch.clear()
+        pending.clear()
+        return b"".join(out)
+
+    async for line, raw in _lines(chunks):
+        try:
+            batch.append((line, _parse(raw)))
+            pending.append(line)
+        except ValueError as ex:
+            pending.append({"line": line, "status": "error", "error": str(ex)})
+        if len(pending) >= batch_size:
+            yield await _flush()
+    if pending:
+        yield await _flush()
+    yield json.dumps({"summary": summary}).encode("utf-8") + b"\n"
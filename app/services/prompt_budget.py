@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from app.core.config import get_settings
+from app.services.llm_scheduler import estimate_tokens
+from app.services.llm_usage import emit_llm_event
+
+try:  # exact counts when tiktoken is installed; the ~4 chars/token estimate otherwise
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # pragma: no cover - depends on the environment
+    _ENCODING = None
+
+
+_MIN_FIELD_TOKENS = 16
+_TRUNCATION_MARKER = "\n[... {omitted} tokens omitted ...]\n"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def _value_tokens(value: Any) -> int:
+    if isinstance(value, str):
+        return count_tokens(value)
+    if isinstance(value, list):
+        return sum(_value_tokens(v) + 1 for v in value)
+    return count_tokens(json.dumps(value, ensure_ascii=False))
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Keeps the head (2/3) and tail (1/3) of `text` within `max_tokens`, marking what was cut."""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(_TRUNCATION_MARKER.format(omitted=total)), 2)
+    head, tail = keep * 2 // 3, keep - keep * 2 // 3
+    marker = _TRUNCATION_MARKER.format(omitted=total - keep)
+    if _ENCODING is not None:
+        ids = _ENCODING.encode(text, disallowed_special=())
+        return _ENCODING.decode(ids[:head]) + marker + _ENCODING.decode(ids[-tail:])
+    chars_per_token = len(text) / total
+    return text[: int(head * chars_per_token)] + marker + text[-int(tail * chars_per_token) :]
+
+
+def _fit_value(value: Any, max_tokens: int) -> Any:
+    if isinstance(value, str):
+        return truncate_text(value, max_tokens)
+    if isinstance(value, list):
+        # Lists (citations, acceptance criteria) keep their leading items; order is priority order.
+        kept: list[Any] = []
+        used = 0
+        for item in value:
+            cost = _value_tokens(item) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(item)
+            used += cost
+        return kept
+    return value
+
+
+def fit_prompt_fields(operation: str, fields: dict[str, Any], *, fixed: str = "") -> tuple[dict[str, Any], dict[str, Any]]:
+    """
+    Trims the variable inputs of an LLM prompt to the operation's budget (LLM_PROMPT_BUDGET_<OP>).
+    `fixed` is the rest of the prompt (system text, output schema) and is never trimmed.
+    The remaining budget is shared fairly: inputs smaller than their share stay whole, the larger ones are
+    truncated to what is left. Returns (fields, report); report["truncated"] lists the trimmed inputs.
+    """
+    settings = get_settings()
+    budget = getattr(settings, f"llm_prompt_budget_{operation.split('.')[0]}", 0)
+    fixed_tokens = count_tokens(fixed)
+    sizes = {name: _value_tokens(value) for name, value in fields.items()}
+    before = fixed_tokens + sum(sizes.values())
+    report: dict[str, Any] = {"operation": operation, "budget_tokens": budget, "prompt_tokens": before, "truncated": []}
+    if budget <= 0 or before <= budget:
+        return fields, report
+
+    remaining = max(budget - fixed_tokens, _MIN_FIELD_TOKENS * len(fields))
+    fitted = dict(fields)
+    pending = sorted(sizes, key=sizes.__getitem__)
+    for i, name in enumerate(pending):
+        share = remaining // (len(pending) - i)
+        if sizes[name] > share:
+            fitted[name] = _fit_value(fields[name], max(share, _MIN_FIELD_TOKENS))
+            report["truncated"].append(name)
+        remaining -= _value_tokens(fitted[name])
+
+    report["prompt_tokens"] = fixed_tokens + sum(_value_tokens(v) for v in fitted.values())
+    report["prompt_tokens_before"] = before
+    return fitted, report
+
+
+def budget_prompt(operation: str, fields: dict[str, Any], *, fixed: str = "") -> dict[str, Any]:
+    """fit_prompt_fields, recording an `llm.prompt_budget` event on the current run when inputs were trimmed."""
+    fitted, report = fit_prompt_fields(operation, fields, fixed=fixed)
+    if report["truncated"]:
+        emit_llm_event(
+            "llm.prompt_budget",
+            f"Trimmed {', '.join(report['truncated'])} to fit the {operation} prompt budget "
+            f"({report['prompt_tokens_before']} -> {report['prompt_tokens']} tokens)",
+            report,
+        )
+    return fitted
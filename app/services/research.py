@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from dataclasses import dataclass
 from typing import Any
@@ -25,15 +26,27 @@ class ResearchResult:
     results: list[TavilyResult]
 
 
-def tavily_search(
-    *,
-    api_key: str,
-    query: str,
-    max_results: int = 8,
-    search_depth: str = "basic",
-    include_answer: str | bool = "basic",
-    timeout_seconds: float = 30.0,
-) -> ResearchResult:
+@dataclass(frozen=True)
+class ResearchFailure:
+    query: str
+    error: str
+
+
+@dataclass(frozen=True)
+class ResearchBatch:
+    searches: list[ResearchResult]  # successful queries, in the order they were asked
+    failures: list[ResearchFailure]
+
+
+class ResearchQueriesFailed(RuntimeError):
+    """Every query of a batch failed; `failures` has one entry per query."""
+
+    def __init__(self, failures: list[ResearchFailure]) -> None:
+        super().__init__(f"All {len(failures)} research queries failed: {failures[0].error}")
+        self.failures = failures
+
+
+def _search_request(*, api_key: str, query: str, max_results: int, search_depth: str, include_answer: str | bool) -> tuple[dict[str, str], dict[str, Any]]:
     headers = {"Authorization": f"Bearer {api_key}"}
     payload: dict[str, Any] = {
         "query": query,
@@ -43,12 +56,10 @@ def tavily_search(
         "include_raw_content": False,
         "include_images": False,
     }
+    return headers, payload
 
-    with httpx.Client(timeout=timeout_seconds) as client:
-        r = client.post(TAVILY_SEARCH_URL, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
 
+def _parse_search_response(data: dict[str, Any], query: str) -> ResearchResult:
     results: list[TavilyResult] = []
     for item in data.get("results", []) or []:
         results.append(
@@ -63,6 +74,79 @@ def tavily_search(
     return ResearchResult(query=str(data.get("query", query)), answer=data.get("answer"), results=results)
 
 
+async def _search_one(
+    client: httpx.AsyncClient,
+    *,
+    search_url: str,
+    api_key: str,
+    query: str,
+    max_results: int,
+    search_depth: str,
+    include_answer: str | bool,
+    timeout_seconds: float,
+) -> ResearchResult:
+    headers, payload = _search_request(
+        api_key=api_key, query=query, max_results=max_results, search_depth=search_depth, include_answer=include_answer
+    )
+    # httpx timeouts are per read/connect; wait_for bounds the whole query including slow trickled responses.
+    r = await asyncio.wait_for(client.post(search_url, headers=headers, json=payload), timeout=timeout_seconds)
+    r.raise_for_status()
+    return _parse_search_response(r.json(), query)
+
+
+async def search_tavily_queries_async(
+    *,
+    api_key: str,
+    queries: list[str],
+    max_results: int = 8,
+    search_depth: str = "basic",
+    include_answer: str | bool = "basic",
+    timeout_seconds: float = 20.0,
+    search_url: str = TAVILY_SEARCH_URL,
+    max_connections: int = 10,
+) -> ResearchBatch:
+    """
+    Runs every query concurrently over one pooled client (one TLS handshake per connection, not per query).
+    Each query has its own timeout; failed queries are reported in `failures` and the rest are kept.
+    Raises only when every query failed.
+    """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(timeout=timeout_seconds, limits=limits) as client:
+        outcomes = await asyncio.gather(
+            *(
+                _search_one(
+                    client,
+                    search_url=search_url,
+                    api_key=api_key,
+                    query=q,
+                    max_results=max_results,
+                    search_depth=search_depth,
+                    include_answer=include_answer,
+                    timeout_seconds=timeout_seconds,
+                )
+                for q in queries
+            ),
+            return_exceptions=True,
+        )
+
+    searches: list[ResearchResult] = []
+    failures: list[ResearchFailure] = []
+    for q, outcome in zip(queries, outcomes):
+        if isinstance(outcome, BaseException):
+            error = f"{type(outcome).__name__}: {outcome}" if str(outcome) else type(outcome).__name__
+            failures.append(ResearchFailure(query=q, error=error))
+        else:
+            searches.append(outcome)
+    if queries and not searches:
+        raise ResearchQueriesFailed(failures)
+    return ResearchBatch(searches=searches, failures=failures)
+
+
+def search_tavily_queries(**kwargs: Any) -> ResearchBatch:
+    """Blocking entry point for worker threads (background jobs); see search_tavily_queries_async."""
+    return asyncio.run(search_tavily_queries_async(**kwargs))
+
+
 def build_research_appendix_markdown(*, product_request: str, searches: list[ResearchResult]) -> tuple[str, list[str], str, str]:
     # Combine URLs and pick a compact summary/impact.
     urls: list[str] = []
@@ -97,27 +181,28 @@ def build_research_appendix_markdown(*, product_request: str, searches: list[Res
             "## How Research Impacts Decisions",
             impact,
             "",
-            "## Raw Search Notes",
-            "```json",
-            json.dumps(
-                {
-                    "searches": [
-                        {
-                            "query": s.query,
-                            "answer": s.answer,
-                            "results": [
-                                {"title": r.title, "url": r.url, "score": r.score, "content": r.content}
-                                for r in s.results
-                            ],
-                        }
-                        for s in searches
-                    ]
-                },
-                ensure_ascii=False,
-                indent=2,
-            ),
-            "```",
         ]
     )
 
     return md, urls, summary, impact
+
+
+def build_raw_search_notes(searches: list[ResearchResult]) -> str:
+    # Full per-result content; stored gzipped next to research.md and served from its own endpoint.
+    return json.dumps(
+        {
+            "searches": [
+                {
+                    "query": s.query,
+                    "answer": s.answer,
+                    "results": [
+                        {"title": r.title, "url": r.url, "score": r.score, "content": r.content}
+                        for r in s.results
+                    ],
+                }
+                for s in searches
+            ]
+        },
+        ensure_ascii=False,
+        indent=2,
+    )
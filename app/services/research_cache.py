@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.models import ResearchCacheEntry
+from app.services.research import ResearchResult, TavilyResult
+
+
+def normalize_query(query: str) -> str:
+    # Same rule as single-flight keys: whitespace and case differences don't make a new search.
+    return " ".join(query.split()).casefold()
+
+
+def research_cache_key(query: str, *, search_depth: str, max_results: int) -> str:
+    raw = json.dumps([normalize_query(query), search_depth, max_results])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _result_from_json(raw: str) -> ResearchResult:
+    data = json.loads(raw)
+    return ResearchResult(
+        query=data["query"],
+        answer=data.get("answer"),
+        results=[TavilyResult(**r) for r in data.get("results", [])],
+    )
+
+
+def get_cached_searches(db: Session, *, queries: list[str], search_depth: str, max_results: int) -> dict[str, ResearchResult]:
+    """Fresh cache entries for `queries` (by the caller's query text); expired entries are dropped."""
+    settings = get_settings()
+    if settings.research_cache_ttl_seconds <= 0:
+        return {}
+    now = datetime.utcnow()
+    expires_before = now - timedelta(seconds=settings.research_cache_ttl_seconds)
+    found: dict[str, ResearchResult] = {}
+    for q in queries:
+        entry = db.get(ResearchCacheEntry, research_cache_key(q, search_depth=search_depth, max_results=max_results))
+        if entry is None:
+            continue
+        if entry.created_at < expires_before:
+            db.delete(entry)
+            continue
+        entry.hits += 1
+        entry.last_used_at = now
+        found[q] = _result_from_json(entry.result_json)
+    db.commit()
+    return found
+
+
+def store_searches(db: Session, *, searches: dict[str, ResearchResult], search_depth: str, max_results: int) -> None:
+    """Caches fresh results, then evicts least recently used entries beyond RESEARCH_CACHE_MAX_ENTRIES."""
+    settings = get_settings()
+    if settings.research_cache_ttl_seconds <= 0 or not searches:
+        return
+    now = datetime.utcnow()
+    for q, result in searches.items():
+        key = research_cache_key(q, search_depth=search_depth, max_results=max_results)
+        entry = db.get(ResearchCacheEntry, key) or ResearchCacheEntry(key=key, hits=0)
+        entry.query = normalize_query(q)
+        entry.search_depth = search_depth
+        entry.max_results = max_results
+        entry.result_json = json.dumps(asdict(result), ensure_ascii=False)
+        entry.created_at = now
+        entry.last_used_at = now
+        db.add(entry)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another run cached the same query first; its entry is just as good.
+        db.rollback()
+
+    overflow = db.query(ResearchCacheEntry).count() - settings.research_cache_max_entries
+    if overflow > 0:
+        stale = db.query(ResearchCacheEntry).order_by(ResearchCacheEntry.last_used_at.asc()).limit(overflow).all()
+        for entry in stale:
+            db.delete(entry)
+        db.commit()
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import gzip
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.models import Artifact, ResearchAppendix
+from app.services.pdf_processing import PdfRejected
+from app.services.pdf_text import iter_pdf_chunks
+from app.services.prompt_budget import count_tokens, truncate_text
+from app.services.research_store import raw_notes_key, read_raw_notes_gzip
+from app.services.storage import get_storage
+
+
+# Prompts only carry the research summary and URLs; the per-result content and uploaded PDFs hold the detail.
+# Both are split into short overlapping passages and ranked with BM25 against what is being generated, so each
+# epic/story prompt gets a few relevant passages at a fixed token cost.
+
+PASSAGE_WORDS = 80
+PASSAGE_STRIDE = 60
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_MIN_PASSAGE_TOKENS = 32
+
+_STOP_WORDS = frozenset(
+    "a an and are as at be but by can for from has have how i if in into is it its of on or so such that the "
+    "their them then there these they this to was we were what when where which while who will with you your".split()
+)
+
+
+@dataclass(frozen=True)
+class Passage:
+    source: str  # result URL or uploaded file name
+    text: str
+
+
+def _terms(text: str) -> list[str]:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    # Light plural folding so "invoices" matches "invoice"; enough for short product-planning queries.
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words if w not in _STOP_WORDS]
+
+
+def _split(source: str, text: str) -> list[Passage]:
+    words = text.split()
+    if not words:
+        return []
+    starts = range(0, max(len(words) - PASSAGE_WORDS, 0) + 1, PASSAGE_STRIDE)
+    passages = [Passage(source, " ".join(words[i : i + PASSAGE_WORDS])) for i in starts]
+    if starts[-1] + PASSAGE_WORDS < len(words):
+        passages.append(Passage(source, " ".join(words[-PASSAGE_WORDS:])))
+    return passages
+
+
+class Bm25Index:
+    """Okapi BM25 over a fixed list of passages, with an inverted index so a query only touches matching passages."""
+
+    def __init__(self, passages: list[Passage]) -> None:
+        self.passages = passages
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        for i, p in enumerate(passages):
+            tf = Counter(_terms(p.text))
+            self._lengths.append(sum(tf.values()))
+            for term, n in tf.items():
+                self._postings.setdefault(term, []).append((i, n))
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def search(self, query: str, k: int) -> list[tuple[Passage, float]]:
+        scores: dict[int, float] = {}
+        n_docs = len(self.passages)
+        for term in set(_terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (_BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+        return [(self.passages[i], score) for i, score in ranked]
+
+
+def _research_passages(appendix: ResearchAppendix) -> list[Passage]:
+    raw = read_raw_notes_gzip(appendix)
+    if not raw:
+        return []
+    notes = json.loads(gzip.decompress(raw))
+    out: list[Passage] = []
+    for search in notes.get("searches", []):
+        for r in search.get("results", []):
+            out.extend(_split(r.get("url") or r.get("title") or "research", r.get("content") or ""))
+    return out
+
+
+def _pdf_passages(path: str, name: str) -> list[Passage]:
+    out: list[Passage] = []
+    try:
+        # Read chunk by chunk from the cached page text; a missing cache is filled on first use.
+        for chunk in iter_pdf_chunks(path):
+            out.extend(_split(name, chunk))
+    except (PdfRejected, OSError):
+        # A document that cannot be read simply contributes nothing; generation must not fail on it.
+        return []
+    return out
+
+
+def _mtime(key: str) -> int:
+    info = get_storage().stat(key)
+    return info.mtime_ns if info else 0
+
+
+_INDEX_CACHE_SIZE = 32
+_indexes: OrderedDict[tuple, Bm25Index] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def project_index(db: Session, *, project_id: str, appendix: ResearchAppendix | None) -> Bm25Index:
+    """BM25 index over the appendix's result content and the project's uploaded PDFs, cached per corpus version."""
+    documents = (
+        db.query(Artifact)
+        .filter(Artifact.project_id == project_id, Artifact.kind == "supporting_document_pdf")
+        .order_by(Artifact.created_at.asc())
+        .all()
+    )
+    # New research (different appendix or rewritten raw notes) or a new upload is a different key, never a stale hit.
+    key = (
+        str(appendix.id) if appendix is not None else None,
+        _mtime(raw_notes_key(appendix)) if appendix is not None else 0,
+        tuple(str(a.id) for a in documents),
+    )
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    passages = _research_passages(appendix) if appendix is not None else []
+    for a in documents:
+        passages.extend(_pdf_passages(a.path, a.original_filename))
+    index = Bm25Index(passages)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def select_passages(index: Bm25Index, query: str, *, top_k: int | None = None, max_tokens: int | None = None) -> list[dict[str, str]]:
+    """
+    The top_k passages for `query` (RESEARCH_PASSAGES_TOP_K), best first, within max_tokens in total
+    (RESEARCH_PASSAGES_MAX_TOKENS). The last passage that does not fit whole is truncated; none is returned
+    when nothing matches.
+    """
+    settings = get_settings()
+    top_k = settings.research_passages_top_k if top_k is None else top_k
+    remaining = settings.research_passages_max_tokens if max_tokens is None else max_tokens
+    if top_k <= 0 or remaining <= 0:
+        return []
+
+    out: list[dict[str, str]] = []
+    seen: set[str] = set()
+    # Over-fetch a little: overlapping windows of one result can score alike and are deduplicated below.
+    for passage, _ in index.search(query, top_k * 2):
+        if len(out) >= top_k or remaining < _MIN_PASSAGE_TOKENS:
+            break
+        if passage.text in seen:
+            continue
+        seen.add(passage.text)
+        text = truncate_text(passage.text, remaining)
+        remaining -= count_tokens(text)
+        out.append({"source": passage.source, "text": text})
+    return out
+
+
+def relevant_passages(
+    db: Session, *, project_id: str, query: str, appendix: ResearchAppendix | None = None
+) -> list[dict[str, str]]:
+    """
+    Passages for one epic/story prompt from the project's latest research appendix (unless given) and PDFs.
+    Empty without OPENAI_API_KEY: the deterministic generators have no prompt, so no index is built for them.
+    """
+    settings = get_settings()
+    if settings.research_passages_top_k <= 0 or not settings.openai_api_key:
+        return []
+    if appendix is None:
+        appendix = (
+            db.query(ResearchAppendix)
+            .filter(ResearchAppendix.project_id == project_id)
+            .order_by(ResearchAppendix.created_at.desc())
+            .first()
+        )
+    return select_passages(project_index(db, project_id=project_id, appendix=appendix), query)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.models import Project, ResearchAppendix, ResearchLshBucket, ResearchSignature
+from app.services.research_cache import normalize_query
+from app.services.research_store import read_raw_notes_gzip, write_raw_notes
+from app.services.storage import get_storage, run_key
+
+
+# 64 permutations in 16 bands of 4 rows: requests sharing ~50% of their shingles collide in some band
+# with even odds, ~80% almost always; candidates are then scored on the full signature.
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# Paraphrases reorder and pad words, so shingles are content words (lightly stemmed) rather than character n-grams.
+_STOP_WORDS = frozenset(
+    "a an and app application are as at be build by can could for from i in into is it like me my need of on or our "
+    "should so that the their them they this to us want we where which who will with would you".split()
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1337)  # fixed seed: signatures must be stable across processes
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+
+@dataclass(frozen=True)
+class SimilarAppendix:
+    appendix_id: str
+    project_id: str
+    similarity: float
+
+
+def _shingles(text: str) -> set[int]:
+    words = re.findall(r"[a-z0-9]+", normalize_query(text))
+    terms = {w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words if w not in _STOP_WORDS}
+    terms = terms or set(words) or {""}
+    return {int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big") for t in terms}
+
+
+def minhash_signature(text: str) -> list[int]:
+    shingles = _shingles(text)
+    return [min((a * x + b) % _MERSENNE_PRIME for x in shingles) for a, b in _PERMUTATIONS]
+
+
+def signature_similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+
+def _band_keys(signature: list[int]) -> list[str]:
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(json.dumps(rows).encode("ascii"), digest_size=16).hexdigest()
+        keys.append(f"{band:02d}:{digest[:36]}")
+    return keys
+
+
+def index_appendix(db: Session, *, appendix_id: str, product_request: str) -> None:
+    signature = minhash_signature(product_request)
+    db.merge(ResearchSignature(appendix_id=appendix_id, signature_json=json.dumps(signature)))
+    for key in _band_keys(signature):
+        db.merge(ResearchLshBucket(band_key=key, appendix_id=appendix_id))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent lookup indexed it first (see _index_missing); the rows are the same either way.
+        db.rollback()
+
+
+def _index_missing(db: Session) -> None:
+    # Appendices written before the index existed are indexed on first lookup.
+    rows = (
+        db.query(ResearchAppendix.id, Project.product_request)
+        .join(Project, Project.id == ResearchAppendix.project_id)
+        .outerjoin(ResearchSignature, ResearchSignature.appendix_id == ResearchAppendix.id)
+        .filter(ResearchSignature.appendix_id.is_(None))
+        .all()
+    )
+    for appendix_id, product_request in rows:
+        index_appendix(db, appendix_id=str(appendix_id), product_request=product_request or "")
+
+
+def find_similar_appendices(db: Session, *, product_request: str, limit: int = 5) -> list[SimilarAppendix]:
+    """Prior research appendices whose product request is at least RESEARCH_REUSE_THRESHOLD similar, best first."""
+    threshold = get_settings().research_reuse_threshold
+    _index_missing(db)
+    signature = minhash_signature(product_request)
+    candidate_ids = {
+        str(r[0])
+        for r in db.query(ResearchLshBucket.appendix_id).filter(ResearchLshBucket.band_key.in_(_band_keys(signature))).all()
+    }
+    if not candidate_ids:
+        return []
+
+    rows = (
+        db.query(ResearchSignature.appendix_id, ResearchSignature.signature_json, ResearchAppendix.project_id)
+        .join(ResearchAppendix, ResearchAppendix.id == ResearchSignature.appendix_id)
+        .filter(ResearchSignature.appendix_id.in_(candidate_ids))
+        .all()
+    )
+    scored = [
+        SimilarAppendix(appendix_id=str(aid), project_id=str(pid), similarity=signature_similarity(signature, json.loads(sig)))
+        for aid, sig, pid in rows
+    ]
+    return sorted((s for s in scored if s.similarity >= threshold), key=lambda s: s.similarity, reverse=True)[:limit]
+
+
+def is_reusable_by(db: Session, appendix: ResearchAppendix, *, owner_id: str, product_request: str) -> bool:
+    """Whether the owner of a project with `product_request` may copy `appendix`: it is theirs, or it was offered as similar."""
+    source_project = db.get(Project, appendix.project_id)
+    if source_project is not None and source_project.owner_id == owner_id:
+        return True
+    return any(m.appendix_id == appendix.id for m in find_similar_appendices(db, product_request=product_request))
+
+
+def _swap_request(db: Session, source: ResearchAppendix, product_request: str) -> Callable[[str], str]:
+    # Appendix text embeds the request it was made for (heading, search queries, provider answers); the source
+    # project may belong to someone else, so its request is swapped for this project's.
+    source_project = db.get(Project, source.project_id)
+    source_request = (source_project.product_request or "").strip() if source_project else ""
+    replacement = product_request.strip() or "(empty)"
+    return lambda text: text.replace(source_request, replacement) if source_request and text else text
+
+
+def reused_summary(db: Session, source: ResearchAppendix, *, product_request: str) -> str:
+    """`source.summary` as it reads when copied for `product_request`."""
+    return _swap_request(db, source, product_request)(source.summary)
+
+
+def reuse_appendix(db: Session, source: ResearchAppendix, *, project_id: str, run_id: str, product_request: str) -> ResearchAppendix:
+    """Copies `source` (markdown, citations, summary) as this run's research appendix."""
+    storage = get_storage()
+    swap = _swap_request(db, source, product_request)
+    markdown = swap(storage.read_text(source.markdown_path) or "")
+    raw_gz = read_raw_notes_gzip(source)
+    raw_notes = swap(gzip.decompress(raw_gz).decode("utf-8")) if raw_gz else None
+
+    md_key = run_key(project_id, run_id, "research.md")
+    storage.write_text(md_key, markdown)
+    if raw_notes:
+        write_raw_notes(project_id, run_id, raw_notes)
+
+    appendix = ResearchAppendix(
+        project_id=project_id,
+        run_id=run_id,
+        markdown_path=md_key,
+        urls_json=source.urls_json,
+        summary=swap(source.summary),
+        impact=source.impact,
+    )
+    db.add(appendix)
+    db.commit()
+    db.refresh(appendix)
+    return appendix
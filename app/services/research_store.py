@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from email.utils import formatdate
+from functools import lru_cache
+from pathlib import PurePosixPath
+
+from app.db.models import ResearchAppendix
+from app.services.storage import get_storage, run_key
+
+
+RAW_NOTES_FILENAME = "research_raw_notes.json.gz"
+_RAW_NOTES_HEADING = "\n## Raw Search Notes"
+
+
+@dataclass(frozen=True)
+class ParsedAppendix:
+    markdown: str  # without the raw search notes
+    urls: list[str]
+    etag: str
+    last_modified: str  # HTTP date
+
+
+def write_raw_notes(project_id: str, run_id: str, raw_notes_json: str) -> str:
+    key = run_key(project_id, run_id, RAW_NOTES_FILENAME)
+    get_storage().write_bytes(key, gzip.compress(raw_notes_json.encode("utf-8")))
+    return key
+
+
+def raw_notes_key(appendix: ResearchAppendix) -> str:
+    # markdown_path is the storage key of research.md; the notes sit next to it.
+    return str(PurePosixPath(appendix.markdown_path).parent / RAW_NOTES_FILENAME)
+
+
+@lru_cache(maxsize=256)
+def _parse(appendix_id: str, md_key: str, mtime_ns: int, size: int, urls_json: str) -> ParsedAppendix:
+    # Keyed on the object's mtime/size: a rewritten research.md is a cache miss, never a stale hit.
+    markdown = (get_storage().read_text(md_key) or "") if mtime_ns else ""
+    # Appendices written before raw notes moved to their own file still embed them; strip on read.
+    markdown = markdown.split(_RAW_NOTES_HEADING, 1)[0].rstrip() + "\n" if markdown else ""
+    etag = hashlib.sha1(f"{appendix_id}:{mtime_ns}:{size}".encode("ascii")).hexdigest()
+    last_modified = formatdate(mtime_ns / 1e9, usegmt=True) if mtime_ns else formatdate(0, usegmt=True)
+    return ParsedAppendix(markdown=markdown, urls=json.loads(urls_json), etag=f'"{etag}"', last_modified=last_modified)
+
+
+def load_appendix(appendix: ResearchAppendix) -> ParsedAppendix:
+    """Parsed appendix (markdown without raw notes, citations, validators), served from an in-process LRU."""
+    info = get_storage().stat(appendix.markdown_path)
+    mtime_ns, size = (info.mtime_ns, info.size) if info else (0, 0)
+    return _parse(str(appendix.id), appendix.markdown_path, mtime_ns, size, appendix.urls_json)
+
+
+def read_raw_notes_gzip(appendix: ResearchAppendix) -> bytes | None:
+    """Gzipped raw search notes JSON; legacy appendices have them extracted from research.md."""
+    storage = get_storage()
+    raw = storage.read_bytes(raw_notes_key(appendix))
+    if raw is not None:
+        return raw
+    markdown = storage.read_text(appendix.markdown_path)
+    if markdown is None:
+        return None
+    _, sep, notes = markdown.partition(_RAW_NOTES_HEADING)
+    if not sep:
+        return None
+    body = notes.split("```json", 1)[-1].rsplit("```", 1)[0].strip()
+    return gzip.compress(body.encode("utf-8"))
@@ -52,6 +52,13 @@ def emit_run_event(
         # Works when called from async (e.g., WebSocket handlers)
         loop = asyncio.get_running_loop()
         loop.create_task(broker.publish(str(run_id), event))
+        return row
+    except Exception:
+        pass
+
+    try:
+        # Works from plain worker threads (e.g., fan-out pools)
+        broker.publish_threadsafe(str(run_id), event)
     except Exception:
         pass
 
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import re
+import weakref
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.db.models import Epic, ResearchAppendix, SpecDocument, Story
+from app.services.research_store import read_raw_notes_gzip
+
+
+# Search documents are kept in step with the rows they describe: a flush that inserts, updates or deletes an
+# epic, story, spec or research appendix rewrites its document in the same transaction.
+#   SQLite:   FTS5 virtual table (porter stemming, bm25 ranking, snippet()).
+#   Postgres: table with a generated weighted tsvector + GIN index (ts_rank_cd, ts_headline).
+
+SEARCH_KINDS = ("research", "epic", "story", "spec")
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "doc_key UNINDEXED, project_id UNINDEXED, kind UNINDEXED, ref_id UNINDEXED, title, body, "
+    "tokenize='porter unicode61')"
+)
+_POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS search_documents ("
+    "doc_key VARCHAR(60) PRIMARY KEY, project_id VARCHAR(36) NOT NULL, kind VARCHAR(20) NOT NULL, "
+    "ref_id VARCHAR(36) NOT NULL, title TEXT NOT NULL, body TEXT NOT NULL, "
+    "tsv tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING GIN (tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_project ON search_documents (project_id)",
+)
+
+_ready_engines: weakref.WeakSet[Engine] = weakref.WeakSet()
+
+
+@dataclass(frozen=True)
+class SearchDocument:
+    project_id: str
+    kind: str
+    ref_id: str
+    title: str
+    body: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.ref_id}"
+
+
+def _rowid(key: str) -> int:
+    # FTS5 can only look rows up by rowid; a stable 60-bit hash of the key makes rewrites index lookups, not scans.
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:15], 16)
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    kind: str
+    ref_id: str
+    title: str
+    snippet: str
+    score: float
+
+
+def _json_text(raw: str | None) -> str:
+    # List/dict sections (acceptance criteria, test plans, ...) are indexed by their string values.
+    try:
+        value = json.loads(raw or "[]")
+    except ValueError:
+        return raw or ""
+    out: list[str] = []
+
+    def _walk(v: Any) -> None:
+        if isinstance(v, dict):
+            for x in v.values():
+                _walk(x)
+        elif isinstance(v, list):
+            for x in v:
+                _walk(x)
+        elif v is not None:
+            out.append(str(v))
+
+    _walk(value)
+    return "\n".join(out)
+
+
+def _join(*parts: str | None) -> str:
+    return "\n".join(p for p in parts if p)
+
+
+def _research_notes_text(appendix: ResearchAppendix) -> str:
+    try:
+        raw = read_raw_notes_gzip(appendix)
+    except OSError:
+        raw = None
+    if not raw:
+        return ""
+    notes = json.loads(gzip.decompress(raw))
+    return "\n".join(_join(r.get("title"), r.get("content")) for s in notes.get("searches", []) for r in s.get("results", []))
+
+
+def document_for(obj: Any) -> SearchDocument | None:
+    if isinstance(obj, Epic):
+        body = _join(
+            obj.goal, obj.in_scope, obj.out_of_scope, obj.priority_reason, obj.risks,
+            obj.assumptions, obj.open_questions, obj.success_metrics,
+        )
+        return SearchDocument(str(obj.project_id), "epic", str(obj.id), obj.title or "", body)
+    if isinstance(obj, Story):
+        body = _join(_json_text(obj.acceptance_criteria_json), obj.edge_cases, obj.non_functional, obj.estimate_reason)
+        return SearchDocument(str(obj.project_id), "story", str(obj.id), obj.statement or "", body)
+    if isinstance(obj, SpecDocument):
+        body = _join(
+            obj.overview, obj.goals, _json_text(obj.functional_requirements_json), _json_text(obj.api_contracts_json),
+            _json_text(obj.data_model_changes_json), obj.security_considerations, obj.error_handling, obj.observability,
+            _json_text(obj.test_plan_json), _json_text(obj.implementation_plan_json),
+        )
+        return SearchDocument(str(obj.project_id), "spec", str(obj.id), f"Spec v{obj.version}", body)
+    if isinstance(obj, ResearchAppendix):
+        body = _join(obj.summary, obj.impact, _research_notes_text(obj))
+        return SearchDocument(str(obj.project_id), "research", str(obj.id), "Research appendix", body)
+    return None
+
+
+def _ensure_table(conn: Connection) -> bool:
+    """Creates the index table on first use; returns False for databases without full-text support here."""
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return False
+    if conn.engine in _ready_engines:
+        return True
+    if dialect == "sqlite":
+        conn.execute(text(_SQLITE_DDL))
+    else:
+        for ddl in _POSTGRES_DDL:
+            conn.execute(text(ddl))
+    _ready_engines.add(conn.engine)
+    return True
+
+
+def _write(conn: Connection, *, upserts: list[SearchDocument], deletes: list[str]) -> None:
+    if not _ensure_table(conn):
+        return
+    keys = deletes + [d.key for d in upserts]
+    rows = [
+        {"key": d.key, "rowid": _rowid(d.key), "project_id": d.project_id, "kind": d.kind, "ref_id": d.ref_id, "title": d.title, "body": d.body}
+        for d in upserts
+    ]
+    if conn.dialect.name == "sqlite":
+        if keys:
+            conn.execute(text("DELETE FROM search_index WHERE rowid = :rowid"), [{"rowid": _rowid(k)} for k in keys])
+        insert = (
+            "INSERT INTO search_index (rowid, doc_key, project_id, kind, ref_id, title, body) "
+            "VALUES (:rowid, :key, :project_id, :kind, :ref_id, :title, :body)"
+        )
+    else:
+        if keys:
+            conn.execute(text("DELETE FROM search_documents WHERE doc_key = :key"), [{"key": k} for k in keys])
+        insert = (
+            "INSERT INTO search_documents (doc_key, project_id, kind, ref_id, title, body) "
+            "VALUES (:key, :project_id, :kind, :ref_id, :title, :body)"
+        )
+    if rows:
+        conn.execute(text(insert), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_flushed(session: Session, flush_context: Any) -> None:
+    upserts: dict[str, SearchDocument] = {}
+    for obj in list(session.new) + [o for o in session.dirty if session.is_modified(o)]:
+        doc = document_for(obj)
+        if doc is not None:
+            upserts[doc.key] = doc
+    deletes = [doc.key for doc in (document_for(o) for o in session.deleted) if doc is not None]
+    if upserts or deletes:
+        _write(session.connection(), upserts=list(upserts.values()), deletes=deletes)
+
+
+def rebuild_search_index(db: Session, *, project_id: str | None = None) -> int:
+    """(Re)indexes existing rows, e.g. for a database created before search existed. Returns documents written."""
+    docs: list[SearchDocument] = []
+    for model in (ResearchAppendix, Epic, Story, SpecDocument):
+        q = db.query(model)
+        if project_id is not None:
+            q = q.filter(model.project_id == project_id)
+        docs.extend(d for d in (document_for(o) for o in q.all()) if d is not None)
+    _write(db.connection(), upserts=docs, deletes=[])
+    db.commit()
+    return len(docs)
+
+
+def init_search_index(engine: Engine) -> None:
+    """Startup hook: creates the index and backfills it when the table is new."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            existed = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is not None
+        elif conn.dialect.name == "postgresql":
+            existed = conn.execute(text("SELECT to_regclass('search_documents')")).scalar() is not None
+        else:
+            return
+        _ensure_table(conn)
+    if not existed:
+        db = Session(bind=engine)
+        try:
+            rebuild_search_index(db)
+        finally:
+            db.close()
+
+
+def _fts5_query(query: str) -> str:
+    # User text becomes quoted terms (no FTS syntax errors); the last term also matches as a prefix.
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_project(db: Session, *, project_id: str, query: str, kinds: list[str] | None = None, limit: int = 20) -> list[SearchHit]:
+    conn = db.connection()
+    if not _ensure_table(conn):
+        return []
+    params: dict[str, Any] = {"project_id": project_id, "limit": limit}
+    kind_filter = ""
+    if kinds:
+        kind_filter = " AND kind IN (" + ", ".join(f":kind{i}" for i in range(len(kinds))) + ")"
+        params.update({f"kind{i}": k for i, k in enumerate(kinds)})
+
+    if conn.dialect.name == "sqlite":
+        params["q"] = _fts5_query(query)
+        if not params["q"]:
+            return []
+        # bm25 weights: title matches count double; bm25() is lower-is-better, so negate for a score.
+        sql = (
+            "SELECT kind, ref_id, title, snippet(search_index, -1, '[', ']', ' … ', 12) AS snippet, "
+            "-bm25(search_index, 0, 0, 0, 0, 2.0, 1.0) AS score "
+            f"FROM search_index WHERE search_index MATCH :q AND project_id = :project_id{kind_filter} "
+            "ORDER BY bm25(search_index, 0, 0, 0, 0, 2.0, 1.0) LIMIT :limit"
+        )
+    else:
+        params["q"] = query
+        sql = (
+            "SELECT kind, ref_id, title, "
+            "ts_headline('english', body, q, 'StartSel=[, StopSel=], MaxWords=24, MinWords=8') AS snippet, "
+            "ts_rank_cd(tsv, q) AS score "
+            "FROM search_documents, websearch_to_tsquery('english', :q) AS q "
+            f"WHERE tsv @@ q AND project_id = :project_id{kind_filter} ORDER BY score DESC LIMIT :limit"
+        )
+    rows = conn.execute(text(sql), params).all()
+    return [SearchHit(kind=r.kind, ref_id=r.ref_id, title=r.title, snippet=r.snippet, score=float(r.score)) for r in rows]
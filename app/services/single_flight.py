@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+def flight_key(project_id: str, operation: str, **inputs: Any) -> tuple[str, str, str]:
+    """(project, operation, normalized inputs); whitespace and case differences in text inputs don't matter."""
+    norm = {k: " ".join(v.split()).casefold() if isinstance(v, str) else v for k, v in inputs.items()}
+    return str(project_id), operation, json.dumps(norm, sort_keys=True, default=str)
+
+
+@dataclass
+class Flight:
+    run_id: str
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: str | None = None
+    finished_at: float | None = None
+
+    def wait(self) -> Any:
+        """Blocks until the leading request finishes; returns its result or re-raises its failure."""
+        self.done.wait()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return self.result
+
+
+class SingleFlight:
+    """
+    Coalesces identical generation requests.
+    The first caller for a key leads (creates the run and does the work); identical callers that
+    arrive while it is in flight, or within `window_seconds` after it succeeded, attach to its run.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[tuple[str, str, str], Flight] = {}
+
+    def acquire(self, key: tuple[str, str, str], *, start: Callable[[], str], window_seconds: float) -> tuple[Flight, bool]:
+        """Returns (flight, is_leader). `start` creates the leader's run and returns its id."""
+        with self._lock:
+            now = time.monotonic()
+            for k, f in list(self._flights.items()):
+                if f.finished_at is not None and now - f.finished_at >= window_seconds:
+                    self._flights.pop(k, None)
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+
+            flight = Flight(run_id=str(start()))
+            self._flights[key] = flight
+            return flight, True
+
+    def run(self, key: tuple[str, str, str], flight: Flight, fn: Callable[[], Any]) -> Any:
+        """
+        Runs the leader's job and publishes its outcome to attached callers.
+        Called from the worker thread so followers are released even if the leader's socket goes away.
+        """
+        try:
+            result = fn()
+        except BaseException as ex:
+            self._finish(key, flight, error=f"{type(ex).__name__}: {ex}")
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    def _finish(self, key: tuple[str, str, str], flight: Flight, *, result: Any = None, error: str | None = None) -> None:
+        with self._lock:
+            flight.result = result
+            flight.error = error
+            flight.finished_at = time.monotonic()
+            # Failures are never replayed; the next identical request starts a fresh run.
+            if error is not None and self._flights.get(key) is flight:
+                self._flights.pop(key, None)
+        flight.done.set()
+
+
+single_flight = SingleFlight()
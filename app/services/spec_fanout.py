@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import session as db_session
+from app.db.models import Project, Run, RunStatus, SpecDocument, SpecStatus, Story, StoryStatus
+from app.services.late_upgrades import upgrade_spec_document
+from app.services.llm_deadline import DeferredUpgrade
+from app.services.llm_scheduler import LANE_BULK, llm_request_context
+from app.services.run_events import emit_run_event
+from app.services.spec_generation import generate_spec_for_story
+
+
+class _StartPacer:
+    """Spaces job starts so a batch never launches more than `per_minute` generations per minute."""
+
+    def __init__(self, per_minute: int) -> None:
+        self._interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self._interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+def save_spec_document(
+    db: Session,
+    *,
+    project_id: str,
+    story_id: str,
+    spec_payload: dict[str, Any],
+    constraints: str,
+    feedback: str,
+    attempts: int = 5,
+) -> SpecDocument:
+    """
+    Persists the next SpecDocument version for a story.
+    Two writers can read the same max(version); the unique (story_id, version) index rejects
+    the loser, which re-reads and takes the following number.
+    """
+    for attempt in range(attempts):
+        latest = db.query(func.max(SpecDocument.version)).filter(SpecDocument.story_id == story_id).scalar()
+        doc = SpecDocument(
+            project_id=project_id,
+            story_id=story_id,
+            version=int(latest or 0) + 1,
+            constraints=constraints,
+            feedback=feedback,
+            status=SpecStatus.proposed,
+            overview=spec_payload.get("overview", ""),
+            goals=spec_payload.get("goals", ""),
+            functional_requirements_json=json.dumps(spec_payload.get("functional_requirements", []), ensure_ascii=False),
+            api_contracts_json=json.dumps(spec_payload.get("api_contracts", []), ensure_ascii=False),
+            data_model_changes_json=json.dumps(spec_payload.get("data_model_changes", []), ensure_ascii=False),
+            security_considerations=spec_payload.get("security_considerations", ""),
+            error_handling=spec_payload.get("error_handling", ""),
+            observability=spec_payload.get("observability", ""),
+            test_plan_json=json.dumps(spec_payload.get("test_plan", []), ensure_ascii=False),
+            implementation_plan_json=json.dumps(spec_payload.get("implementation_plan", []), ensure_ascii=False),
+            mermaid_sequence=spec_payload.get("mermaid_sequence", ""),
+            mermaid_er=spec_payload.get("mermaid_er", ""),
+        )
+        db.add(doc)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if attempt == attempts - 1:
+                raise
+            continue
+        db.refresh(doc)
+        return doc
+    raise RuntimeError("unreachable")
+
+
+def approved_story_ids(db: Session, *, story_batch_id: str) -> list[str]:
+    rows = (
+        db.query(Story.id)
+        .filter(Story.batch_id == story_batch_id, Story.status == StoryStatus.approved)
+        .order_by(Story.created_at.asc())
+        .all()
+    )
+    return [str(r[0]) for r in rows]
+
+
+def _generate_for_story(
+    *, project_id: str, run_id: str, story_id: str, constraints: str, pacer: _StartPacer
+) -> dict[str, Any]:
+    pacer.wait()
+    # Each worker owns its session; SQLAlchemy sessions are not shared across threads.
+    db = db_session.SessionLocal()
+    try:
+        story = db.get(Story, story_id)
+        project = db.get(Project, project_id)
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.story.started",
+            message=f"Spec generation started for story: {story.statement}",
+            payload={"story_id": story_id},
+        )
+
+        def _emit_partial(section: str, value: Any) -> None:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="specs.partial",
+                message=f"Spec section ready: {section}",
+                payload={"story_id": story_id, "section": section, "value": value},
+            )
+
+        def _reset_partials() -> None:
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="specs.partial_reset",
+                message="Streamed spec sections discarded; replacements follow",
+                payload={"story_id": story_id},
+            )
+
+        upgrade = DeferredUpgrade()
+        with llm_request_context(lane=LANE_BULK, user_id=str(project.owner_id), run_id=run_id):
+            spec_payload = generate_spec_for_story(
+                product_request=project.product_request,
+                story_statement=story.statement,
+                acceptance_criteria=json.loads(story.acceptance_criteria_json or "[]"),
+                constraints=constraints,
+                feedback="",
+                on_section=_emit_partial,
+                on_upgrade=upgrade.deliver,
+                on_reset=_reset_partials,
+            )
+        doc = save_spec_document(
+            db,
+            project_id=project_id,
+            story_id=story_id,
+            spec_payload=spec_payload,
+            constraints=constraints,
+            feedback="",
+        )
+
+        result = {"story_id": story_id, "spec_id": str(doc.id), "version": doc.version}
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.story.completed",
+            message=f"Spec v{doc.version} generated",
+            payload=result,
+        )
+        upgrade.bind(partial(upgrade_spec_document, spec_id=str(doc.id), run_id=run_id))
+        return result
+    except Exception as ex:
+        db.rollback()
+        error = f"{type(ex).__name__}: {ex}"
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.story.failed",
+            message=f"Spec generation failed for story {story_id}: {error}",
+            payload={"story_id": story_id, "error": error},
+        )
+        raise
+    finally:
+        db.close()
+
+
+def generate_specs_for_stories_job(
+    *,
+    project_id: str,
+    run_id: str,
+    story_ids: list[str],
+    constraints: str,
+    concurrency: int,
+    rate_per_minute: int,
+) -> dict[str, Any]:
+    """
+    Worker thread job for specs.generate_batch.
+    Generates one spec per approved story concurrently (at most `concurrency` at a time, and no more
+    than `rate_per_minute` starts per minute), all under the parent run.
+    Returns {"run_id":..., "specs":[{story_id, spec_id, version}], "failed":[{story_id, error}]}.
+    """
+    db = db_session.SessionLocal()
+    try:
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.started",
+            message=f"Spec generation started for {len(story_ids)} stories",
+            payload={"story_ids": story_ids, "concurrency": concurrency, "rate_per_minute": rate_per_minute},
+        )
+
+        pacer = _StartPacer(rate_per_minute)
+        specs: list[dict[str, Any]] = []
+        failed: list[dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="specs-fanout") as pool:
+            futures = {
+                story_id: pool.submit(
+                    _generate_for_story,
+                    project_id=project_id,
+                    run_id=run_id,
+                    story_id=story_id,
+                    constraints=constraints,
+                    pacer=pacer,
+                )
+                for story_id in story_ids
+            }
+            for story_id, fut in futures.items():
+                try:
+                    specs.append(fut.result())
+                except Exception as ex:
+                    failed.append({"story_id": story_id, "error": f"{type(ex).__name__}: {ex}"})
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="specs.generated",
+            message=f"Generated specs for {len(specs)} of {len(story_ids)} stories",
+            payload={"specs": specs, "failed": failed},
+        )
+
+        run = db.get(Run, run_id)
+        if run:
+            run.status = RunStatus.failed if story_ids and not specs else RunStatus.completed
+            db.commit()
+
+        return {"run_id": run_id, "specs": specs, "failed": failed}
+    finally:
+        db.close()
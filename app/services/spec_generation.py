@@ -1,9 +1,14 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 import json
 from app.core.config import get_settings
+from app.services.json_stream import JsonStreamScanner
+from app.services.llm import stream_chat_json
+from app.services.llm_deadline import call_with_deadline
+from app.services.llm_schemas import SPEC_ADAPTER, validate_or_none
+from app.services.prompt_budget import budget_prompt
 
 
 def _heuristic_spec(*, story_statement: str, acceptance_criteria: List[str], constraints: str, feedback: str) -> Dict[str, Any]:
@@ -42,6 +47,68 @@ def _heuristic_spec(*, story_statement: str, acceptance_criteria: List[str], con
     }
 
 
+def _emit_sections(spec: Dict[str, Any], on_section: Callable[[str, Any], None] | None) -> Dict[str, Any]:
+    if on_section:
+        for key, value in spec.items():
+            on_section(key, value)
+    return spec
+
+
+def _openai_generate_spec(
+    *,
+    product_request: str,
+    story_statement: str,
+    acceptance_criteria: List[str],
+    constraints: str,
+    feedback: str,
+    on_section: Callable[[str, Any], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
+) -> Dict[str, Any]:
+    system = (
+        "You are a software architect. Produce a formal implementation spec as strict JSON. "
+        "Keys: overview, goals, functional_requirements[], api_contracts[], data_model_changes[], "
+        "security_considerations, error_handling, observability, test_plan[], implementation_plan[], "
+        "mermaid_sequence, mermaid_er. Keep diagrams as Mermaid strings. "
+        "REQUIREMENTS: mermaid_sequence MUST include 'sequenceDiagram' and be non-empty. "
+        "mermaid_er MUST include 'erDiagram' and be non-empty. "
+    )
+    # The story statement and reviewer feedback are what the spec answers to; never trim them.
+    inputs = budget_prompt(
+        "specs",
+        {"product_request": product_request, "acceptance_criteria": acceptance_criteria, "constraints": constraints},
+        fixed=system + story_statement + feedback,
+    )
+    user_payload = {
+        "product_request": inputs["product_request"],
+        "story": {"statement": story_statement, "acceptance_criteria": inputs["acceptance_criteria"]},
+        "constraints": inputs["constraints"],
+        "feedback": feedback,
+    }
+    scanner = JsonStreamScanner(mode="members")
+    spec: Dict[str, Any] = {}
+    for delta in stream_chat_json(system=system, user=json.dumps(user_payload)):
+        for key, value in scanner.feed(delta):
+            spec[key] = value
+            if on_section:
+                on_section(key, value)
+    if not scanner.complete:
+        # Truncated completion: take the sections the repaired JSON still holds (a cut-off string is kept as-is).
+        repaired = scanner.repair()
+        if isinstance(repaired, dict):
+            _emit_sections({k: v for k, v in repaired.items() if k not in spec}, on_section)
+            spec = {**repaired, **spec}
+    validated = validate_or_none(SPEC_ADAPTER, spec) if spec else None
+    if validated is not None:
+        # Coerced to the documented shape: every key present, prose fields as text, list fields as lists.
+        return validated.model_dump()
+    if spec and on_reset:
+        on_reset()  # the streamed sections are replaced by the heuristic spec, not merged with it
+    return _emit_sections(
+        _heuristic_spec(story_statement=story_statement, acceptance_criteria=acceptance_criteria, constraints=constraints, feedback=feedback),
+        on_section,
+    )
+
+
 def generate_spec_for_story(
     *,
     product_request: str,
@@ -49,49 +116,44 @@ def generate_spec_for_story(
     acceptance_criteria: List[str],
     constraints: str,
     feedback: str,
+    on_section: Callable[[str, Any], None] | None = None,
+    on_upgrade: Callable[[Dict[str, Any]], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
 ) -> Dict[str, Any]:
     """
     If OPENAI key is configured, use it; otherwise produce a deterministic spec.
     Produces keys: overview, goals, functional_requirements[], api_contracts[], data_model_changes[],
     security_considerations, error_handling, observability, test_plan[], implementation_plan[],
     mermaid_sequence, mermaid_er.
+    on_section(key, value) is called for each top-level section as soon as it is complete; on_reset means discard
+    the sections streamed so far, the returned spec's sections are streamed again.
+    If the LLM misses its deadline the deterministic spec is returned; on_upgrade gets the LLM spec if it arrives later.
     """
     settings = get_settings()
+    heuristic = lambda: _emit_sections(  # noqa: E731
+        _heuristic_spec(story_statement=story_statement, acceptance_criteria=acceptance_criteria, constraints=constraints, feedback=feedback),
+        on_section,
+    )
     if settings.openai_api_key:
-        from openai import OpenAI
-        client = OpenAI(api_key=settings.openai_api_key)
-        system = (
-            "You are a software architect. Produce a formal implementation spec as strict JSON. "
-            "Keys: overview, goals, functional_requirements[], api_contracts[], data_model_changes[], "
-            "security_considerations, error_handling, observability, test_plan[], implementation_plan[], "
-            "mermaid_sequence, mermaid_er. Keep diagrams as Mermaid strings. "
-            "REQUIREMENTS: mermaid_sequence MUST include 'sequenceDiagram' and be non-empty. "
-            "mermaid_er MUST include 'erDiagram' and be non-empty. "
-        )
-        user_payload = {
-            "product_request": product_request,
-            "story": {"statement": story_statement, "acceptance_criteria": acceptance_criteria},
-            "constraints": constraints,
-            "feedback": feedback,
-        }
-        resp = client.chat.completions.create(
-            model=settings.openai_model,
-            temperature=0.2,
-            response_format={"type": "json_object"},
-            messages=[{"role": "system", "content": system}, {"role": "user", "content": json.dumps(user_payload)}],
+        return call_with_deadline(
+            "specs",
+            lambda cb, reset: _openai_generate_spec(
+                product_request=product_request,
+                story_statement=story_statement,
+                acceptance_criteria=acceptance_criteria,
+                constraints=constraints,
+                feedback=feedback,
+                on_section=cb,
+                on_reset=reset,
+            ),
+            fallback=heuristic,
+            on_item=on_section,
+            on_late_result=on_upgrade,
+            on_reset=on_reset,
+            replay=lambda spec: _emit_sections(spec, on_section),
         )
-        content = resp.choices[0].message.content or "{}"
-        try:
-            return json.loads(content)
-        except Exception:
-            pass
     # Fallback (deterministic)
-    return _heuristic_spec(
-        story_statement=story_statement,
-        acceptance_criteria=acceptance_criteria,
-        constraints=constraints,
-        feedback=feedback,
-    )
+    return heuristic()
 
 
 def _ensure_two_mermaid_diagrams(
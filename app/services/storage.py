@@ -1,34 +1,222 @@
 from __future__ import annotations
 
+import hashlib
+import threading
 import uuid
-from io import BytesIO
-from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path, PurePosixPath
+from typing import Awaitable, Callable
 
-from pypdf import PdfReader
+import anyio
+import httpx
+from sqlalchemy import Connection, delete, event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.db.models import Artifact, Blob
+from app.services.storage_backends import LocalBackend, S3Backend, StorageBackend
 
 
-def project_root(project_id: str) -> Path:
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StagedUpload:
+    path: Path  # local temporary file
+    size_bytes: int
+    sha256: str
+
+
+_backends: dict[tuple, StorageBackend] = {}
+_backends_lock = threading.Lock()
+# HTTP transport for the S3 backend; None means a real network connection (tests install an in-process stand-in).
+_s3_transport: httpx.BaseTransport | None = None
+
+
+def get_storage() -> StorageBackend:
+    """The configured backend (STORAGE_BACKEND): local files under STORAGE_ROOT, or an S3-compatible bucket."""
     settings = get_settings()
-    root = settings.storage_root / "projects" / project_id
-    root.mkdir(parents=True, exist_ok=True)
-    return root
+    config = (
+        settings.storage_backend,
+        str(settings.storage_root),
+        settings.s3_endpoint_url,
+        settings.s3_bucket,
+        settings.s3_prefix,
+        settings.s3_region,
+        settings.s3_access_key_id,
+        settings.s3_cache_max_mb,
+        id(_s3_transport),
+    )
+    with _backends_lock:
+        backend = _backends.get(config)
+        if backend is None:
+            if settings.storage_backend == "s3":
+                backend = S3Backend(
+                    endpoint_url=settings.s3_endpoint_url,
+                    bucket=settings.s3_bucket,
+                    access_key_id=settings.s3_access_key_id,
+                    secret_access_key=settings.s3_secret_access_key,
+                    region=settings.s3_region,
+                    prefix=settings.s3_prefix,
+                    cache_dir=settings.storage_root / "cache",
+                    cache_max_bytes=settings.s3_cache_max_mb * 1024 * 1024,
+                    transport=_s3_transport,
+                )
+            else:
+                backend = LocalBackend(settings.storage_root)
+            _backends[config] = backend
+        return backend
+
+
+def run_key(project_id: str, run_id: str, filename: str) -> str:
+    return f"projects/{project_id}/runs/{run_id}/{filename}"
+
+
+def blob_key(sha256: str) -> str:
+    # Fanned out by the first two hex digits so no directory grows to hundreds of thousands of entries.
+    return f"blobs/{sha256[:2]}/{sha256}"
+
+
+def blob_sha(path: str) -> str | None:
+    """The content hash if `path` (an Artifact.path) is a blob, whether a storage key or a local path to one."""
+    p = PurePosixPath(path)
+    if len(p.name) == 64 and p.parent.name == p.name[:2] and p.parent.parent.name == "blobs":
+        return p.name
+    return None  # stored before the blob store existed
+
+
+def artifact_location(path: str) -> tuple[StorageBackend, str]:
+    """Backend and key for an Artifact.path: blobs live in the configured backend, older rows hold a local path."""
+    sha256 = blob_sha(path)
+    if sha256 is not None and path == blob_key(sha256):
+        return get_storage(), path
+    legacy = Path(path)
+    return LocalBackend(legacy.parent), legacy.name
+
+
+def artifact_local_path(path: str) -> Path:
+    storage, key = artifact_location(path)
+    return storage.local_path(key)
+
+
+def _staging_dir() -> Path:
+    # Local scratch space even with a remote backend; with the local one it shares a filesystem with the blobs.
+    staging = get_settings().storage_root / ".staging"
+    staging.mkdir(parents=True, exist_ok=True)
+    return staging
+
+
+async def stage_upload(read: Callable[[int], Awaitable[bytes]], *, max_bytes: int) -> StagedUpload:
+    """
+    Copies an upload to a temp file chunk by chunk, hashing as it goes, so memory per upload stays at one chunk.
+    Raises UploadTooLarge (and removes the partial file) as soon as more than max_bytes have arrived.
+    """
+    tmp = _staging_dir() / f".{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp.open("wb") as out:
+            while chunk := await read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await anyio.to_thread.run_sync(out.write, chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return StagedUpload(path=tmp, size_bytes=size, sha256=digest.hexdigest())
+
+
+async def store_blob(db: Session, staged: StagedUpload) -> tuple[str, bool]:
+    """
+    Moves a staged upload into the blob store, or drops it if those bytes are already stored.
+    Returns the blob key and whether anything was written. Commits the Blob row; the artifact that
+    references the path is what raises its ref_count. The staged file is gone afterwards, on errors too.
+    """
+    try:
+        _touch_blob(db, staged)
+        key = blob_key(staged.sha256)
+        storage = get_storage()
+        if await storage.aexists(key):
+            discard_upload(staged)
+            return key, False
+        await storage.aput_file(key, staged.path)
+        return key, True
+    except BaseException:
+        discard_upload(staged)
+        raise
+
+
+def _touch_blob(db: Session, staged: StagedUpload) -> None:
+    # Touched before the file check, so a concurrent collect_garbage() no longer sees it as idle.
+    now = datetime.utcnow()
+    blob = db.get(Blob, staged.sha256)
+    if blob is None:
+        db.add(Blob(sha256=staged.sha256, size_bytes=staged.size_bytes, ref_count=0, last_used_at=now))
+        try:
+            db.commit()
+            return
+        except IntegrityError:
+            # A concurrent first upload of the same bytes inserted the row first; touch theirs instead.
+            db.rollback()
+        db.execute(update(Blob).where(Blob.sha256 == staged.sha256).values(last_used_at=now))
+    else:
+        blob.last_used_at = now
+    db.commit()
+
+
+def discard_upload(staged: StagedUpload) -> None:
+    staged.path.unlink(missing_ok=True)
+
+
+def _adjust_ref_count(connection: Connection, path: str, delta: int) -> None:
+    sha256 = blob_sha(path)
+    if sha256 is not None:
+        connection.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256)
+            .values(ref_count=Blob.ref_count + delta, last_used_at=datetime.utcnow())
+        )
+
 
+# Counted in the same transaction as the artifact row itself, including cascaded deletes (user -> projects -> artifacts).
+@event.listens_for(Artifact, "after_insert")
+def _artifact_inserted(mapper, connection: Connection, target: Artifact) -> None:
+    _adjust_ref_count(connection, target.path, 1)
 
-def save_pdf_upload(*, project_id: str, filename: str, content: bytes) -> Path:
-    uploads_dir = project_root(project_id) / "uploads"
-    uploads_dir.mkdir(parents=True, exist_ok=True)
 
-    safe_name = Path(filename).name
-    ext = ".pdf" if safe_name.lower().endswith(".pdf") else ""
-    target = uploads_dir / f"{uuid.uuid4()}{ext}"
-    target.write_bytes(content)
-    return target
+@event.listens_for(Artifact, "after_delete")
+def _artifact_deleted(mapper, connection: Connection, target: Artifact) -> None:
+    _adjust_ref_count(connection, target.path, -1)
 
 
-def validate_pdf_bytes(content: bytes) -> None:
-    # Will raise if the PDF is invalid/corrupted.
-    # PdfReader expects a file path or a file-like object, not raw bytes.
-    reader = PdfReader(BytesIO(content), strict=False)
-    _ = len(reader.pages)
+def collect_garbage(db: Session, *, grace_seconds: float | None = None) -> dict[str, int]:
+    """
+    Deletes blobs no artifact references any more, together with files derived from them (e.g. extracted
+    text), once they have been idle for BLOB_GC_GRACE_SECONDS. Returns counts of blobs and bytes freed.
+    """
+    grace = get_settings().blob_gc_grace_seconds if grace_seconds is None else grace_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    candidates = db.query(Blob).filter(Blob.ref_count <= 0, Blob.last_used_at <= cutoff).all()
+    deleted = freed = 0
+    for blob in candidates:
+        # Compare-and-delete: an upload that touched the blob or an artifact that referenced it since the query wins.
+        gone = db.execute(
+            delete(Blob).where(Blob.sha256 == blob.sha256, Blob.ref_count <= 0, Blob.last_used_at <= cutoff)
+        ).rowcount
+        db.commit()
+        if gone != 1:
+            continue
+        storage = get_storage()
+        for key in list(storage.list_keys(blob_key(blob.sha256))):
+            storage.delete(key)
+        deleted += 1
+        freed += blob.size_bytes
+    return {"blobs_deleted": deleted, "bytes_freed": freed}
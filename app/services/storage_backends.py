@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import errno
+import hashlib
+import hmac
+import io
+import os
+import shutil
+import tempfile
+import uuid
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from urllib.parse import quote
+
+import anyio
+import httpx
+
+
+# Everything the app persists outside the database (uploads, research markdown and notes, Mermaid graphs)
+# is an object addressed by a POSIX key relative to the storage root, e.g. "projects/<id>/runs/<id>/research.md".
+# The backend decides where the bytes live: the local filesystem under STORAGE_ROOT, or an S3-compatible bucket
+# so several API/worker nodes can share them. Writes are atomic in both (temp file + rename, or a single PUT).
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    mtime_ns: int
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def read_bytes(self, key: str) -> bytes | None:
+        """The object's bytes, or None if it does not exist."""
+
+    @abstractmethod
+    def write_bytes(self, key: str, data: bytes) -> None: ...
+
+    @abstractmethod
+    def put_file(self, key: str, path: Path) -> None:
+        """Stores a local file under `key` without reading it into memory; the local file is consumed."""
+
+    @abstractmethod
+    def stat(self, key: str) -> ObjectInfo | None: ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Removes the object; a missing object is not an error."""
+
+    @abstractmethod
+    def list_keys(self, prefix: str) -> Iterator[str]: ...
+
+    @abstractmethod
+    @contextmanager
+    def open_read(self, key: str, *, start: int = 0, end: int | None = None) -> Iterator[BinaryIO]:
+        """
+        A streaming binary reader over bytes [start, end) of the object (to its end when end is None);
+        raises FileNotFoundError if the object does not exist.
+        """
+
+    @abstractmethod
+    def local_path(self, key: str) -> Path:
+        """A local file with the object's bytes, for tools that need a path (e.g. the PDF parser)."""
+
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        """Where the object lives, for logs and event payloads."""
+
+    @contextmanager
+    def open_write(self, key: str) -> Iterator[BinaryIO]:
+        """A streaming binary writer; the object appears (atomically) only when the block exits without error."""
+        fd, tmp = tempfile.mkstemp(prefix=".upload-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                yield out
+            self.put_file(key, Path(tmp))
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def read_text(self, key: str) -> str | None:
+        data = self.read_bytes(key)
+        return None if data is None else data.decode("utf-8", errors="ignore")
+
+    def write_text(self, key: str, text: str) -> None:
+        self.write_bytes(key, text.encode("utf-8"))
+
+    # Async variants for the event loop: the blocking I/O runs on a worker thread.
+
+    async def aread_bytes(self, key: str) -> bytes | None:
+        return await anyio.to_thread.run_sync(self.read_bytes, key)
+
+    async def awrite_bytes(self, key: str, data: bytes) -> None:
+        await anyio.to_thread.run_sync(self.write_bytes, key, data)
+
+    async def aput_file(self, key: str, path: Path) -> None:
+        await anyio.to_thread.run_sync(self.put_file, key, path)
+
+    async def aexists(self, key: str) -> bool:
+        return await anyio.to_thread.run_sync(self.exists, key)
+
+
+def _check_key(key: str) -> str:
+    if not key or key.startswith("/") or ".." in key.split("/"):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+class LocalBackend(StorageBackend):
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def _replace(self, src: Path, dst: Path) -> None:
+        # Directories are created on first write into them rather than on every call.
+        try:
+            os.replace(src, dst)
+        except FileNotFoundError:
+            if not src.exists():
+                raise
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dst)
+        except OSError as ex:
+            if ex.errno != errno.EXDEV:
+                raise
+            # Different filesystem (e.g. a temp file from /tmp): copy, then rename into place.
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(f".{uuid.uuid4()}.part")
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+            src.unlink(missing_ok=True)
+
+    def read_bytes(self, key: str) -> bytes | None:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        try:
+            tmp = path.with_name(f".{uuid.uuid4()}.part")
+            tmp.write_bytes(data)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+        try:
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def put_file(self, key: str, path: Path) -> None:
+        self._replace(Path(path), self._path(key))
+
+    def stat(self, key: str) -> ObjectInfo | None:
+        try:
+            st = self._path(key).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        base = self.root / prefix
+        directory = base if prefix.endswith("/") else base.parent
+        if not directory.is_dir():
+            return
+        for p in sorted(directory.rglob("*")):
+            key = p.relative_to(self.root).as_posix()
+            if p.is_file() and key.startswith(prefix) and not p.name.startswith("."):
+                yield key
+
+    @contextmanager
+    def open_read(self, key: str, *, start: int = 0, end: int | None = None) -> Iterator[BinaryIO]:
+        with self._path(key).open("rb") as f:
+            if start:
+                f.seek(start)
+            yield f if end is None else io.BufferedReader(_SliceReader(f, end - start))
+
+    @contextmanager
+    def open_write(self, key: str) -> Iterator[BinaryIO]:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{uuid.uuid4()}.part")
+        try:
+            with tmp.open("wb") as out:
+                yield out
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def local_path(self, key: str) -> Path:
+        return self._path(key)
+
+    def uri(self, key: str) -> str:
+        return str(self._path(key))
+
+
+class _SliceReader(io.RawIOBase):
+    """Read-only file object over the next `length` bytes of another one."""
+
+    def __init__(self, f: BinaryIO, length: int) -> None:
+        self._f = f
+        self._remaining = max(length, 0)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._remaining:
+            return 0
+        data = self._f.read(min(len(buffer), self._remaining))
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+class _ResponseReader(io.RawIOBase):
+    """Read-only file object over a streamed HTTP response body."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        self._chunks = response.iter_bytes()
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class S3Backend(StorageBackend):
+    """
+    S3-compatible object store (AWS S3, MinIO, Ceph, R2, ...) over plain HTTP with AWS Signature V4 and
+    path-style URLs. Objects fetched by local_path() are cached under `cache_dir`; only immutable objects
+    (content-addressed blobs) are read that way. The cache holds at most `cache_max_bytes`: after each download
+    the least recently used files are removed until it fits again (the file just fetched is always kept).
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint_url: str,
+        bucket: str,
+        access_key_id: str,
+        secret_access_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        cache_dir: Path,
+        cache_max_bytes: int = 2 * 1024**3,
+        transport: httpx.BaseTransport | None = None,
+        timeout_seconds: float = 60.0,
+    ) -> None:
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.region = region
+        self.cache_dir = Path(cache_dir)
+        self.cache_max_bytes = cache_max_bytes
+        self._access_key_id = access_key_id
+        self._secret_access_key = secret_access_key
+        self._host = httpx.URL(endpoint_url).netloc.decode("ascii")
+        self._client = httpx.Client(base_url=endpoint_url.rstrip("/"), transport=transport, timeout=timeout_seconds)
+
+    # --- signing ---------------------------------------------------------------------------------------
+
+    def _signed_headers(self, method: str, path: str, canonical_query: str, payload_sha256: str) -> dict[str, str]:
+        now = datetime.now(timezone.utc)
+        amz_date, day = now.strftime("%Y%m%dT%H%M%SZ"), now.strftime("%Y%m%d")
+        headers = {"host": self._host, "x-amz-content-sha256": payload_sha256, "x-amz-date": amz_date}
+        signed = ";".join(sorted(headers))
+        canonical = "\n".join(
+            [method, path, canonical_query, *(f"{k}:{headers[k]}" for k in sorted(headers)), "", signed, payload_sha256]
+        )
+        scope = f"{day}/{self.region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, _sha256_hex(canonical.encode("utf-8"))])
+        key = f"AWS4{self._secret_access_key}".encode("utf-8")
+        for part in (day, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(key, to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self._access_key_id}/{scope}, SignedHeaders={signed}, Signature={signature}"
+        )
+        del headers["host"]  # httpx sends it
+        return headers
+
+    def _object_path(self, key: str) -> str:
+        return "/" + quote(f"{self.bucket}/{self.prefix}{_check_key(key)}", safe="/-_.~")
+
+    def _request(
+        self, method: str, path: str, *, query: dict[str, str] | None = None, content=None, payload_sha256: str | None = None,
+        extra_headers: dict[str, str] | None = None, stream: bool = False,
+    ) -> httpx.Response:
+        # The query string is built once so the bytes sent are exactly the ones signed.
+        canonical_query = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted((query or {}).items()))
+        headers = self._signed_headers(method, path, canonical_query, payload_sha256 or _sha256_hex(b""))
+        headers.update(extra_headers or {})
+        url = f"{path}?{canonical_query}" if canonical_query else path
+        request = self._client.build_request(method, url, content=content, headers=headers)
+        response = self._client.send(request, stream=stream)
+        if response.status_code >= 400 and response.status_code != 404:
+            body = response.read()[:500] if not stream else b""
+            response.close()
+            raise OSError(f"S3 {method} {path} failed with HTTP {response.status_code}: {body!r}")
+        return response
+
+    # --- operations ------------------------------------------------------------------------------------
+
+    def read_bytes(self, key: str) -> bytes | None:
+        r = self._request("GET", self._object_path(key))
+        return None if r.status_code == 404 else r.content
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        self._request("PUT", self._object_path(key), content=data, payload_sha256=_sha256_hex(data))
+
+    def put_file(self, key: str, path: Path) -> None:
+        path = Path(path)
+        size = path.stat().st_size
+        with path.open("rb") as f:
+            self._request(
+                "PUT",
+                self._object_path(key),
+                content=iter(lambda: f.read(1024 * 1024), b""),
+                payload_sha256=_file_sha256(path),
+                extra_headers={"content-length": str(size)},
+            )
+        path.unlink(missing_ok=True)
+
+    def stat(self, key: str) -> ObjectInfo | None:
+        r = self._request("HEAD", self._object_path(key))
+        if r.status_code == 404:
+            return None
+        modified = r.headers.get("last-modified")
+        mtime_ns = int(parsedate_to_datetime(modified).timestamp() * 1e9) if modified else 0
+        return ObjectInfo(size=int(r.headers.get("content-length", 0)), mtime_ns=mtime_ns)
+
+    def delete(self, key: str) -> None:
+        self._request("DELETE", self._object_path(key))
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        query = {"list-type": "2", "prefix": f"{self.prefix}{prefix}"}
+        while True:
+            r = self._request("GET", f"/{quote(self.bucket, safe='')}", query=query)
+            if r.status_code == 404:
+                return
+            root = ET.fromstring(r.content)
+            ns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+            for node in root.iter(f"{ns}Key"):
+                yield (node.text or "")[len(self.prefix):]
+            token = root.findtext(f"{ns}NextContinuationToken")
+            if not token:
+                return
+            query = {**query, "continuation-token": token}
+
+    @contextmanager
+    def open_read(self, key: str, *, start: int = 0, end: int | None = None) -> Iterator[BinaryIO]:
+        if end is not None and end <= start:
+            # An empty range has no valid Range header ("bytes=0--1" is rejected); only check the object exists.
+            if self.stat(key) is None:
+                raise FileNotFoundError(key)
+            yield io.BytesIO(b"")
+            return
+        byte_range = {"range": f"bytes={start}-{'' if end is None else end - 1}"} if start or end is not None else None
+        r = self._request("GET", self._object_path(key), extra_headers=byte_range, stream=True)
+        try:
+            if r.status_code == 404:
+                raise FileNotFoundError(key)
+            yield io.BufferedReader(_ResponseReader(r), buffer_size=1024 * 1024)
+        finally:
+            r.close()
+
+    def local_path(self, key: str) -> Path:
+        path = self.cache_dir / _check_key(key)
+        try:
+            os.utime(path)  # mtime doubles as the last-used time for eviction
+            return path
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{uuid.uuid4()}.part")
+        try:
+            with self.open_read(key) as src, tmp.open("wb") as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self._evict_cache(keep=path)
+        return path
+
+    def _evict_cache(self, *, keep: Path) -> None:
+        entries = []
+        for f in self.cache_dir.rglob("*"):
+            if f == keep or f.name.endswith(".part"):
+                continue
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            if f.is_file():
+                entries.append((st.st_mtime_ns, st.st_size, f))
+        total = sum(size for _, size, _ in entries) + keep.stat().st_size
+        for _, size, f in sorted(entries):
+            if total <= self.cache_max_bytes:
+                return
+            f.unlink(missing_ok=True)
+            total -= size
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self.prefix}{key}"
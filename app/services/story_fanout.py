@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from functools import partial
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.db import session as db_session
+from app.db.models import Epic, EpicStatus, Project, Run, RunStatus, Story, StoryBatch, StoryBatchStatus, StoryStatus
+from app.services.late_upgrades import upgrade_story_batch
+from app.services.llm_deadline import DeferredUpgrade
+from app.services.llm_scheduler import LANE_BULK, llm_request_context
+from app.services.research_passages import relevant_passages
+from app.services.run_events import emit_run_event
+from app.services.story_generation import generate_stories
+
+
+def _generate_for_epic(*, project_id: str, run_id: str, epic_id: str, constraints: str, count: int) -> dict[str, Any]:
+    # Each worker owns its session; SQLAlchemy sessions are not shared across threads.
+    db = db_session.SessionLocal()
+    try:
+        epic = db.get(Epic, epic_id)
+        project = db.get(Project, project_id)
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.epic.started",
+            message=f"Story generation started for epic: {epic.title}",
+            payload={"epic_id": epic_id},
+        )
+
+        partial_index = itertools.count()
+
+        def _emit_partial(s) -> None:
+            idx = next(partial_index)
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="stories.partial",
+                message=f"Story {idx + 1} ready",
+                payload={"index": idx, "epic_id": epic_id, "story": asdict(s)},
+            )
+
+        def _reset_partials() -> None:
+            nonlocal partial_index
+            partial_index = itertools.count()
+            emit_run_event(
+                db,
+                run_id=run_id,
+                event_type="stories.partial_reset",
+                message="Streamed stories discarded; replacements follow",
+                payload={"epic_id": epic_id},
+            )
+
+        passages = relevant_passages(db, project_id=project_id, query=f"{epic.title}\n{epic.goal}\n{constraints}")
+        upgrade = DeferredUpgrade()
+        with llm_request_context(lane=LANE_BULK, user_id=str(project.owner_id), run_id=run_id):
+            gen = generate_stories(
+                product_request=project.product_request,
+                epic_title=epic.title,
+                epic_goal=epic.goal,
+                constraints=constraints,
+                count=count,
+                research_passages=passages,
+                on_story=_emit_partial,
+                on_upgrade=upgrade.deliver,
+                on_reset=_reset_partials,
+            )
+
+        batch = StoryBatch(project_id=project_id, epic_id=epic_id, run_id=run_id, constraints=constraints, status=StoryBatchStatus.generated)
+        db.add(batch)
+        db.commit()
+        db.refresh(batch)
+
+        rows = [
+            Story(
+                project_id=project_id,
+                epic_id=epic_id,
+                batch_id=batch.id,
+                statement=s.statement,
+                acceptance_criteria_json=json.dumps(s.acceptance_criteria, ensure_ascii=False),
+                edge_cases=s.edge_cases,
+                non_functional=s.non_functional,
+                estimate=s.estimate,
+                estimate_reason=s.estimate_reason,
+                dependencies_json=json.dumps(s.dependencies, ensure_ascii=False),
+                status=StoryStatus.proposed,
+            )
+            for s in gen
+        ]
+        db.add_all(rows)
+        db.commit()
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.epic.completed",
+            message=f"Generated {len(rows)} stories for epic: {epic.title}",
+            payload={"epic_id": epic_id, "batch_id": str(batch.id), "story_count": len(rows)},
+        )
+        upgrade.bind(partial(upgrade_story_batch, batch_id=str(batch.id), run_id=run_id))
+        return {"epic_id": epic_id, "batch_id": str(batch.id), "story_count": len(rows)}
+    except Exception as ex:
+        db.rollback()
+        error = f"{type(ex).__name__}: {ex}"
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.epic.failed",
+            message=f"Story generation failed for epic {epic_id}: {error}",
+            payload={"epic_id": epic_id, "error": error},
+        )
+        raise
+    finally:
+        db.close()
+
+
+def approved_epic_ids(db: Session, *, epic_batch_id: str) -> list[str]:
+    rows = (
+        db.query(Epic.id)
+        .filter(Epic.batch_id == epic_batch_id, Epic.status == EpicStatus.approved)
+        .order_by(Epic.created_at.asc())
+        .all()
+    )
+    return [str(r[0]) for r in rows]
+
+
+def generate_stories_for_epic_batch_job(
+    *,
+    project_id: str,
+    run_id: str,
+    epic_ids: list[str],
+    constraints: str,
+    count: int,
+    concurrency: int,
+) -> dict[str, Any]:
+    """
+    Worker thread job for stories.generate_all.
+    Generates one story batch per approved epic concurrently (at most `concurrency` at a time),
+    all under the parent run. A failing epic is reported and does not stop the others.
+    Returns {"run_id":..., "batches":[{epic_id, batch_id, story_count}], "failed":[{epic_id, error}]}.
+    """
+    db = db_session.SessionLocal()
+    try:
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.started",
+            message=f"Story generation started for {len(epic_ids)} epics",
+            payload={"epic_ids": epic_ids, "concurrency": concurrency},
+        )
+
+        batches: list[dict[str, Any]] = []
+        failed: list[dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="stories-fanout") as pool:
+            futures = {
+                epic_id: pool.submit(
+                    _generate_for_epic,
+                    project_id=project_id,
+                    run_id=run_id,
+                    epic_id=epic_id,
+                    constraints=constraints,
+                    count=count,
+                )
+                for epic_id in epic_ids
+            }
+            # Preserve epic order in the result; completion events already streamed as each finished.
+            for epic_id, fut in futures.items():
+                try:
+                    batches.append(fut.result())
+                except Exception as ex:
+                    failed.append({"epic_id": epic_id, "error": f"{type(ex).__name__}: {ex}"})
+
+        emit_run_event(
+            db,
+            run_id=run_id,
+            event_type="stories.generated",
+            message=f"Generated stories for {len(batches)} of {len(epic_ids)} epics",
+            payload={"batches": batches, "failed": failed},
+        )
+
+        run = db.get(Run, run_id)
+        if run:
+            # Partial failure still completes the run; only a run where every epic failed is failed.
+            run.status = RunStatus.failed if epic_ids and not batches else RunStatus.completed
+            db.commit()
+
+        return {"run_id": run_id, "batches": batches, "failed": failed}
+    finally:
+        db.close()
@@ -1,9 +1,14 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, List
+from typing import Any, Callable
 import json
 from app.core.config import get_settings
+from app.services.json_stream import JsonStreamScanner
+from app.services.llm import stream_chat_json
+from app.services.llm_deadline import call_with_deadline
+from app.services.llm_schemas import STORY_ADAPTER, validate_or_none
+from app.services.prompt_budget import budget_prompt
 
 @dataclass
 class GeneratedStory:
@@ -35,64 +40,107 @@ def _heuristic_stories(*, epic_title: str, constraints: str, count: int) -> list
         )
     return out
 
-def _openai_generate_stories(*, product_request: str, epic_title: str, epic_goal: str, constraints: str, count: int) -> list[GeneratedStory]:
-    settings = get_settings()
-    from openai import OpenAI
-    client = OpenAI(api_key=settings.openai_api_key)
+def _story_from_dict(s: Any) -> GeneratedStory | None:
+    # One compiled validation pass: coerces odd field types, strips text, rejects items without a statement.
+    out = validate_or_none(STORY_ADAPTER, s)
+    return GeneratedStory(**out.model_dump()) if out is not None else None
+
+def _emit_all(stories: list[GeneratedStory], on_story: Callable[[GeneratedStory], None] | None) -> list[GeneratedStory]:
+    if on_story:
+        for s in stories:
+            on_story(s)
+    return stories
 
+def _openai_generate_stories(
+    *,
+    product_request: str,
+    epic_title: str,
+    epic_goal: str,
+    constraints: str,
+    count: int,
+    research_passages: list[dict[str, str]] | None = None,
+    on_story: Callable[[GeneratedStory], None] | None = None,
+) -> list[GeneratedStory]:
     system = (
         "You are a product planning assistant. Generate implementable user stories for the given epic. "
         "Return STRICT JSON only with: stories: [ { statement, acceptance_criteria[], edge_cases, non_functional, estimate, estimate_reason, dependencies[] } ]. "
         "Acceptance criteria must be Given/When/Then bullets. Keep estimate as T-shirt size (XS/S/M/L/XL). No markdown."
     )
+    inputs = budget_prompt(
+        "stories",
+        {
+            "product_request": product_request,
+            "epic_goal": epic_goal,
+            "constraints": constraints,
+            "research_passages": research_passages or [],
+        },
+        fixed=system + epic_title,
+    )
     user_payload = {
-        "product_request": product_request,
-        "epic": {"title": epic_title, "goal": epic_goal},
-        "constraints": constraints,
+        "product_request": inputs["product_request"],
+        "epic": {"title": epic_title, "goal": inputs["epic_goal"]},
+        "constraints": inputs["constraints"],
+        "relevant_research_passages": inputs["research_passages"],
         "count": count,
     }
-    resp = client.chat.completions.create(
-        model=settings.openai_model,
-        temperature=0.2,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
-        ],
-    )
-    content = resp.choices[0].message.content or "{}"
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        return _heuristic_stories(epic_title=epic_title, constraints=constraints, count=count)
-
-    items: List[dict[str, Any]] = list(data.get("stories") or [])
-    if not items:
-        return _heuristic_stories(epic_title=epic_title, constraints=constraints, count=count)
 
+    scanner = JsonStreamScanner(mode="items", array_key="stories")
     out: list[GeneratedStory] = []
-    for s in items[: max(1, count)]:
-        out.append(
-            GeneratedStory(
-                statement=str(s.get("statement", "")).strip(),
-                acceptance_criteria=[str(x).strip() for x in (s.get("acceptance_criteria") or [])],
-                edge_cases=str(s.get("edge_cases", "")).strip(),
-                non_functional=str(s.get("non_functional", "")).strip(),
-                estimate=str(s.get("estimate", "M")).strip(),
-                estimate_reason=str(s.get("estimate_reason", "")).strip(),
-                dependencies=[str(x).strip() for x in (s.get("dependencies") or [])],
-            )
-        )
+    seen = 0
+
+    def _accept(item: Any) -> None:
+        story = _story_from_dict(item) if len(out) < max(1, count) else None
+        if story is None:
+            return
+        out.append(story)
+        if on_story:
+            on_story(story)
+
+    for delta in stream_chat_json(system=system, user=json.dumps(user_payload, ensure_ascii=False)):
+        for item in scanner.feed(delta):
+            seen += 1
+            _accept(item)
+    if not scanner.complete:
+        # Truncated completion: keep the stories the repaired JSON still holds instead of falling back.
+        for item in scanner.salvage_items(seen):
+            _accept(item)
+
+    if not out:
+        return _emit_all(_heuristic_stories(epic_title=epic_title, constraints=constraints, count=count), on_story)
     return out
 
-def generate_stories(*, product_request: str, epic_title: str, epic_goal: str, constraints: str, count: int) -> list[GeneratedStory]:
+def generate_stories(
+    *,
+    product_request: str,
+    epic_title: str,
+    epic_goal: str,
+    constraints: str,
+    count: int,
+    research_passages: list[dict[str, str]] | None = None,
+    on_story: Callable[[GeneratedStory], None] | None = None,
+    on_upgrade: Callable[[list[GeneratedStory]], None] | None = None,
+    on_reset: Callable[[], None] | None = None,
+) -> list[GeneratedStory]:
+    # on_story is called once per story, in order, as soon as it is available; on_reset means discard those
+    # streamed so far, the returned stories are streamed again from the first.
+    # If the LLM misses its deadline the heuristic stories are returned; on_upgrade gets the LLM stories if they arrive later.
     settings = get_settings()
     if settings.openai_api_key:
-        return _openai_generate_stories(
-            product_request=product_request,
-            epic_title=epic_title,
-            epic_goal=epic_goal,
-            constraints=constraints,
-            count=count,
+        return call_with_deadline(
+            "stories",
+            lambda cb, _reset: _openai_generate_stories(
+                product_request=product_request,
+                epic_title=epic_title,
+                epic_goal=epic_goal,
+                constraints=constraints,
+                count=count,
+                research_passages=research_passages,
+                on_story=cb,
+            ),
+            fallback=lambda: _emit_all(_heuristic_stories(epic_title=epic_title, constraints=constraints, count=count), on_story),
+            on_item=on_story,
+            on_late_result=on_upgrade,
+            on_reset=on_reset,
+            replay=lambda stories: _emit_all(stories, on_story),
         )
-    return _heuristic_stories(epic_title=epic_title, constraints=constraints, count=count)
+    return _emit_all(_heuristic_stories(epic_title=epic_title, constraints=constraints, count=count), on_story)
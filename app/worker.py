@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+
+from app.core.config import get_settings
+from app.db import session as db_session
+from app.db.base import Base
+from app.services.job_queue import Worker, recover_orphaned_runs
+
+# Job handlers register themselves on import.
+import app.api.routers.runs  # noqa: F401
+import app.services.pdf_text  # noqa: F401
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Standalone job worker, so research can run (and scale) separately from the API: `python -m app.worker`."""
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Run durable background jobs.")
+    parser.add_argument("--concurrency", type=int, default=None, help="worker threads (default JOB_WORKER_CONCURRENCY)")
+    parser.add_argument("--kind", action="append", default=None, help="only claim jobs of this kind (repeatable)")
+    parser.add_argument("--once", action="store_true", help="run the jobs that are due now, then exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    settings = get_settings()
+    Base.metadata.create_all(bind=db_session.engine)
+
+    db = db_session.SessionLocal()
+    try:
+        recovered = recover_orphaned_runs(db)
+    finally:
+        db.close()
+    if recovered:
+        logging.getLogger(__name__).info("Queued %d orphaned runs again", recovered)
+
+    worker = Worker(concurrency=args.concurrency or settings.job_worker_concurrency, kinds=args.kind)
+    if args.once:
+        while worker.run_once():
+            pass
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.request_stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.request_stop())
+    worker.run_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.json_stream import JsonStreamScanner, repair_truncated_json  # noqa: E402
+from app.services.llm_schemas import SPEC_ADAPTER  # noqa: E402
+
+
+def make_spec_document(sections: int) -> str:
+    # A spec the size of a long LLM answer: many requirements, contracts and test cases.
+    doc = {
+        "overview": "Campus event companion. " * 40,
+        "goals": "Organizers publish events; students discover and RSVP. " * 20,
+        "functional_requirements": [{"requirement": f"FR-{i}: handle case {i}", "mapped_to": f"AC-{i % 8}"} for i in range(sections)],
+        "api_contracts": [
+            {"method": "POST", "path": f"/events/{i}/rsvp", "request": {"user_id": "uuid"}, "response": {"status": 201}}
+            for i in range(sections)
+        ],
+        "data_model_changes": [{"table": f"table_{i}", "change": "add column"} for i in range(sections // 4)],
+        "security_considerations": "JWT auth, role checks, input validation. " * 10,
+        "error_handling": "Problem details with stable codes. " * 10,
+        "observability": ["request logs", "rsvp counters", "latency histograms"],
+        "test_plan": [{"ac": f"AC-{i}", "tests": [f"test_{i}_happy", f"test_{i}_edge"]} for i in range(sections)],
+        "implementation_plan": [{"file": f"app/services/mod_{i}.py", "action": "create"} for i in range(sections // 2)],
+        "mermaid_sequence": "sequenceDiagram\n" + "\n".join(f"    U->>API: step {i}" for i in range(sections)),
+        "mermaid_er": "erDiagram\n    EVENT ||--o{ RSVP : has\n",
+    }
+    return json.dumps(doc)
+
+
+def _timed(label: str, fn, repeat: int) -> None:
+    fn()  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call_ms = (time.perf_counter() - started) * 1000 / repeat
+    print(f"{label:<36} {per_call_ms:8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parse + validate cost of LLM spec output")
+    parser.add_argument("--sections", type=int, default=400, help="items per list section")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--chunk", type=int, default=64, help="stream delta size in characters")
+    args = parser.parse_args()
+
+    text = make_spec_document(args.sections)
+    print(f"spec document: {len(text) / 1024:.1f} KiB, repeat={args.repeat}")
+
+    def _stream() -> None:
+        scanner = JsonStreamScanner(mode="members")
+        for i in range(0, len(text), args.chunk):
+            scanner.feed(text[i : i + args.chunk])
+
+    _timed("json.loads", lambda: json.loads(text), args.repeat)
+    _timed("SPEC_ADAPTER.validate_python", lambda: SPEC_ADAPTER.validate_python(json.loads(text)), args.repeat)
+    _timed("SPEC_ADAPTER.validate_json", lambda: SPEC_ADAPTER.validate_json(text), args.repeat)
+    _timed("streamed scan (members)", _stream, args.repeat)
+    _timed("repair (truncated at 90%)", lambda: repair_truncated_json(text[: int(len(text) * 0.9)]), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -67,8 +67,13 @@ def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
             ],
         )
 
-    monkeypatch.setattr(research_module, "tavily_search", _fake_tavily_search)
-    monkeypatch.setattr(runs_router, "tavily_search", _fake_tavily_search)
+    def _fake_search_tavily_queries(*, api_key: str, queries: list[str], **kwargs):
+        return research_module.ResearchBatch(
+            searches=[_fake_tavily_search(api_key=api_key, query=q) for q in queries],
+            failures=[],
+        )
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _fake_search_tavily_queries)
 
     with TestClient(app) as c:
         yield c
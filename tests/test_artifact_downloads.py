@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _pdf_bytes(title: str) -> bytes:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_metadata({"/Title": title})
+    buf = BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def test_uploaded_pdf_downloads_with_ranges_and_validators(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "download@example.com")
+    project_id = client.post("/projects", json={"product_request": "Fleet maintenance log"}, headers=headers).json()["id"]
+    pdf = _pdf_bytes("Fleet requirements")
+    res = client.post(f"/projects/{project_id}/documents", files={"file": ("fleet.pdf", pdf, "application/pdf")}, headers=headers)
+    assert res.status_code == 201, res.text
+    [artifact] = client.get(f"/projects/{project_id}", headers=headers).json()["artifacts"]
+    url = artifact["download_url"]
+
+    res = client.get(url, headers=headers)
+    assert res.status_code == 200 and res.content == pdf
+    etag = res.headers["etag"]
+    assert etag == f'"{hashlib.sha256(pdf).hexdigest()}"'
+    assert res.headers["accept-ranges"] == "bytes"
+    assert 'filename="fleet.pdf"' in res.headers["content-disposition"]
+    from app.services.artifact_downloads import _content_disposition
+
+    assert _content_disposition('spec "v2".pdf') == "attachment; filename=\"spec _v2_.pdf\"; filename*=utf-8''spec%20%22v2%22.pdf"
+
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+    # A resumed download fetches only the missing bytes.
+    res = client.get(url, headers={**headers, "Range": "bytes=100-"})
+    assert res.status_code == 206 and res.content == pdf[100:]
+    assert res.headers["content-range"] == f"bytes 100-{len(pdf) - 1}/{len(pdf)}"
+    res = client.get(url, headers={**headers, "Range": "bytes=-16"})
+    assert res.status_code == 206 and res.content == pdf[-16:]
+    res = client.get(url, headers={**headers, "Range": "bytes=0-9", "If-Range": etag})
+    assert res.status_code == 206 and res.content == pdf[:10]
+    # The file changed since the client's copy (different validator): it gets the whole file again.
+    res = client.get(url, headers={**headers, "Range": "bytes=0-9", "If-Range": '"other"'})
+    assert res.status_code == 200 and res.content == pdf
+    assert client.get(url, headers={**headers, "Range": f"bytes={len(pdf)}-"}).status_code == 416
+
+    other, _ = _auth_headers_and_token(client, "download-other@example.com")
+    assert client.get(url, headers=other).status_code == 403
+    assert client.get(f"/projects/{project_id}/artifacts/missing/download", headers=headers).status_code == 404
+
+
+def test_run_files_download_with_content_hash_etags(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "run-files@example.com")
+    project_id = client.post("/projects", json={"product_request": "Tenant maintenance portal"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(200):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+
+    res = client.get(f"/runs/{run_id}/files/research.md", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/markdown")
+    assert res.headers["etag"] == f'"{hashlib.sha256(res.content).hexdigest()}"'
+    assert b"Tenant maintenance portal" in res.content
+    res = client.get(f"/runs/{run_id}/files/research.md", headers={**headers, "Range": "bytes=0-1"})
+    assert res.status_code == 206 and len(res.content) == 2
+
+    # Research runs have no graph; only known file names are served.
+    assert client.get(f"/runs/{run_id}/files/epic_dependency_graph.mmd", headers=headers).status_code == 404
+    assert client.get(f"/runs/{run_id}/files/..%2Fsecret", headers=headers).status_code == 404
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str, password: str = "password123") -> tuple[dict[str, str], str]:
+    if email != "admin@example.com":
+        res = client.post("/auth/signup", json={"email": email, "password": password})
+        assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": password})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _pdf_bytes(title: str) -> bytes:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_metadata({"/Title": title})
+    buf = BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _ref_count(sha256: str) -> int | None:
+    from app.db import session as db_session
+    from app.db.models import Blob
+
+    db = db_session.SessionLocal()
+    try:
+        blob = db.get(Blob, sha256)
+        return None if blob is None else blob.ref_count
+    finally:
+        db.close()
+
+
+def test_identical_uploads_share_one_blob_until_garbage_collected(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import projects as projects_router
+    from app.services import storage
+
+    pdf = _pdf_bytes("Shared requirements")
+    owners = []
+    written: list[bool] = []
+    store_blob = projects_router.store_blob
+
+    async def _recording(db, staged):
+        path, wrote = await store_blob(db, staged)
+        written.append(wrote)
+        return path, wrote
+
+    monkeypatch.setattr(projects_router, "store_blob", _recording)
+    for email in ("blob-a@example.com", "blob-b@example.com"):
+        headers, _ = _auth_headers_and_token(client, email)
+        project_id = client.post("/projects", json={"product_request": "Clinic scheduling"}, headers=headers).json()["id"]
+        res = client.post(f"/projects/{project_id}/documents", files={"file": ("req.pdf", pdf, "application/pdf")}, headers=headers)
+        assert res.status_code == 201, res.text
+        [artifact] = client.get(f"/projects/{project_id}", headers=headers).json()["artifacts"]
+        owners.append(artifact["path"])
+        # Once stored, the same bytes are not parsed again.
+        monkeypatch.setattr(projects_router, "validate_pdf", lambda path: pytest.fail("stored bytes validated again"))
+
+    sha256 = res.json()["sha256"]
+    path = storage.get_storage().local_path(owners[0])
+    assert owners == [storage.blob_key(sha256)] * 2
+    assert written == [True, False]
+    assert _ref_count(sha256) == 2
+
+    admin_headers, _ = _auth_headers_and_token(client, "admin@example.com", "adminpass")
+    users = {u["email"]: u["id"] for u in client.get("/admin/users", headers=admin_headers).json()}
+    assert client.delete(f"/admin/users/{users['blob-a@example.com']}", headers=admin_headers).status_code == 200
+    assert _ref_count(sha256) == 1
+
+    monkeypatch.setattr(storage.get_settings(), "blob_gc_grace_seconds", 0.0)
+    assert client.post("/admin/storage/gc", headers=admin_headers).json()["blobs_deleted"] == 0
+    assert path.exists()
+
+    assert client.delete(f"/admin/users/{users['blob-b@example.com']}", headers=admin_headers).status_code == 200
+    assert _ref_count(sha256) == 0
+    # Derived files (extracted text) go with the blob.
+    sidecar = path.with_name(f"{sha256}.pages.jsonl.gz")
+    sidecar.write_bytes(b"")
+    res = client.post("/admin/storage/gc", headers=admin_headers)
+    assert res.json() == {"blobs_deleted": 1, "bytes_freed": len(pdf)}
+    assert not path.exists() and not sidecar.exists()
+    assert _ref_count(sha256) is None
+
+    user_headers, _ = _auth_headers_and_token(client, "blob-c@example.com")
+    assert client.post("/admin/storage/gc", headers=user_headers).status_code == 403
+
+
+def test_concurrent_first_uploads_of_the_same_bytes_both_succeed(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    import asyncio
+    import hashlib
+    import uuid
+
+    from app.db import session as db_session
+    from app.db.models import Blob
+    from app.services import storage
+
+    data = _pdf_bytes("Raced upload")
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    def _staged() -> storage.StagedUpload:
+        path = storage._staging_dir() / f".{uuid.uuid4()}.part"
+        path.write_bytes(data)
+        return storage.StagedUpload(path=path, size_bytes=len(data), sha256=sha256)
+
+    db = db_session.SessionLocal()
+    other = db_session.SessionLocal()
+    try:
+        get = db.get
+        looked: list[str] = []
+
+        def _missed_once(model, key):
+            # The other upload inserts the row after this one looked for it and found nothing.
+            looked.append(key)
+            return None if len(looked) == 1 else get(model, key)
+
+        monkeypatch.setattr(db, "get", _missed_once)
+        other.add(Blob(sha256=sha256, size_bytes=len(data), ref_count=0))
+        other.commit()
+
+        staged = _staged()
+        assert asyncio.run(storage.store_blob(db, staged)) == (storage.blob_key(sha256), True)
+        assert not staged.path.exists()
+        assert db.query(Blob).filter(Blob.sha256 == sha256).count() == 1
+
+        async def _unavailable(key: str) -> bool:
+            raise OSError("storage unavailable")
+
+        # A failed write still removes the staged file.
+        monkeypatch.setattr(storage.get_storage(), "aexists", _unavailable)
+        staged = _staged()
+        with pytest.raises(OSError):
+            asyncio.run(storage.store_blob(db, staged))
+        assert not staged.path.exists()
+    finally:
+        db.close()
+        other.close()
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers(client: TestClient, email: str) -> dict[str, str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def _generate_epics(client: TestClient, headers: dict[str, str], *, count: int) -> dict:
+    res = client.post("/projects", json={"product_request": "Build a planner"}, headers=headers)
+    assert res.status_code == 201, res.text
+    project_id = res.json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    else:
+        assert False, "Research appendix not created in time"
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": count}, headers=headers)
+    assert res.status_code == 201, res.text
+    return res.json()
+
+
+def test_regenerate_requires_a_changed_epic(client: TestClient) -> None:
+    headers = _auth_headers(client, "regen-none@example.com")
+    batch = _generate_epics(client, headers, count=3)
+
+    res = client.post(f"/projects/{batch['project_id']}/epics/{batch['batch_id']}/regenerate", json={}, headers=headers)
+    assert res.status_code == 400, res.text
+
+
+def test_regenerate_sends_only_changed_epics_and_keeps_the_rest(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    headers = _auth_headers(client, "regen@example.com")
+    batch = _generate_epics(client, headers, count=4)
+    epics = batch["epics"]
+
+    res = client.patch(f"/projects/epics/{epics[0]['id']}", json={"status": "approved"}, headers=headers)
+    assert res.status_code == 200, res.text
+    res = client.patch(
+        f"/projects/epics/{epics[2]['id']}",
+        json={"status": "changes_requested", "feedback": "Split search from filtering"},
+        headers=headers,
+    )
+    assert res.status_code == 200, res.text
+
+    from app.services import epic_generation
+
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+    prompts: list[dict] = []
+
+    def _fake_stream(*, system: str, user: str, temperature: float = 0.2):
+        prompts.append(json.loads(user))
+        yield json.dumps({"epics": [{"title": "Search", "goal": "Search only", "priority": "P1"}]})
+
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _fake_stream)
+
+    res = client.post(f"/projects/{batch['project_id']}/epics/{batch['batch_id']}/regenerate", json={}, headers=headers)
+    assert res.status_code == 201, res.text
+    body = res.json()
+
+    assert len(prompts) == 1
+    assert [r["feedback"] for r in prompts[0]["revise"]] == ["Split search from filtering"]
+    assert [k["title"] for k in prompts[0]["keep"]] == [epics[i]["title"] for i in (0, 1, 3)]
+
+    assert body["batch_id"] != batch["batch_id"]
+    by_id = {e["id"]: e for e in body["epics"]}
+    # Unchanged epics move into the new batch with their ids and review state intact.
+    assert {epics[i]["id"] for i in (0, 1, 3)} <= set(by_id)
+    assert by_id[epics[0]["id"]]["status"] == "approved"
+    assert epics[2]["id"] not in by_id
+    revised = [e for e in body["epics"] if e["id"] not in {x["id"] for x in epics}]
+    assert [(e["title"], e["status"]) for e in revised] == [("Search", "proposed")]
+
+
+def test_failed_regeneration_leaves_the_source_batch_untouched(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import epic_regeneration
+
+    headers = _auth_headers(client, "regen-fail@example.com")
+    batch = _generate_epics(client, headers, count=3)
+    epics = batch["epics"]
+    res = client.patch(f"/projects/epics/{epics[1]['id']}", json={"status": "rejected"}, headers=headers)
+    assert res.status_code == 200, res.text
+
+    def _broken_graph(_epics):
+        raise RuntimeError("graph failed")
+
+    monkeypatch.setattr(epic_regeneration, "make_mermaid_dependency_graph", _broken_graph)
+    with pytest.raises(RuntimeError, match="graph failed"):
+        client.post(f"/projects/{batch['project_id']}/epics/{batch['batch_id']}/regenerate", json={}, headers=headers)
+
+    from app.db import session as db_session
+    from app.db.models import Epic, EpicBatch
+
+    db = db_session.SessionLocal()
+    try:
+        assert db.query(EpicBatch).filter(EpicBatch.project_id == batch["project_id"]).count() == 1
+        assert {r.id for r in db.query(Epic).filter(Epic.batch_id == batch["batch_id"])} == {e["id"] for e in epics}
+    finally:
+        db.close()
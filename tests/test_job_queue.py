@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _events(client: TestClient, headers: dict[str, str], run_id: str, until: str) -> dict[str, dict | None]:
+    for _ in range(200):
+        events = client.get(f"/runs/{run_id}/events", headers=headers).json()
+        by_type = {e["event_type"]: json.loads(e["payload_json"] or "null") for e in events}
+        if until in by_type:
+            return by_type
+        time.sleep(0.01)
+    raise AssertionError(f"{until} not emitted in time")
+
+
+def _stop_embedded_worker() -> None:
+    # Lets a test drive workers by hand instead of racing the API's embedded one.
+    from app.main import app
+
+    app.state.job_worker.stop()
+
+
+def test_failed_research_is_retried_then_marked_failed(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+    from app.services import job_queue
+
+    monkeypatch.setattr(job_queue.get_settings(), "job_retry_backoff_seconds", 0.0)
+    fake = runs_router.search_tavily_queries
+    calls: list[int] = []
+
+    def _flaky(**kw):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("search backend unavailable")
+        return fake(**kw)
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _flaky)
+    headers, _ = _auth_headers_and_token(client, "jobs@example.com")
+    project_id = client.post("/projects", json={"product_request": "Tool library"}, headers=headers).json()["id"]
+
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    events = _events(client, headers, run_id, "research.completed")
+    assert events["job.retrying"]["attempt"] == 1
+    assert "search backend unavailable" in events["job.retrying"]["error"]
+    assert len(calls) == 2
+
+    def _down(**kw):
+        raise RuntimeError("still down")
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _down)
+    monkeypatch.setattr(job_queue.get_settings(), "job_max_attempts", 2)
+    # A new request, so the first run's cached searches don't apply.
+    project_id = client.post("/projects", json={"product_request": "Seed swap app"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    events = _events(client, headers, run_id, "job.failed")
+    assert events["job.failed"]["attempts"] == 2
+    assert "research.completed" not in events
+
+    from app.db import session as db_session
+    from app.db.models import Run, RunStatus
+
+    db = db_session.SessionLocal()
+    try:
+        assert db.get(Run, run_id).status == RunStatus.failed
+    finally:
+        db.close()
+
+
+def test_retry_after_the_appendix_was_saved_finishes_without_searching_again(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+    from app.services import job_queue
+
+    monkeypatch.setattr(job_queue.get_settings(), "job_retry_backoff_seconds", 0.0)
+    fake = runs_router.search_tavily_queries
+    searched: list[int] = []
+    monkeypatch.setattr(runs_router, "search_tavily_queries", lambda **kw: searched.append(1) or fake(**kw))
+    finish = runs_router._finish_research
+    finishes: list[int] = []
+
+    def _fails_once(db, **kw):
+        finishes.append(1)
+        if len(finishes) == 1:
+            raise RuntimeError("lost the connection")
+        finish(db, **kw)
+
+    monkeypatch.setattr(runs_router, "_finish_research", _fails_once)
+    headers, _ = _auth_headers_and_token(client, "jobs-resume@example.com")
+    project_id = client.post("/projects", json={"product_request": "Bike repair booking"}, headers=headers).json()["id"]
+
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    events = _events(client, headers, run_id, "research.completed")
+    assert "lost the connection" in events["job.retrying"]["error"]
+    assert events["research.completed"]["resumed"] is True
+    assert len(searched) == 1
+    assert "job.failed" not in events
+    assert client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200
+
+    from app.db import session as db_session
+    from app.db.models import ResearchAppendix, Run, RunStatus
+
+    db = db_session.SessionLocal()
+    try:
+        assert db.get(Run, run_id).status == RunStatus.completed
+        assert db.query(ResearchAppendix).filter(ResearchAppendix.run_id == run_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_jobs_of_dead_workers_and_orphaned_runs_are_recovered(client: TestClient) -> None:
+    from app.db import session as db_session
+    from app.db.models import Job, JobStatus, Run, RunStatus
+    from app.services.job_queue import JOB_RESEARCH, Worker, claim_job, recover_orphaned_runs
+
+    _stop_embedded_worker()
+    headers, _ = _auth_headers_and_token(client, "jobs-recovery@example.com")
+    project_id = client.post("/projects", json={"product_request": "Bike repair booking"}, headers=headers).json()["id"]
+
+    db = db_session.SessionLocal()
+    try:
+        # A worker claimed this job and then died: its lease ran out without a heartbeat.
+        crashed = Run(project_id=project_id, run_type="backlog_generation", status=RunStatus.started)
+        # Started before the job queue existed; nothing will ever run it.
+        orphan = Run(project_id=project_id, run_type="backlog_generation", status=RunStatus.started)
+        db.add_all([crashed, orphan])
+        db.flush()
+        db.add(
+            Job(
+                kind=JOB_RESEARCH,
+                run_id=crashed.id,
+                payload_json=json.dumps({"project_id": project_id, "run_id": crashed.id, "product_request": "Bike repair booking"}),
+                status=JobStatus.running,
+                attempts=1,
+                lease_owner="dead-worker",
+                lease_expires_at=datetime.utcnow() - timedelta(seconds=1),
+            )
+        )
+        db.commit()
+        crashed_id, orphan_id = crashed.id, orphan.id
+
+        assert recover_orphaned_runs(db) == 1
+        assert recover_orphaned_runs(db) == 0
+
+        worker = Worker(name="replacement")
+        assert worker.run_once() and worker.run_once()
+        assert not worker.run_once()
+
+        db.expire_all()
+        for run_id in (crashed_id, orphan_id):
+            assert db.get(Run, run_id).status == RunStatus.completed
+            job = db.query(Job).filter(Job.run_id == run_id).one()
+            assert job.status == JobStatus.succeeded and job.lease_owner is None
+        assert db.query(Job).filter(Job.run_id == crashed_id).one().attempts == 2
+        assert "run.recovered" in _events(client, headers, orphan_id, "research.completed")
+
+        # Claiming is compare-and-set: a job goes to exactly one worker.
+        db.add(Job(kind="test.noop", payload_json="{}"))
+        db.commit()
+        assert claim_job(db, worker_id="a", kinds=["test.noop"]) is not None
+        assert claim_job(db, worker_id="b", kinds=["test.noop"]) is None
+    finally:
+        db.close()
+
+
+def test_research_jobs_respect_the_global_concurrency_cap(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.db import session as db_session
+    from app.db.models import Job
+    from app.services import job_queue
+    from app.services.job_queue import JOB_RESEARCH, claim_job, complete_job
+
+    _stop_embedded_worker()
+    monkeypatch.setattr(job_queue.get_settings(), "research_job_concurrency", 2)
+    db = db_session.SessionLocal()
+    try:
+        db.add_all([Job(kind=JOB_RESEARCH, payload_json="{}") for _ in range(3)] + [Job(kind="test.noop", payload_json="{}")])
+        db.commit()
+        first = claim_job(db, worker_id="a", kinds=[JOB_RESEARCH])
+        assert claim_job(db, worker_id="b", kinds=[JOB_RESEARCH]) is not None
+        # Two research jobs are running: the third waits, other kinds are still claimed.
+        assert claim_job(db, worker_id="c", kinds=[JOB_RESEARCH]) is None
+        assert claim_job(db, worker_id="c").kind == "test.noop"
+
+        complete_job(db, job=first, worker_id="a")
+        assert claim_job(db, worker_id="c", kinds=[JOB_RESEARCH]) is not None
+    finally:
+        db.close()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import llm_deadline
+from app.services.llm_deadline import DeferredUpgrade, call_with_deadline
+
+
+@pytest.fixture()
+def deadline_settings(monkeypatch: pytest.MonkeyPatch):
+    settings = llm_deadline.get_settings()
+    monkeypatch.setattr(settings, "llm_deadline_seconds", 0.2)
+    monkeypatch.setattr(settings, "llm_hedge_enabled", False)
+    return settings
+
+
+def test_deadline_returns_fallback_then_delivers_late_result(deadline_settings) -> None:
+    items: list[str] = []
+    late: list[str] = []
+    delivered = threading.Event()
+
+    def _slow(on_item, on_reset):
+        on_item("early")
+        time.sleep(0.4)
+        on_item("too late")
+        return "llm"
+
+    def _late(result: str) -> None:
+        late.append(result)
+        delivered.set()
+
+    started = time.monotonic()
+    result = call_with_deadline("test-deadline", _slow, fallback=lambda: "heuristic", on_item=items.append, on_late_result=_late)
+    assert result == "heuristic"
+    assert time.monotonic() - started < 0.35
+
+    assert delivered.wait(2)
+    assert late == ["llm"]
+    # Items streamed after the deadline are dropped; the fallback owns the output from then on.
+    assert items == ["early"]
+
+
+def test_hedged_request_wins_when_primary_stalls(deadline_settings, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(deadline_settings, "llm_deadline_seconds", 5.0)
+    monkeypatch.setattr(deadline_settings, "llm_hedge_enabled", True)
+    monkeypatch.setattr(deadline_settings, "llm_hedge_after_seconds", 0.05)
+    calls: list[bool] = []
+
+    def _attempt(on_item, on_reset):
+        primary = on_item is not None
+        calls.append(primary)
+        if primary:
+            time.sleep(1.0)
+            return "primary"
+        return "hedge"
+
+    started = time.monotonic()
+    assert call_with_deadline("test-hedge", _attempt, fallback=lambda: "heuristic", on_item=lambda _: None) == "hedge"
+    assert time.monotonic() - started < 0.5
+    assert calls == [True, False]
+
+
+def test_items_streamed_before_a_fallback_or_hedge_win_are_reset(deadline_settings, monkeypatch: pytest.MonkeyPatch) -> None:
+    items: list[str] = []
+
+    def _stalls_after_one(on_item, on_reset):
+        if on_item is None:
+            return ["hedge 1", "hedge 2"]
+        on_item("llm 1")
+        time.sleep(1.0)
+        return ["llm 1", "llm 2"]
+
+    def _fallback() -> list[str]:
+        items.extend(["heuristic 1", "heuristic 2"])
+        return ["heuristic 1", "heuristic 2"]
+
+    kw = dict(fallback=_fallback, on_item=items.append, on_reset=lambda: items.append("<reset>"), replay=items.extend)
+    assert call_with_deadline("test-reset-fallback", _stalls_after_one, **kw) == ["heuristic 1", "heuristic 2"]
+    assert items == ["llm 1", "<reset>", "heuristic 1", "heuristic 2"]
+
+    items.clear()
+    monkeypatch.setattr(deadline_settings, "llm_deadline_seconds", 5.0)
+    monkeypatch.setattr(deadline_settings, "llm_hedge_enabled", True)
+    monkeypatch.setattr(deadline_settings, "llm_hedge_after_seconds", 0.05)
+    assert call_with_deadline("test-reset-hedge", _stalls_after_one, **kw) == ["hedge 1", "hedge 2"]
+    assert items == ["llm 1", "<reset>", "hedge 1", "hedge 2"]
+
+
+def test_deferred_upgrade_runs_once_both_sides_arrive() -> None:
+    applied: list[str] = []
+    early = DeferredUpgrade()
+    early.deliver("result")
+    early.bind(applied.append)
+
+    late = DeferredUpgrade()
+    late.bind(applied.append)
+    assert applied == ["result"]
+    late.deliver("later")
+    assert applied == ["result", "later"]
+
+
+def test_epics_fall_back_on_deadline_and_upgrade_in_place(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, deadline_settings
+) -> None:
+    from app.services import epic_generation
+
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+    completion = json.dumps({"epics": [{"title": f"LLM Epic {i}", "goal": "g", "priority": "P0"} for i in range(2)]})
+
+    def _slow_stream(*, system: str, user: str, temperature: float = 0.2):
+        time.sleep(0.5)
+        yield completion
+
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _slow_stream)
+
+    res = client.post("/auth/signup", json={"email": "deadline@example.com", "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": "deadline@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    res = client.post("/projects", json={"product_request": "Build a planner"}, headers=headers)
+    project_id = res.json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 2}, headers=headers)
+    assert res.status_code == 201, res.text
+    body = res.json()
+    fallback_ids = [e["id"] for e in body["epics"]]
+    assert not any(e["title"].startswith("LLM Epic") for e in body["epics"])
+
+    for _ in range(100):
+        events = client.get(f"/runs/{body['run_id']}/events", headers=headers).json()
+        if any(e["event_type"] == "epics.upgraded" for e in events):
+            break
+        time.sleep(0.02)
+    else:
+        assert False, "Late LLM result was not applied"
+
+    latest = client.get(f"/projects/{project_id}/epics", headers=headers).json()
+    assert [e["title"] for e in latest["epics"]] == ["LLM Epic 0", "LLM Epic 1"]
+    assert [e["id"] for e in latest["epics"]] == fallback_ids
+
+
+def test_partials_after_a_reset_match_the_persisted_epics(client: TestClient, monkeypatch: pytest.MonkeyPatch, deadline_settings) -> None:
+    from app.services import epic_generation
+
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+
+    def _stalling_stream(*, system: str, user: str, temperature: float = 0.2):
+        yield '{"epics": [' + json.dumps({"title": "LLM Epic 0", "goal": "g", "priority": "P0"}) + ","
+        time.sleep(0.5)
+        yield json.dumps({"title": "LLM Epic 1", "goal": "g", "priority": "P1"}) + "]}"
+
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _stalling_stream)
+
+    res = client.post("/auth/signup", json={"email": "deadline-reset@example.com", "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": "deadline-reset@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    project_id = client.post("/projects", json={"product_request": "Build a planner"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 3}, headers=headers)
+    assert res.status_code == 201, res.text
+    body = res.json()
+    events = client.get(f"/runs/{body['run_id']}/events", headers=headers).json()
+    types = [e["event_type"] for e in events]
+    assert types.count("epics.partial_reset") == 1
+    after_reset = [json.loads(e["payload_json"]) for e in events[types.index("epics.partial_reset") + 1 :] if e["event_type"] == "epics.partial"]
+    assert [p["index"] for p in after_reset] == list(range(len(body["epics"])))
+    assert [p["epic"]["title"] for p in after_reset] == [e["title"] for e in body["epics"]]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.services import llm as llm_module
+from app.services import llm_scheduler as scheduler_module
+from app.services.llm_scheduler import LANE_BULK, LANE_INTERACTIVE, LLMRequestContext, LLMScheduler
+
+
+@pytest.fixture()
+def unlimited(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = scheduler_module.get_settings()
+    monkeypatch.setattr(settings, "llm_requests_per_minute", 0)
+    monkeypatch.setattr(settings, "llm_tokens_per_minute", 0)
+
+
+def _admit_in_order(scheduler: LLMScheduler, contexts: list[LLMRequestContext]) -> list[int]:
+    order: list[int] = []
+    lock = threading.Lock()
+
+    def _worker(i: int, ctx: LLMRequestContext) -> None:
+        scheduler.acquire(tokens=10, context=ctx)
+        with lock:
+            order.append(i)
+
+    # Hold admissions while everything queues up, as after a provider 429.
+    scheduler.pause(0.3)
+    threads = []
+    for i, ctx in enumerate(contexts):
+        t = threading.Thread(target=_worker, args=(i, ctx))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)
+    for t in threads:
+        t.join(timeout=5)
+    return order
+
+
+def test_interactive_lane_is_admitted_before_bulk(unlimited: None) -> None:
+    order = _admit_in_order(
+        LLMScheduler(),
+        [
+            LLMRequestContext(lane=LANE_BULK, user_id="a"),
+            LLMRequestContext(lane=LANE_BULK, user_id="a"),
+            LLMRequestContext(lane=LANE_INTERACTIVE, user_id="b"),
+        ],
+    )
+    assert order == [2, 0, 1]
+
+
+def test_users_take_turns_within_a_lane(unlimited: None) -> None:
+    order = _admit_in_order(
+        LLMScheduler(),
+        [
+            LLMRequestContext(lane=LANE_BULK, user_id="a"),
+            LLMRequestContext(lane=LANE_BULK, user_id="a"),
+            LLMRequestContext(lane=LANE_BULK, user_id="a"),
+            LLMRequestContext(lane=LANE_BULK, user_id="b"),
+        ],
+    )
+    assert order == [0, 3, 1, 2]
+
+
+def test_requests_per_minute_bucket_delays_admission(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = scheduler_module.get_settings()
+    monkeypatch.setattr(settings, "llm_requests_per_minute", 600)  # one every 0.1s once the burst is spent
+    monkeypatch.setattr(settings, "llm_tokens_per_minute", 0)
+    scheduler = LLMScheduler()
+
+    waits = [scheduler.acquire(tokens=1).wait_seconds for _ in range(601)]
+    assert max(waits[:600]) < 0.05
+    assert waits[600] >= 0.05
+
+
+def test_stream_retries_after_rate_limit(monkeypatch: pytest.MonkeyPatch, unlimited: None) -> None:
+    import openai
+
+    calls: list[float] = []
+
+    def _create(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            response = httpx.Response(429, headers={"retry-after-ms": "150"}, request=request)
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        delta = lambda text: SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        return iter([delta('{"a"'), delta(": 1}")])
+
+    class _FakeOpenAI:
+        def __init__(self, **kwargs) -> None:
+            assert kwargs.get("max_retries") == 0
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=_create))
+
+    monkeypatch.setattr(openai, "OpenAI", _FakeOpenAI)
+    monkeypatch.setattr(scheduler_module, "llm_scheduler", LLMScheduler())
+    monkeypatch.setattr(llm_module, "llm_scheduler", scheduler_module.llm_scheduler)
+
+    out = "".join(llm_module.stream_chat_json(system="s", user="u"))
+    assert out == '{"a": 1}'
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.15
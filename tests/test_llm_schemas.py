@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.services.json_stream import JsonStreamScanner, repair_truncated_json
+from app.services.llm_schemas import EPIC_ADAPTER, SPEC_ADAPTER, validate_or_none
+
+
+def test_epic_schema_coerces_and_rejects() -> None:
+    epic = validate_or_none(
+        EPIC_ADAPTER,
+        {"title": "  Search  ", "goal": 42, "dependencies": "Auth", "risks": {"level": "high"}, "extra": "ignored"},
+    )
+    assert epic is not None
+    assert epic.title == "Search"
+    assert epic.goal == "42"
+    assert epic.dependencies == ["Auth"]
+    assert json.loads(epic.risks) == {"level": "high"}
+    assert epic.priority == "P1"
+
+    assert validate_or_none(EPIC_ADAPTER, {"goal": "no title"}) is None
+    assert validate_or_none(EPIC_ADAPTER, "not an object") is None
+
+
+def test_spec_schema_fills_every_section() -> None:
+    spec = SPEC_ADAPTER.validate_python({"overview": "O", "test_plan": "one test", "observability": ["logs", "metrics"]}).model_dump()
+    assert spec["overview"] == "O"
+    assert spec["test_plan"] == ["one test"]
+    assert spec["observability"] == "logs\nmetrics"
+    assert spec["api_contracts"] == [] and spec["mermaid_er"] == ""
+    assert validate_or_none(SPEC_ADAPTER, {"foo": 1}) is None
+    assert validate_or_none(SPEC_ADAPTER, {"overview": "  ", "goals": "G"}) is None
+
+
+def test_repair_truncated_json_backs_off_to_last_complete_value() -> None:
+    assert repair_truncated_json('{"epics": [{"title": "A"}, {"title": "B", "goal": "cut of') == {
+        "epics": [{"title": "A"}, {"title": "B", "goal": "cut of"}]
+    }
+    assert repair_truncated_json('{"epics": [{"title": "A"}, {"title": "B", "pri') == {"epics": [{"title": "A"}, {"title": "B"}]}
+    assert repair_truncated_json('{"a": [1, 2], "b": tr') == {"a": [1, 2]}
+    assert repair_truncated_json("no json here") is None
+
+    scanner = JsonStreamScanner(mode="items", array_key="epics")
+    seen = scanner.feed('{"epics": [{"title": "A"}, {"title": "B", "goal": "cut')
+    assert [e["title"] for e in seen] == ["A"]
+    assert not scanner.complete
+    assert scanner.salvage_items(len(seen)) == [{"title": "B", "goal": "cut"}]
+
+
+def test_truncated_epic_stream_is_salvaged_not_replaced(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import epic_generation
+
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+    monkeypatch.setattr(epic_generation.get_settings(), "llm_deadline_seconds", 0.0)
+
+    def _truncated_stream(*, system: str, user: str, temperature: float = 0.2):
+        yield '{"epics": [{"title": "Search", "priority": "P0"}, {"goal": "missing title"}, '
+        yield '{"title": "Filters", "goal": "Narrow results by da'
+
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _truncated_stream)
+
+    streamed: list[str] = []
+    epics = epic_generation.generate_epics(
+        product_request="Campus events",
+        research_summary="",
+        citations=[],
+        constraints="",
+        count=3,
+        on_epic=lambda e: streamed.append(e.title),
+    )
+    # The invalid item is dropped, the cut-off epic is kept, and only the remainder is padded heuristically.
+    assert [e.title for e in epics[:2]] == ["Search", "Filters"]
+    assert epics[1].goal == "Narrow results by da"
+    assert len(epics) == 3
+    assert streamed == [e.title for e in epics]
+
+
+def test_unusable_spec_output_is_replaced_after_a_reset(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import spec_generation
+
+    monkeypatch.setattr(spec_generation.get_settings(), "openai_api_key", "test-openai-key")
+    monkeypatch.setattr(spec_generation.get_settings(), "llm_deadline_seconds", 0.0)
+    monkeypatch.setattr(spec_generation.get_settings(), "llm_hedge_enabled", False)
+
+    def _junk_stream(*, system: str, user: str, temperature: float = 0.2):
+        yield '{"foo": 1, "notes": "not a spec"}'
+
+    monkeypatch.setattr(spec_generation, "stream_chat_json", _junk_stream)
+
+    events: list[str] = []
+    spec = spec_generation.generate_spec_for_story(
+        product_request="Campus events",
+        story_statement="As a student I can RSVP",
+        acceptance_criteria=["RSVP is saved"],
+        constraints="",
+        feedback="",
+        on_section=lambda key, value: events.append(key),
+        on_reset=lambda: events.append("<reset>"),
+    )
+    assert spec["overview"]
+    # The junk members streamed first are discarded before the heuristic sections follow.
+    assert events[: events.index("<reset>") + 1] == ["foo", "notes", "<reset>"]
+    assert events[events.index("<reset>") + 1 :] == list(spec)
@@ -70,12 +70,16 @@ def test_milestone5_spec_generation_requires_explicit_approval_over_ws(client: T
 
         # Server emits multiple messages; wait until we get spec summary.
         summary = None
-        for _ in range(20):
+        seen: list[str] = []
+        for _ in range(60):
             msg = ws.receive_json()
+            seen.append(msg.get("type") or msg.get("event_type"))
             if msg.get("type") == "specs.summary":
                 summary = msg
                 break
         assert summary is not None
+        # The socket that started the run streams its sections as they are generated.
+        assert "specs.partial" in seen
         assert summary["story_id"] == story_id
         assert "sequenceDiagram" in (summary.get("mermaid_sequence") or "")
         assert "erDiagram" in (summary.get("mermaid_er") or "")
@@ -83,5 +87,7 @@ def test_milestone5_spec_generation_requires_explicit_approval_over_ws(client: T
         spec_id = summary["spec_id"]
         ws.send_json({"type": "specs.approve", "spec_id": spec_id})
         approved = ws.receive_json()
+        while approved.get("type") != "specs.approved":  # trailing run events
+            approved = ws.receive_json()
         assert approved["type"] == "specs.approved"
         assert approved["spec_id"] == spec_id
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _pdf_bytes() -> bytes:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_blank_page(width=612, height=792)
+    buf = BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _pdf_with_text(text: str) -> bytes:
+    # One page, one Helvetica text run: enough for pypdf's text extraction.
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def test_pdfs_are_parsed_in_isolated_processes(client: TestClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import pdf_processing
+
+    good = tmp_path / "good.pdf"
+    good.write_bytes(_pdf_bytes())
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"%PDF-1.4\nnotreally")
+
+    assert pdf_processing.count_pdf_pages(good) == 2
+    with pytest.raises(pdf_processing.PdfRejected) as rejected:
+        pdf_processing.count_pdf_pages(bad)
+    assert rejected.value.reason == "invalid"
+
+    large = tmp_path / "large.pdf"
+    large.write_bytes(_pdf_with_text("word " * 100_000))
+    assert len(pdf_processing.extract_pdf_text(large)) == 500_000
+
+    # Past the address-space cap the parse fails (MemoryError, or the child dies) instead of growing the API.
+    monkeypatch.setattr(pdf_processing.get_settings(), "pdf_memory_limit_mb", 1)
+    with pytest.raises(pdf_processing.PdfRejected) as rejected:
+        pdf_processing.extract_pdf_text(large)
+    assert rejected.value.reason in ("memory", "crashed")
+    assert mp.active_children() == []
+
+
+def test_slow_pdf_is_killed_at_the_deadline(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import pdf_processing
+
+    client.post("/auth/signup", json={"email": "pdf-timeout@example.com", "password": "password123"})
+    r = client.post("/auth/login", data={"username": "pdf-timeout@example.com", "password": "password123"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    project_id = client.post("/projects", json={"product_request": "X"}, headers=headers).json()["id"]
+
+    # No parse can finish in 0.1ms, so this exercises the kill path without crafting a pathological PDF.
+    monkeypatch.setattr(pdf_processing.get_settings(), "pdf_timeout_seconds", 0.0001)
+    files = {"file": ("slow.pdf", _pdf_bytes(), "application/pdf")}
+    r = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
+    assert r.status_code == 400
+    assert "in time" in r.json()["detail"]
+    assert mp.active_children() == []
+
+    monkeypatch.setattr(pdf_processing.get_settings(), "pdf_timeout_seconds", 10.0)
+    r = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
+    assert r.status_code == 201, r.text
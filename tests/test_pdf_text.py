@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _pdf_with_pages(texts: list[str]) -> bytes:
+    # One Helvetica text run per page, so each page's extracted text is known exactly.
+    n = len(texts)
+    font = 3 + 2 * n
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % (3 + 2 * i) for i in range(n)), n),
+    ]
+    for i, text in enumerate(texts):
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (font, 4 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def test_uploaded_pdf_text_is_extracted_per_page_and_cached_by_content(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import pdf_processing, pdf_text
+
+    monkeypatch.setattr(pdf_text.get_settings(), "pdf_pages_per_task", 2)
+    batches: list[tuple[int, int]] = []
+    extract = pdf_text.extract_pdf_pages
+
+    def _counting(path: Path, start: int, stop: int) -> list[str]:
+        batches.append((start, stop))
+        return extract(path, start, stop)
+
+    monkeypatch.setattr(pdf_text, "extract_pdf_pages", _counting)
+    headers, _ = _auth_headers_and_token(client, "pdf-text@example.com")
+    project_id = client.post("/projects", json={"product_request": "Field service app"}, headers=headers).json()["id"]
+    pages = [f"Page {i} covers topic{i}" for i in range(1, 6)]
+    files = {"file": ("manual.pdf", _pdf_with_pages(pages), "application/pdf")}
+
+    res = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
+    assert res.status_code == 201, res.text
+    assert res.json()["text_extraction"] == "queued"
+    [artifact] = client.get(f"/projects/{project_id}", headers=headers).json()["artifacts"]
+    source = artifact["path"]
+    for _ in range(300):
+        if pdf_text.has_pdf_text(source):
+            break
+        time.sleep(0.01)
+    assert pdf_text.text_key(source).endswith(f"/{res.json()['sha256']}.pages.jsonl.gz")
+
+    # Five pages in batches of two, each batch its own parser process.
+    assert sorted(batches) == [(0, 2), (2, 4), (4, 5)]
+    assert list(pdf_text.iter_pdf_pages(source)) == list(enumerate(pages, start=1))
+    chunks = list(pdf_text.iter_pdf_chunks(source, max_chars=50))
+    assert chunks == ["\n".join(pages[:2]), "\n".join(pages[2:4]), pages[4]]
+
+    # The same content uploaded again reuses the sidecar without parsing.
+    res = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
+    assert res.json()["text_extraction"] == "cached"
+    assert len(batches) == 3
+    monkeypatch.setattr(pdf_processing, "_run", lambda *a: pytest.fail("cached text must not be parsed again"))
+    assert [t for _, t in pdf_text.iter_pdf_pages(source)] == pages
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+
+def _auth_headers_and_token(client: TestClient, email: str, password: str = "password123") -> tuple[dict[str, str], str]:
+    if email != "admin@example.com":
+        res = client.post("/auth/signup", json={"email": email, "password": password})
+        assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": password})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _count_user_lookups() -> list[str]:
+    from sqlalchemy import event
+
+    from app.db import session as db_session
+
+    seen: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            seen.append(statement)
+
+    event.listen(db_session.engine, "before_cursor_execute", _record)
+    return seen
+
+
+def test_authenticated_requests_skip_the_user_lookup_while_cached(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.core import principals
+
+    headers, token = _auth_headers_and_token(client, "principal@example.com")
+    project = client.post("/projects", json={"product_request": "Allotment waiting list"}, headers=headers).json()
+    project_id = project["id"]
+    lookups = _count_user_lookups()
+    for _ in range(5):
+        assert client.get("/projects", headers=headers).status_code == 200
+    with client.websocket_connect(f"/ws/projects/{project_id}/epics?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ws.connected"
+    assert lookups == []
+
+    # A forged or expired token is still rejected: only the users lookup is cached, not token validation.
+    assert client.get("/projects", headers={"Authorization": f"Bearer {token[:-2]}xx"}).status_code == 401
+
+    monkeypatch.setattr(principals.get_settings(), "principal_cache_ttl_seconds", 0.0)
+    principals.invalidate_principal(project["owner_id"])
+    assert client.get("/projects", headers=headers).status_code == 200
+    assert client.get("/projects", headers=headers).status_code == 200
+    assert len(lookups) == 2
+
+
+def test_admin_role_changes_and_deletions_take_effect_at_once(client: TestClient) -> None:
+    admin_headers, _ = _auth_headers_and_token(client, "admin@example.com", "adminpass")
+    headers, token = _auth_headers_and_token(client, "promoted@example.com")
+    project_id = client.post("/projects", json={"product_request": "Repair cafe rota"}, headers=headers).json()["id"]
+    assert client.get("/admin/users", headers=headers).status_code == 403  # now cached as a plain user
+    user_id = {u["email"]: u["id"] for u in client.get("/admin/users", headers=admin_headers).json()}["promoted@example.com"]
+
+    # The role comes from the user row (via the cache), not from the token's claim.
+    assert client.post(f"/admin/users/{user_id}/promote", headers=admin_headers).status_code == 200
+    assert client.get("/admin/users", headers=headers).status_code == 200
+    assert client.post(f"/admin/users/{user_id}/demote", headers=admin_headers).status_code == 200
+    assert client.get("/admin/users", headers=headers).status_code == 403
+
+    assert client.delete(f"/admin/users/{user_id}", headers=admin_headers).status_code == 200
+    assert client.get("/projects", headers=headers).status_code == 401
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws/projects/{project_id}/epics?token={token}") as ws:
+            ws.receive_json()
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import time
+import zipfile
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _pdf_bytes(title: str) -> bytes:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_metadata({"/Title": title})
+    buf = BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def _setup_backlog(client: TestClient, headers: dict[str, str], token: str) -> dict[str, str]:
+    project_id = client.post("/projects", json={"product_request": "Warehouse picking planner"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(200):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 2}, headers=headers)
+    assert res.status_code == 201, res.text
+    batch_id, epic_id = res.json()["batch_id"], res.json()["epics"][0]["id"]
+    client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    res = client.post(f"/projects/{project_id}/stories/generate", json={"epic_id": epic_id, "constraints": "", "count": 2}, headers=headers)
+    assert res.status_code == 201, res.text
+    story_batch_id, story_id = res.json()["batch_id"], res.json()["stories"][0]["id"]
+    client.post(f"/projects/{project_id}/stories/{story_batch_id}/approve", json={"approve_all": True}, headers=headers)
+
+    with client.websocket_connect(f"/ws/projects/{project_id}/specs?token={token}") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "specs.generate", "story_id": story_id, "constraints": ""})
+        for _ in range(60):
+            msg = ws.receive_json()
+            if msg.get("type") == "specs.summary":
+                break
+    spec_id = msg["spec_id"]
+
+    res = client.post(f"/projects/{project_id}/documents", files={"file": ("picking/rules.pdf", _pdf_bytes("Picking rules"), "application/pdf")}, headers=headers)
+    assert res.status_code == 201, res.text
+    return {"project_id": project_id, "run_id": run_id, "epic_id": epic_id, "story_id": story_id, "spec_id": spec_id, "artifact_id": res.json()["artifact_id"]}
+
+
+def test_project_exports_as_streamed_zip_and_ndjson(client: TestClient) -> None:
+    headers, token = _auth_headers_and_token(client, "export@example.com")
+    ids = _setup_backlog(client, headers, token)
+    project_id = ids["project_id"]
+
+    res = client.get(f"/projects/{project_id}/export", headers=headers)
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"] == "application/zip"
+    assert f'filename="project-{project_id}.zip"' in res.headers["content-disposition"]
+    zf = zipfile.ZipFile(BytesIO(res.content))
+    assert zf.testzip() is None
+    names = set(zf.namelist())
+    assert {
+        "project.json",
+        f"research/{ids['run_id']}/research.md",
+        f"research/{ids['run_id']}/appendix.json",
+        f"epics/{ids['epic_id']}.json",
+        f"stories/{ids['story_id']}.json",
+        f"specs/{ids['spec_id']}.json",
+        f"specs/{ids['spec_id']}.md",
+        f"specs/{ids['spec_id']}.sequence.mmd",
+        f"uploads/{ids['artifact_id']}/rules.pdf",
+    } <= names
+    assert any(n.startswith("graphs/") and n.endswith("/epic_dependency_graph.mmd") for n in names)
+    assert json.loads(zf.read("project.json"))["product_request"] == "Warehouse picking planner"
+    assert b"Warehouse picking planner" in zf.read(f"research/{ids['run_id']}/research.md")
+    assert zf.read(f"uploads/{ids['artifact_id']}/rules.pdf") == _pdf_bytes("Picking rules")
+    assert "```mermaid" in zf.read(f"specs/{ids['spec_id']}.md").decode()
+    assert isinstance(json.loads(zf.read(f"stories/{ids['story_id']}.json"))["acceptance_criteria"], list)
+
+    res = client.get(f"/projects/{project_id}/export?format=ndjson", headers=headers)
+    assert res.status_code == 200 and res.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in res.text.splitlines()]
+    assert records[0]["type"] == "project"
+    by_type = {r["type"] for r in records}
+    assert {"project", "research", "epic_batch", "epic", "story", "spec", "artifact"} <= by_type
+    [artifact] = [r for r in records if r["type"] == "artifact"]
+    assert artifact["sha256"] and artifact["original_filename"] == "picking/rules.pdf"
+
+    assert client.get(f"/projects/{project_id}/export?format=tar", headers=headers).status_code == 400
+    other, _ = _auth_headers_and_token(client, "export-other@example.com")
+    assert client.get(f"/projects/{project_id}/export", headers=other).status_code == 403
+
+
+def test_zip_export_sends_bytes_before_reading_the_whole_project(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import project_export
+
+    headers, _ = _auth_headers_and_token(client, "export-stream@example.com")
+    project_id = client.post("/projects", json={"product_request": "Streaming export"}, headers=headers).json()["id"]
+    seen: list[str] = []
+    rows = project_export._project_rows
+
+    def _recording(db, pid):
+        for kind, obj in rows(db, pid):
+            seen.append(kind)
+            yield kind, obj
+
+    monkeypatch.setattr(project_export, "_project_rows", _recording)
+    chunks = project_export.iter_project_zip(project_id)
+    first = next(chunks)
+    assert first.startswith(b"PK\x03\x04") and seen == ["project"]
+    rest = b"".join(chunks)
+    assert zipfile.ZipFile(BytesIO(first + rest)).namelist() == ["project.json"]
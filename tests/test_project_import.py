@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def test_ndjson_import_creates_projects_in_batches_with_per_line_results(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import project_import
+
+    monkeypatch.setattr(project_import.get_settings(), "import_batch_size", 2)
+    batches: list[int] = []
+    insert_batch = project_import._insert_batch
+
+    def _recording(owner_id, batch, start_research):
+        batches.append(len(batch))
+        return insert_batch(owner_id, batch, start_research)
+
+    monkeypatch.setattr(project_import, "_insert_batch", _recording)
+    headers, _ = _auth_headers_and_token(client, "import@example.com")
+    body = "\n".join(
+        [
+            json.dumps({"product_request": "Bike repair booking"}),
+            "",
+            "{not json",
+            json.dumps({"name": "missing request"}),
+            json.dumps({"product_request": "   "}),
+            json.dumps({"product_request": "Pet sitter marketplace"}),
+            json.dumps({"product_request": "x" * (project_import.MAX_LINE_BYTES + 10)}),
+            json.dumps({"product_request": "Choir rehearsal planner"}),  # no trailing newline
+        ]
+    )
+    res = client.post("/projects/import", content=body.encode(), headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    *results, summary = [json.loads(line) for line in res.text.splitlines()]
+
+    assert [(r["line"], r["status"]) for r in results] == [
+        (1, "created"),
+        (3, "error"),
+        (4, "error"),
+        (5, "error"),
+        (6, "created"),
+        (7, "error"),
+        (8, "created"),
+    ]
+    assert "product_request" in results[2]["error"]
+    assert results[3]["error"] == "Product Request cannot be empty"
+    assert results[5]["error"].startswith("Line too long")
+    assert summary == {"summary": {"created": 3, "failed": 4, "runs_started": 0}}
+    assert sum(batches) == 3 and max(batches) <= 2
+
+    projects = client.get("/projects", headers=headers).json()
+    created = {r["project_id"] for r in results if r["status"] == "created"}
+    assert {p["id"] for p in projects} == created
+    assert {p["product_request"] for p in projects} == {"Bike repair booking", "Pet sitter marketplace", "Choir rehearsal planner"}
+
+
+def test_ndjson_import_can_start_research_for_each_project(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "import-research@example.com")
+    body = "".join(json.dumps({"product_request": f"Import research {i}"}) + "\n" for i in range(3))
+    res = client.post("/projects/import?start_research=true", content=body.encode(), headers=headers)
+    assert res.status_code == 200, res.text
+    *results, summary = [json.loads(line) for line in res.text.splitlines()]
+    assert summary["summary"]["runs_started"] == 3
+
+    for result in results:
+        for _ in range(300):
+            events = [e["event_type"] for e in client.get(f"/runs/{result['run_id']}/events", headers=headers).json()]
+            if "research.completed" in events:
+                break
+            time.sleep(0.01)
+        else:
+            raise AssertionError("research not completed in time")
+        assert events[0] == "run.started"
+        assert client.get(f"/runs/{result['run_id']}/research", headers=headers).status_code == 200
+
+    assert client.post("/projects/import", content=body.encode()).status_code == 401
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import llm as llm_module
+from app.services import prompt_budget
+from app.services.llm_scheduler import llm_request_context
+from app.services.prompt_budget import fit_prompt_fields
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def test_fit_prompt_fields_trims_the_large_inputs_to_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prompt_budget.get_settings(), "llm_prompt_budget_epics", 400)
+    fields = {
+        "constraints": "Use FastAPI.",
+        "research_summary": "Long research finding. " * 400,
+        "citations": [f"https://example.com/{i}" for i in range(200)],
+    }
+
+    fitted, report = fit_prompt_fields("epics", fields, fixed="system prompt")
+
+    assert fitted["constraints"] == "Use FastAPI."
+    assert "tokens omitted" in fitted["research_summary"]
+    assert fitted["citations"] == fields["citations"][: len(fitted["citations"])]
+    assert sorted(report["truncated"]) == ["citations", "research_summary"]
+    assert report["prompt_tokens_before"] > 400 >= report["prompt_tokens"]
+
+    small, report = fit_prompt_fields("epics", {"constraints": "short"})
+    assert small == {"constraints": "short"} and report["truncated"] == []
+
+
+def test_stream_records_usage_and_cost_on_the_run(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    import openai
+
+    headers, _ = _auth_headers_and_token(client, "usage@example.com")
+    res = client.post("/projects", json={"product_request": "Build a usage tracker"}, headers=headers)
+    project_id = res.json()["id"]
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+
+    settings = llm_module.get_settings()
+    monkeypatch.setattr(settings, "llm_requests_per_minute", 0)
+    monkeypatch.setattr(settings, "llm_tokens_per_minute", 0)
+    monkeypatch.setattr(settings, "llm_prompt_cost_per_1k", 1.0)
+    monkeypatch.setattr(settings, "llm_completion_cost_per_1k", 2.0)
+
+    def _create(**kwargs):
+        assert kwargs["stream_options"] == {"include_usage": True}
+        delta = lambda text: SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        usage = SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        return iter([delta('{"a": 1}'), usage])
+
+    class _FakeOpenAI:
+        def __init__(self, **kwargs) -> None:
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=_create))
+
+    monkeypatch.setattr(openai, "OpenAI", _FakeOpenAI)
+
+    with llm_request_context(run_id=run_id):
+        for _ in range(2):
+            assert "".join(llm_module.stream_chat_json(system="s", user="u")) == '{"a": 1}'
+
+    res = client.get(f"/runs/{run_id}/usage", headers=headers)
+    assert res.status_code == 200, res.text
+    assert res.json() == {
+        "run_id": run_id,
+        "llm_calls": 2,
+        "prompt_tokens": 240,
+        "completion_tokens": 60,
+        "cost_usd": pytest.approx(0.36),
+    }
+
+    events = client.get(f"/runs/{run_id}/events", headers=headers).json()
+    usage_events = [json.loads(e["payload_json"]) for e in events if e["event_type"] == "llm.usage"]
+    assert [u["source"] for u in usage_events] == ["provider", "provider"]
+    assert usage_events[-1]["run_totals"]["prompt_tokens"] == 240
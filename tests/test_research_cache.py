@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import session as db_session
+from app.db.models import ResearchCacheEntry, RunEvent
+from app.services import research_cache
+from app.services.research import ResearchFailure, ResearchQueriesFailed, ResearchResult, TavilyResult
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _research_completed(client: TestClient, headers: dict[str, str], product_request: str) -> dict:
+    res = client.post("/projects", json={"product_request": product_request}, headers=headers)
+    project_id = res.json()["id"]
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    run_id = res.json()["id"]
+    for _ in range(50):
+        events = client.get(f"/runs/{run_id}/events", headers=headers).json()
+        done = [e for e in events if e["event_type"] == "research.completed"]
+        if done:
+            return json.loads(done[0]["payload_json"])
+        time.sleep(0.01)
+    raise AssertionError("Research did not complete in time")
+
+
+def test_identical_requests_reuse_cached_research_across_projects(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+
+    searched: list[str] = []
+    fake = runs_router.search_tavily_queries
+
+    def _counting_search(**kwargs):
+        searched.extend(kwargs["queries"])
+        return fake(**kwargs)
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _counting_search)
+    headers, _ = _auth_headers_and_token(client, "cache@example.com")
+
+    first = _research_completed(client, headers, "Todo app")
+    second = _research_completed(client, headers, "  todo   APP ")
+
+    assert first["cache_hit"] is False and first["cached_query_count"] == 0
+    assert second["cache_hit"] is True and second["cached_query_count"] == 2
+    assert second["url_count"] == first["url_count"]
+    assert len(searched) == 2
+
+
+def test_cache_expires_and_evicts_least_recently_used(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = research_cache.get_settings()
+    monkeypatch.setattr(settings, "research_cache_ttl_seconds", 60)
+    monkeypatch.setattr(settings, "research_cache_max_entries", 2)
+    result = lambda q: ResearchResult(query=q, answer="a", results=[TavilyResult(title="t", url="https://x", content="c")])
+
+    db = db_session.SessionLocal()
+    try:
+        for q in ("one", "two"):
+            research_cache.store_searches(db, searches={q: result(q)}, search_depth="basic", max_results=8)
+        # Touch "one" so "two" becomes the least recently used entry.
+        assert set(research_cache.get_cached_searches(db, queries=["One"], search_depth="basic", max_results=8)) == {"One"}
+        research_cache.store_searches(db, searches={"three": result("three")}, search_depth="basic", max_results=8)
+        assert sorted(e.query for e in db.query(ResearchCacheEntry).all()) == ["one", "three"]
+
+        # A different depth is a different key.
+        assert research_cache.get_cached_searches(db, queries=["one"], search_depth="advanced", max_results=8) == {}
+
+        entry = db.get(ResearchCacheEntry, research_cache.research_cache_key("three", search_depth="basic", max_results=8))
+        entry.created_at = datetime.utcnow() - timedelta(seconds=120)
+        db.commit()
+        assert research_cache.get_cached_searches(db, queries=["three"], search_depth="basic", max_results=8) == {}
+        assert db.get(ResearchCacheEntry, entry.key) is None
+    finally:
+        db.close()
+
+
+def test_cached_queries_carry_the_run_when_every_uncached_query_fails(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+
+    settings = research_cache.get_settings()
+    cached_query = "Best practices, security, and common requirements for: Pet sitter marketplace"
+    cached = ResearchResult(query=cached_query, answer="cached", results=[TavilyResult(title="t", url="https://cached.example", content="c")])
+    db = db_session.SessionLocal()
+    try:
+        research_cache.store_searches(
+            db, searches={cached_query: cached}, search_depth=settings.research_search_depth, max_results=settings.research_max_results
+        )
+    finally:
+        db.close()
+
+    def _down(*, queries: list[str], **kwargs):
+        raise ResearchQueriesFailed([ResearchFailure(query=q, error="ReadTimeout") for q in queries])
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _down)
+    headers, _ = _auth_headers_and_token(client, "cache-partial@example.com")
+    completed = _research_completed(client, headers, "Pet sitter marketplace")
+    assert completed["cached_query_count"] == 1 and completed["failed_query_count"] == 1
+    assert completed["url_count"] == 1
+
+    db = db_session.SessionLocal()
+    try:
+        [failed] = db.query(RunEvent).filter(RunEvent.event_type == "research.query_failed").all()
+        assert json.loads(failed.payload_json)["query"].startswith("Risks, constraints")
+    finally:
+        db.close()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.research import search_tavily_queries
+
+
+class _FakeTavilyHandler(BaseHTTPRequestHandler):
+    # Query text drives the behaviour: "slow" answers after 0.3s, "hang" after 2s, "fail" with HTTP 500.
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        query = body["query"]
+        assert self.headers["Authorization"] == "Bearer fake-key"
+        if "hang" in query:
+            time.sleep(2)
+        elif "slow" in query:
+            time.sleep(0.3)
+        if "fail" in query:
+            self.send_response(500)
+            self.end_headers()
+            return
+        data = json.dumps(
+            {
+                "query": query,
+                "answer": f"Answer for {query}",
+                "results": [{"title": "Doc", "url": f"https://example.com/{len(query)}", "content": "c", "score": 0.5}],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:  # keep pytest output clean
+        pass
+
+
+@pytest.fixture()
+def fake_tavily_url() -> Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTavilyHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/search"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_queries_run_concurrently(fake_tavily_url: str) -> None:
+    queries = [f"slow query {i}" for i in range(4)]
+    started = time.monotonic()
+    batch = search_tavily_queries(api_key="fake-key", queries=queries, search_url=fake_tavily_url, timeout_seconds=5)
+    elapsed = time.monotonic() - started
+
+    assert [s.query for s in batch.searches] == queries
+    assert batch.failures == []
+    assert elapsed < 0.3 * len(queries) / 2  # sequential would be ~1.2s
+
+
+def test_failed_and_timed_out_queries_are_tolerated(fake_tavily_url: str) -> None:
+    batch = search_tavily_queries(
+        api_key="fake-key",
+        queries=["good query", "fail query", "hang query"],
+        search_url=fake_tavily_url,
+        timeout_seconds=0.5,
+    )
+    assert [s.query for s in batch.searches] == ["good query"]
+    assert batch.searches[0].answer == "Answer for good query"
+    assert [(f.query, f.error.split(":")[0]) for f in batch.failures] == [
+        ("fail query", "HTTPStatusError"),
+        ("hang query", "TimeoutError"),
+    ]
+
+    with pytest.raises(RuntimeError, match="All 1 research queries failed"):
+        search_tavily_queries(api_key="fake-key", queries=["fail query"], search_url=fake_tavily_url)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _pdf_with_text(text: str) -> bytes:
+    # Smallest PDF pypdf can extract text from: one page, one Helvetica text run.
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out, offsets = b"%PDF-1.4\n", []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def test_bm25_ranks_relevant_passages_within_the_token_budget(client: TestClient) -> None:
+    from app.services.prompt_budget import count_tokens
+    from app.services.research_passages import Bm25Index, Passage, select_passages
+
+    filler = " ".join(f"word{i}" for i in range(200))
+    index = Bm25Index(
+        [
+            Passage("a", "Refunds are issued to the original payment method within five days."),
+            Passage("b", "Screen readers need labelled buttons and sufficient contrast."),
+            Passage("c", f"Payment retries and refund disputes are handled by the billing team. {filler}"),
+            Passage("d", "Refunds are issued to the original payment method within five days."),
+        ]
+    )
+    assert [p.source for p, _ in index.search("refund a payment", 3)] == ["a", "d", "c"]
+    assert index.search("nothing relevant here", 3) == []
+
+    picked = select_passages(index, "payment refunds dispute", top_k=3, max_tokens=60)
+    # The duplicate window is skipped, and the long passage is cut so the total stays within the budget.
+    # BM25 length normalisation ranks the short exact match above the long passage.
+    assert [p["source"] for p in picked] == ["a", "c"]
+    assert "tokens omitted" in picked[1]["text"]
+    assert sum(count_tokens(p["text"]) for p in picked) <= 60
+    assert select_passages(index, "payment", top_k=0, max_tokens=60) == []
+
+
+def test_generation_prompts_carry_passages_ranked_for_each_epic(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+    from app.services import epic_generation, research as research_module, story_generation
+
+    topics = {
+        "https://example.com/refunds": "Marketplaces must process refunds and chargeback disputes within days.",
+        "https://example.com/a11y": "Accessibility audits check screen reader labels and colour contrast.",
+    }
+
+    def _search(*, api_key: str, queries: list[str], **kwargs):
+        results = [research_module.TavilyResult(title=url, url=url, content=text, score=0.9) for url, text in topics.items()]
+        return research_module.ResearchBatch(
+            searches=[research_module.ResearchResult(query=q, answer="", results=results) for q in queries], failures=[]
+        )
+
+    monkeypatch.setattr(runs_router, "search_tavily_queries", _search)
+    headers, _ = _auth_headers_and_token(client, "passages@example.com")
+    project_id = client.post("/projects", json={"product_request": "Handmade goods marketplace"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    files = {"file": ("offline.pdf", _pdf_with_text("Offline sync must resolve edit conflicts per field"), "application/pdf")}
+    assert client.post(f"/projects/{project_id}/documents", files=files, headers=headers).status_code == 201
+
+    from app.services import research_passages
+
+    indexed: list[str] = []
+    project_index = research_passages.project_index
+    monkeypatch.setattr(research_passages, "project_index", lambda db, **kw: indexed.append(kw["project_id"]) or project_index(db, **kw))
+    # Without an LLM there is no prompt to fill, so nothing is indexed or extracted.
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 1}, headers=headers)
+    assert res.status_code == 201 and indexed == []
+
+    prompts: list[dict] = []
+    epics_json = json.dumps({"epics": [{"title": "Offline sync", "goal": "Edit listings offline", "priority": "P0"}]})
+    stories_json = json.dumps({"stories": [{"statement": "As a seller I can edit offline", "acceptance_criteria": ["Given..."]}]})
+
+    def _stream(completion: str):
+        def _fake(*, system: str, user: str, temperature: float = 0.2):
+            prompts.append(json.loads(user))
+            yield completion
+
+        return _fake
+
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _stream(epics_json))
+    monkeypatch.setattr(story_generation, "stream_chat_json", _stream(stories_json))
+
+    res = client.post(
+        f"/projects/{project_id}/epics/generate", json={"constraints": "refund disputes", "count": 1}, headers=headers
+    )
+    assert res.status_code == 201, res.text
+    assert indexed == [project_id]
+    passages = prompts[-1]["research"]["relevant_passages"]
+    assert passages[0]["source"] == "https://example.com/refunds"
+    assert all("a11y" not in p["source"] for p in passages)
+
+    batch_id, epic_id = res.json()["batch_id"], res.json()["epics"][0]["id"]
+    client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    res = client.post(f"/projects/{project_id}/stories/generate", json={"epic_id": epic_id, "count": 1}, headers=headers)
+    assert res.status_code == 201, res.text
+    [passage] = prompts[-1]["relevant_research_passages"]
+    assert passage == {"source": "offline.pdf", "text": "Offline sync must resolve edit conflicts per field"}
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _run_backlog(client: TestClient, headers: dict[str, str], project_id: str, body: dict | None = None) -> tuple[str, dict[str, dict]]:
+    res = client.post(f"/projects/{project_id}/runs/backlog", json=body, headers=headers)
+    assert res.status_code == 202, res.text
+    run_id = res.json()["id"]
+    for _ in range(100):
+        events = client.get(f"/runs/{run_id}/events", headers=headers).json()
+        by_type = {e["event_type"]: json.loads(e["payload_json"] or "null") for e in events}
+        if "research.completed" in by_type:
+            return run_id, by_type
+        time.sleep(0.01)
+    raise AssertionError("Research did not complete in time")
+
+
+def _project(client: TestClient, headers: dict[str, str], product_request: str) -> str:
+    res = client.post("/projects", json={"product_request": product_request}, headers=headers)
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+def test_minhash_separates_paraphrases_from_unrelated_requests(client: TestClient) -> None:
+    from app.services.research_similarity import minhash_signature, signature_similarity
+
+    a = minhash_signature("Build a campus event companion app where students RSVP to events")
+    b = minhash_signature("Campus event companion app: students can RSVP to events")
+    c = minhash_signature("Inventory management for a small bakery with supplier ordering")
+    assert signature_similarity(a, b) >= 0.6
+    assert signature_similarity(a, c) < 0.2
+
+
+def test_similar_research_is_offered_and_reused_on_request(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+
+    searched: list[str] = []
+    fake = runs_router.search_tavily_queries
+    monkeypatch.setattr(runs_router, "search_tavily_queries", lambda **kw: searched.extend(kw["queries"]) or fake(**kw))
+
+    source_request = "Build a campus event companion app where students RSVP to events"
+    owner, _ = _auth_headers_and_token(client, "reuse-owner@example.com")
+    first_project = _project(client, owner, source_request)
+    first_run, _ = _run_backlog(client, owner, first_project)
+    assert source_request in client.get(f"/runs/{first_run}/research", headers=owner).json()["summary"]
+    assert len(searched) == 2
+
+    other, _ = _auth_headers_and_token(client, "reuse-other@example.com")
+    project_id = _project(client, other, "Campus event companion app: students can RSVP to events")
+    res = client.get(f"/projects/{project_id}/research/similar", headers=other)
+    assert res.status_code == 200, res.text
+    [match] = res.json()
+    assert match["similarity"] >= 0.6 and "product_request" not in match
+    assert source_request not in match["summary"]
+
+    run_id, events = _run_backlog(client, other, project_id, {"reuse_appendix_id": match["appendix_id"]})
+    assert events["research.completed"]["reused_from"]["appendix_id"] == match["appendix_id"]
+    assert len(searched) == 2  # no new web research
+
+    appendix = client.get(f"/runs/{run_id}/research", headers=other).json()
+    assert "students can RSVP" in appendix["markdown"]
+    for field in ("markdown", "summary"):
+        assert source_request not in appendix[field]
+
+    res = client.post(f"/projects/{project_id}/runs/backlog", json={"reuse_appendix_id": "missing"}, headers=other)
+    assert res.status_code == 404
+
+
+def test_reuse_is_limited_to_own_or_similar_research(client: TestClient) -> None:
+    owner, _ = _auth_headers_and_token(client, "reuse-private@example.com")
+    first_project = _project(client, owner, "Private clinic rota planner for night shift nurses")
+    first_run, _ = _run_backlog(client, owner, first_project)
+    appendix_id = client.get(f"/runs/{first_run}/research", headers=owner).json()["id"]
+
+    # Someone whose request is unrelated cannot copy it by guessing or leaking the ID.
+    other, _ = _auth_headers_and_token(client, "reuse-snoop@example.com")
+    unrelated = _project(client, other, "Recipe sharing site for home bakers")
+    res = client.post(f"/projects/{unrelated}/runs/backlog", json={"reuse_appendix_id": appendix_id}, headers=other)
+    assert res.status_code == 404
+
+    # The owner can reuse their own research on any of their projects.
+    _, events = _run_backlog(client, owner, _project(client, owner, "Recipe sharing site for home bakers"), {"reuse_appendix_id": appendix_id})
+    assert events["research.completed"]["reused_from"]["appendix_id"] == appendix_id
+
+
+def test_auto_mode_reuses_best_match(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import runs as runs_router
+
+    headers, _ = _auth_headers_and_token(client, "reuse-auto@example.com")
+    _run_backlog(client, headers, _project(client, headers, "Todo list app with reminders and shared lists"))
+
+    monkeypatch.setattr(runs_router.get_settings(), "research_reuse_mode", "auto")
+    _, events = _run_backlog(client, headers, _project(client, headers, "A todo list app with reminders and shared lists"))
+    assert events["research.completed"]["reused_from"]["similarity"] >= 0.6
+    assert "research.similar_found" not in events
+
+    _, events = _run_backlog(client, headers, _project(client, headers, "Fleet telematics dashboard for delivery vans"))
+    assert "reused_from" not in events["research.completed"]
+
+
+def test_indexing_an_appendix_twice_concurrently_is_harmless(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.db import session as db_session
+    from app.db.models import ResearchLshBucket
+    from app.services.research_similarity import BANDS, index_appendix
+
+    headers, _ = _auth_headers_and_token(client, "reuse-index@example.com")
+    run_id, _ = _run_backlog(client, headers, _project(client, headers, "Community fridge stock tracker"))
+    appendix_id = client.get(f"/runs/{run_id}/research", headers=headers).json()["id"]
+
+    db = db_session.SessionLocal()
+    try:
+        # As if another worker inserted the same rows between this session's lookups and its commit.
+        monkeypatch.setattr(db, "merge", db.add)
+        index_appendix(db, appendix_id=appendix_id, product_request="Community fridge stock tracker")
+        assert db.query(ResearchLshBucket).filter(ResearchLshBucket.appendix_id == appendix_id).count() == BANDS
+    finally:
+        db.close()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _research_run(client: TestClient, headers: dict[str, str]) -> str:
+    res = client.post("/projects", json={"product_request": "Build a recipe sharing site"}, headers=headers)
+    project_id = res.json()["id"]
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            return run_id
+        time.sleep(0.01)
+    raise AssertionError("Research appendix not created in time")
+
+
+def test_research_appendix_supports_conditional_requests(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "etag@example.com")
+    run_id = _research_run(client, headers)
+
+    res = client.get(f"/runs/{run_id}/research", headers=headers)
+    assert res.status_code == 200
+    etag, last_modified = res.headers["etag"], res.headers["last-modified"]
+    assert "Raw Search Notes" not in res.json()["markdown"]
+    assert res.json()["urls"] == ["https://example.com"]
+
+    res = client.get(f"/runs/{run_id}/research", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304 and res.content == b""
+    res = client.get(f"/runs/{run_id}/research", headers={**headers, "If-Modified-Since": last_modified})
+    assert res.status_code == 304
+    res = client.get(f"/runs/{run_id}/research", headers={**headers, "If-None-Match": '"stale"'})
+    assert res.status_code == 200
+
+    res = client.get(f"/runs/{run_id}/research?include_raw_notes=true", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200  # different representation, different validator
+    assert "## Raw Search Notes" in res.json()["markdown"]
+
+    # Another user still gets 403 even with a matching validator.
+    other, _ = _auth_headers_and_token(client, "etag-other@example.com")
+    assert client.get(f"/runs/{run_id}/research", headers={**other, "If-None-Match": etag}).status_code == 403
+
+
+def test_raw_notes_are_served_from_their_own_endpoint(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "raw-notes@example.com")
+    run_id = _research_run(client, headers)
+
+    res = client.get(f"/runs/{run_id}/research/raw_notes", headers=headers)
+    assert res.status_code == 200, res.text
+    notes = res.json()
+    assert [r["url"] for s in notes["searches"] for r in s["results"]] == ["https://example.com", "https://example.com"]
+    assert notes["searches"][0]["results"][0]["content"] == "Example content"
+
+    res = client.get(f"/runs/{run_id}/research/raw_notes", headers={**headers, "If-None-Match": res.headers["etag"]})
+    assert res.status_code == 304
+
+    res = client.get(f"/runs/{run_id}/research/raw_notes", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert json.loads(res.content) == notes
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _project_with_epics(client: TestClient, headers: dict[str, str]) -> tuple[str, list[dict]]:
+    res = client.post("/projects", json={"product_request": "Build a planning tool"}, headers=headers)
+    project_id = res.json()["id"]
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 3}, headers=headers)
+    assert res.status_code == 201, res.text
+    return project_id, res.json()["epics"]
+
+
+def test_search_finds_research_and_epics_and_follows_updates(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "search@example.com")
+    project_id, epics = _project_with_epics(client, headers)
+
+    res = client.get(f"/projects/{project_id}/search", params={"q": "example content"}, headers=headers)
+    assert res.status_code == 200, res.text
+    [hit] = res.json()
+    assert hit["kind"] == "research" and "[Example]" in hit["snippet"]
+
+    title_word = epics[0]["title"].split()[0]
+    res = client.get(f"/projects/{project_id}/search", params={"q": title_word, "kind": "epic"}, headers=headers)
+    assert epics[0]["id"] in [h["ref_id"] for h in res.json()]
+    assert {h["kind"] for h in res.json()} == {"epic"}
+
+    # Writes are indexed in the same transaction: an edited epic is found by its new text, a deleted one is gone.
+    from app.db import session as db_session
+    from app.db.models import Epic
+
+    db = db_session.SessionLocal()
+    try:
+        db.get(Epic, epics[1]["id"]).goal = "Quarantine failed webhooks in a retry queue"
+        db.commit()
+        res = client.get(f"/projects/{project_id}/search", params={"q": "webhook quarant"}, headers=headers)
+        assert [h["ref_id"] for h in res.json()] == [epics[1]["id"]]
+
+        db.delete(db.get(Epic, epics[1]["id"]))
+        db.commit()
+        res = client.get(f"/projects/{project_id}/search", params={"q": "webhook"}, headers=headers)
+        assert res.json() == []
+    finally:
+        db.close()
+
+    res = client.get(f"/projects/{project_id}/search", params={"q": "epic", "kind": "nonsense"}, headers=headers)
+    assert res.status_code == 400
+
+    other, _ = _auth_headers_and_token(client, "search-other@example.com")
+    assert client.get(f"/projects/{project_id}/search", params={"q": "epic"}, headers=other).status_code == 403
+
+
+def test_search_stays_fast_on_large_projects(client: TestClient) -> None:
+    from app.db import session as db_session
+    from app.db.models import Epic, EpicBatch
+
+    headers, _ = _auth_headers_and_token(client, "search-bulk@example.com")
+    res = client.post("/projects", json={"product_request": "Bulk"}, headers=headers)
+    project_id = res.json()["id"]
+
+    db = db_session.SessionLocal()
+    try:
+        batch = EpicBatch(project_id=project_id, constraints="")
+        db.add(batch)
+        db.flush()
+        words = ["payments", "search", "onboarding", "billing", "reports", "alerts", "exports", "audit"]
+        for i in range(3000):
+            db.add(
+                Epic(
+                    project_id=project_id,
+                    batch_id=batch.id,
+                    title=f"{words[i % 8].title()} epic {i}",
+                    goal=f"Improve {words[(i * 3) % 8]} for segment {i % 50}",
+                    in_scope="", out_of_scope="", priority="P1", priority_reason="",
+                    dependencies_json="[]", risks="", assumptions="", open_questions="", success_metrics="",
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+    client.get(f"/projects/{project_id}/search", params={"q": "audit"}, headers=headers)  # warm-up
+    started = time.perf_counter()
+    res = client.get(f"/projects/{project_id}/search", params={"q": "billing", "limit": 10}, headers=headers)
+    elapsed = time.perf_counter() - started
+    assert res.status_code == 200
+    assert len(res.json()) == 10
+    # "billing" also appears in other epics' goals; title matches are weighted to rank first.
+    assert all(h["title"].startswith("Billing") for h in res.json())
+    assert elapsed < 0.25  # includes auth + HTTP round trip through the test client
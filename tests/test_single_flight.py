@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.single_flight import SingleFlight, flight_key
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def test_flight_key_ignores_whitespace_and_case() -> None:
+    assert flight_key("p", "epics.generate", constraints=" Must  support SSO ", count=6) == flight_key(
+        "p", "epics.generate", count=6, constraints="must support sso"
+    )
+    assert flight_key("p", "epics.generate", constraints="", count=6) != flight_key("p", "epics.generate", constraints="", count=5)
+
+
+def test_concurrent_identical_requests_share_one_leader() -> None:
+    sf = SingleFlight()
+    key = flight_key("p", "epics.generate", constraints="", count=3)
+    started: list[str] = []
+    release = threading.Event()
+
+    def _start() -> str:
+        started.append(f"run-{len(started)}")
+        return started[-1]
+
+    leader, is_leader = sf.acquire(key, start=_start, window_seconds=0)
+    assert is_leader
+
+    followers = [sf.acquire(key, start=_start, window_seconds=0) for _ in range(3)]
+    assert all(f is leader and not lead for f, lead in followers)
+    assert started == ["run-0"]
+
+    def _job() -> dict:
+        release.wait()
+        return {"batch_id": "b1"}
+
+    t = threading.Thread(target=sf.run, args=(key, leader, _job))
+    t.start()
+    release.set()
+    assert leader.wait() == {"batch_id": "b1"}
+    t.join()
+
+    # Window of 0: the next identical request starts a new run.
+    _, is_leader = sf.acquire(key, start=_start, window_seconds=0)
+    assert is_leader
+    assert started == ["run-0", "run-1"]
+
+
+def test_failed_flight_is_not_replayed() -> None:
+    sf = SingleFlight()
+    key = flight_key("p", "stories.generate", epic_id="e", constraints="", count=3)
+    flight, _ = sf.acquire(key, start=lambda: "run-a", window_seconds=60)
+
+    def _boom() -> None:
+        raise ValueError("provider down")
+
+    with pytest.raises(ValueError):
+        sf.run(key, flight, _boom)
+    with pytest.raises(RuntimeError, match="provider down"):
+        flight.wait()
+
+    retry, is_leader = sf.acquire(key, start=lambda: "run-b", window_seconds=60)
+    assert is_leader and retry.run_id == "run-b"
+
+
+def test_identical_epics_generate_over_ws_is_coalesced(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import ws as ws_router
+
+    monkeypatch.setattr(ws_router.get_settings(), "single_flight_window_seconds", 60.0)
+    headers, token = _auth_headers_and_token(client, "single-flight@example.com")
+
+    res = client.post("/projects", json={"product_request": "Build a planner"}, headers=headers)
+    assert res.status_code == 201, res.text
+    project_id = res.json()["id"]
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    assert res.status_code == 202, res.text
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    else:
+        assert False, "Research appendix not created in time"
+
+    def _generate(ws, constraints: str) -> tuple[str, str]:
+        ws.send_json({"type": "epics.generate", "constraints": constraints, "count": 2})
+        created_type = None
+        for _ in range(40):
+            msg = ws.receive_json()
+            if msg.get("type") in ("epics.run.created", "epics.run.coalesced"):
+                created_type = msg["type"]
+            if msg.get("type") == "epics.batch.summary":
+                return created_type, msg["batch_id"]
+        assert False, "No epics.batch.summary received"
+
+    with client.websocket_connect(f"/ws/projects/{project_id}/epics?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ws.connected"
+        first = _generate(ws, "must support SSO")
+        second = _generate(ws, "  Must support SSO")
+        third = _generate(ws, "must support SAML")
+
+    assert first[0] == "epics.run.created"
+    assert second == ("epics.run.coalesced", first[1])
+    assert third[0] == "epics.run.created" and third[1] != first[1]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _setup_approved_stories(client: TestClient, headers: dict[str, str], *, count: int) -> tuple[str, str, list[str]]:
+    res = client.post("/projects", json={"product_request": "Build a planning tool"}, headers=headers)
+    assert res.status_code == 201, res.text
+    project_id = res.json()["id"]
+
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    assert res.status_code == 202, res.text
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    else:
+        assert False, "Research appendix not created in time"
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 2}, headers=headers)
+    assert res.status_code == 201, res.text
+    batch_id = res.json()["batch_id"]
+    epic_id = res.json()["epics"][0]["id"]
+    res = client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    assert res.status_code == 200, res.text
+
+    res = client.post(
+        f"/projects/{project_id}/stories/generate",
+        json={"epic_id": epic_id, "constraints": "", "count": count},
+        headers=headers,
+    )
+    assert res.status_code == 201, res.text
+    story_batch_id = res.json()["batch_id"]
+    story_ids = [s["id"] for s in res.json()["stories"]]
+    res = client.post(f"/projects/{project_id}/stories/{story_batch_id}/approve", json={"approve_all": True}, headers=headers)
+    assert res.status_code == 200, res.text
+    return project_id, epic_id, story_ids
+
+
+def test_specs_generate_batch_streams_progress_per_story(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.routers import ws as ws_router
+
+    monkeypatch.setattr(ws_router.get_settings(), "spec_fanout_rate_per_minute", 0)
+    headers, token = _auth_headers_and_token(client, "spec-batch@example.com")
+    project_id, epic_id, story_ids = _setup_approved_stories(client, headers, count=4)
+
+    with client.websocket_connect(f"/ws/projects/{project_id}/specs?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ws.connected"
+        ws.send_json({"type": "specs.generate_batch", "epic_id": epic_id, "concurrency": 3})
+
+        completed: set[str] = set()
+        summary = None
+        for _ in range(200):
+            msg = ws.receive_json()
+            if msg.get("event_type") == "specs.story.completed":
+                completed.add(msg["payload"]["story_id"])
+            if msg.get("type") == "specs.batch.summary":
+                summary = msg
+                break
+
+        assert summary is not None
+        assert summary["failed"] == []
+        assert [s["story_id"] for s in summary["specs"]] == story_ids
+        assert all(s["version"] == 1 for s in summary["specs"])
+        assert completed == set(story_ids)
+
+
+def test_save_spec_document_allocates_distinct_versions_under_concurrency(client: TestClient) -> None:
+    from app.db import session as db_session
+    from app.services.spec_fanout import save_spec_document
+
+    headers, _ = _auth_headers_and_token(client, "spec-versions@example.com")
+    project_id, _, story_ids = _setup_approved_stories(client, headers, count=1)
+
+    def _save(_: int) -> int:
+        db = db_session.SessionLocal()
+        try:
+            doc = save_spec_document(
+                db, project_id=project_id, story_id=story_ids[0], spec_payload={}, constraints="", feedback="", attempts=20
+            )
+            return doc.version
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        versions = list(pool.map(_save, range(6)))
+
+    assert sorted(versions) == [1, 2, 3, 4, 5, 6]
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote
+from xml.sax.saxutils import escape
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+class _FakeS3:
+    """In-process stand-in for an S3-compatible server: path-style buckets, SigV4 checked on every request."""
+
+    def __init__(self, *, bucket: str, access_key_id: str, secret_access_key: str) -> None:
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.objects: dict[str, tuple[bytes, datetime]] = {}
+        self.requests: list[str] = []
+
+    def _signature_ok(self, request: httpx.Request, body: bytes) -> bool:
+        m = re.fullmatch(
+            r"AWS4-HMAC-SHA256 Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request, SignedHeaders=([^,]+), Signature=([0-9a-f]{64})",
+            request.headers.get("authorization", ""),
+        )
+        if not m or m[1] != self.access_key_id:
+            return False
+        if request.headers["x-amz-content-sha256"] != hashlib.sha256(body).hexdigest():
+            return False
+        day, region, signed = m[2], m[3], m[4]
+        path, _, query = request.url.raw_path.decode("ascii").partition("?")
+        canonical = "\n".join(
+            [request.method, path, query, *(f"{h}:{request.headers[h]}" for h in signed.split(";")), "", signed, request.headers["x-amz-content-sha256"]]
+        )
+        scope = f"{day}/{region}/s3/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", request.headers["x-amz-date"], scope, hashlib.sha256(canonical.encode()).hexdigest()])
+        key = f"AWS4{self.secret_access_key}".encode()
+        for part in (day, region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return hmac.compare_digest(hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest(), m[5])
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        if not self._signature_ok(request, body):
+            return httpx.Response(403, content=b"<Error><Code>SignatureDoesNotMatch</Code></Error>")
+        bucket, _, key = unquote(request.url.path).lstrip("/").partition("/")
+        if bucket != self.bucket:
+            return httpx.Response(404, content=b"<Error><Code>NoSuchBucket</Code></Error>")
+        self.requests.append(f"{request.method} {key}")
+        if not key and request.method == "GET":
+            return self._list(dict(parse_qsl(request.url.query.decode())))
+        if request.method == "PUT":
+            self.objects[key] = (body, datetime.now(timezone.utc))
+            return httpx.Response(200)
+        if request.method == "DELETE":
+            self.objects.pop(key, None)
+            return httpx.Response(204)
+        if key not in self.objects:
+            return httpx.Response(404, content=b"<Error><Code>NoSuchKey</Code></Error>")
+        data, modified = self.objects[key]
+        headers = {"last-modified": format_datetime(modified, usegmt=True)}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={**headers, "content-length": str(len(data))})
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("range", ""))
+        if "range" in request.headers and not m:
+            return httpx.Response(416, content=b"<Error><Code>InvalidRange</Code></Error>")
+        if m:
+            start, end = int(m[1]), int(m[2]) + 1 if m[2] else len(data)
+            return httpx.Response(206, headers=headers, content=data[start:end])
+        return httpx.Response(200, headers=headers, content=data)
+
+    def _list(self, query: dict[str, str]) -> httpx.Response:
+        # Two keys per page, so callers must follow continuation tokens.
+        keys = sorted(k for k in self.objects if k.startswith(query.get("prefix", "")))
+        start = int(query.get("continuation-token", "0"))
+        page = keys[start : start + 2]
+        more = start + 2 < len(keys)
+        xml = '<?xml version="1.0"?><ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+        xml += "".join(f"<Contents><Key>{escape(k)}</Key></Contents>" for k in page)
+        xml += f"<IsTruncated>{str(more).lower()}</IsTruncated>"
+        xml += f"<NextContinuationToken>{start + 2}</NextContinuationToken>" if more else ""
+        return httpx.Response(200, content=(xml + "</ListBucketResult>").encode())
+
+
+def _s3_backend(fake: _FakeS3, tmp_path: Path, *, secret: str | None = None, cache_max_bytes: int = 2 * 1024**3):
+    from app.services.storage_backends import S3Backend
+
+    return S3Backend(
+        endpoint_url="http://s3.test",
+        bucket=fake.bucket,
+        access_key_id=fake.access_key_id,
+        secret_access_key=secret or fake.secret_access_key,
+        prefix="tenant-a",
+        cache_dir=tmp_path / "cache",
+        cache_max_bytes=cache_max_bytes,
+        transport=httpx.MockTransport(fake),
+    )
+
+
+@pytest.mark.parametrize("kind", ["local", "s3"])
+def test_backends_share_one_contract(kind: str, tmp_path: Path) -> None:
+    from app.services.storage_backends import LocalBackend
+
+    fake = _FakeS3(bucket="artifacts", access_key_id="AKIATEST", secret_access_key="s3cr3t")
+    backend = LocalBackend(tmp_path / "root") if kind == "local" else _s3_backend(fake, tmp_path)
+
+    assert backend.read_bytes("projects/p1/runs/r1/research.md") is None
+    assert backend.stat("projects/p1/runs/r1/research.md") is None
+    backend.write_text("projects/p1/runs/r1/research.md", "# Research\n")
+    backend.write_text("projects/p1/runs/r1/epic_dependency_graph.mmd", "graph TD\n")
+    assert backend.read_text("projects/p1/runs/r1/research.md") == "# Research\n"
+    assert backend.stat("projects/p1/runs/r1/research.md").size == len("# Research\n")
+
+    big = bytes(range(256)) * 20_000  # 5 MB: several chunks through the streaming paths
+    with backend.open_write("blobs/ab/abc") as out:
+        for i in range(0, len(big), 65536):
+            out.write(big[i : i + 65536])
+    staged = tmp_path / "staged.bin"
+    staged.write_bytes(b"second blob")
+    backend.put_file("blobs/ab/abd", staged)
+    assert not staged.exists()
+    with backend.open_read("blobs/ab/abc") as f:
+        assert f.read(10) == big[:10] and f.read() == big[10:]
+    with backend.open_read("blobs/ab/abc", start=1_000_000, end=1_000_300) as f:
+        assert f.read() == big[1_000_000:1_000_300]
+    with backend.open_read("blobs/ab/abc", start=len(big) - 5) as f:
+        assert f.read() == big[-5:]
+    assert backend.local_path("blobs/ab/abc").read_bytes() == big
+    assert list(backend.list_keys("blobs/ab/ab")) == ["blobs/ab/abc", "blobs/ab/abd"]
+    assert list(backend.list_keys("projects/p1/")) == ["projects/p1/runs/r1/epic_dependency_graph.mmd", "projects/p1/runs/r1/research.md"]
+
+    backend.delete("blobs/ab/abc")
+    backend.delete("blobs/ab/abc")  # already gone: not an error
+    assert not backend.exists("blobs/ab/abc")
+    with pytest.raises(FileNotFoundError):
+        with backend.open_read("blobs/ab/abc"):
+            pass
+    with pytest.raises(ValueError):
+        backend.read_bytes("../outside")
+
+    if kind == "s3":
+        assert set(fake.objects) == {
+            "tenant-a/blobs/ab/abd",
+            "tenant-a/projects/p1/runs/r1/research.md",
+            "tenant-a/projects/p1/runs/r1/epic_dependency_graph.mmd",
+        }
+        with pytest.raises(OSError, match="403"):
+            _s3_backend(fake, tmp_path, secret="wrong").read_bytes("blobs/ab/abd")
+
+
+@pytest.mark.parametrize("kind", ["local", "s3"])
+def test_zero_byte_objects_read_back_empty(kind: str, tmp_path: Path) -> None:
+    from app.services.storage_backends import LocalBackend
+
+    fake = _FakeS3(bucket="artifacts", access_key_id="AKIATEST", secret_access_key="s3cr3t")
+    backend = LocalBackend(tmp_path / "root") if kind == "local" else _s3_backend(fake, tmp_path)
+    backend.write_bytes("blobs/e3/empty", b"")
+
+    with backend.open_read("blobs/e3/empty", start=0, end=0) as f:
+        assert f.read() == b""
+    with backend.open_read("blobs/e3/empty") as f:
+        assert f.read() == b""
+    assert backend.local_path("blobs/e3/empty").read_bytes() == b""
+    with pytest.raises(FileNotFoundError):
+        with backend.open_read("blobs/e3/missing", start=0, end=0):
+            pass
+
+
+def test_s3_cache_evicts_least_recently_used_files(tmp_path: Path) -> None:
+    import os
+
+    fake = _FakeS3(bucket="artifacts", access_key_id="AKIATEST", secret_access_key="s3cr3t")
+    backend = _s3_backend(fake, tmp_path, cache_max_bytes=250)
+    for name in ("a", "b", "c"):
+        backend.write_bytes(f"blobs/00/{name}", name.encode() * 100)
+
+    a = backend.local_path("blobs/00/a")
+    b = backend.local_path("blobs/00/b")
+    os.utime(a, ns=(1, 1))
+    os.utime(b, ns=(2, 2))
+    backend.local_path("blobs/00/a")  # a cache hit marks it as recently used
+    c = backend.local_path("blobs/00/c")  # 300 bytes > 250: b, the least recently used, is evicted
+
+    assert a.exists() and c.exists() and not b.exists()
+    assert c.read_bytes() == b"c" * 100
+
+
+def test_app_artifacts_go_through_the_configured_backend(client: TestClient, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    from io import BytesIO
+
+    from pypdf import PdfWriter
+
+    from app.services import storage
+
+    fake = _FakeS3(bucket="artifacts", access_key_id="AKIATEST", secret_access_key="s3cr3t")
+    settings = storage.get_settings()
+    for name, value in {
+        "storage_backend": "s3",
+        "s3_endpoint_url": "http://s3.test",
+        "s3_bucket": "artifacts",
+        "s3_access_key_id": "AKIATEST",
+        "s3_secret_access_key": "s3cr3t",
+        "s3_prefix": "",
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(storage, "_s3_transport", httpx.MockTransport(fake))
+
+    headers, _ = _auth_headers_and_token(client, "s3-storage@example.com")
+    project_id = client.post("/projects", json={"product_request": "Community garden planner"}, headers=headers).json()["id"]
+    run_id = client.post(f"/projects/{project_id}/runs/backlog", headers=headers).json()["id"]
+    for _ in range(200):
+        res = client.get(f"/runs/{run_id}/research", headers=headers)
+        if res.status_code == 200:
+            break
+        time.sleep(0.01)
+    assert res.status_code == 200, res.text
+    assert f"projects/{project_id}/runs/{run_id}/research.md" in fake.objects
+    assert f"projects/{project_id}/runs/{run_id}/research_raw_notes.json.gz" in fake.objects
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    writer.add_metadata({"/Title": "Garden plots"})
+    buf = BytesIO()
+    writer.write(buf)
+    files = {"file": ("Gärten – 区画.pdf", buf.getvalue(), "application/pdf")}
+    res = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
+    assert res.status_code == 201, res.text
+    key = storage.blob_key(res.json()["sha256"])
+    assert fake.objects[key][0] == buf.getvalue()
+    for _ in range(300):
+        if f"{key}.pages.jsonl.gz" in fake.objects:
+            break
+        time.sleep(0.01)
+    assert f"{key}.pages.jsonl.gz" in fake.objects
+
+    # Downloads are relayed from the bucket, a range at a time.
+    [artifact] = client.get(f"/projects/{project_id}", headers=headers).json()["artifacts"]
+    res = client.get(artifact["download_url"], headers={**headers, "Range": "bytes=50-"})
+    assert res.status_code == 206 and res.content == buf.getvalue()[50:]
+    assert res.headers["etag"] == f'"{storage.blob_sha(key)}"'
+    # Non-Latin-1 names go in filename*, with an ASCII fallback for older clients.
+    assert res.headers["content-disposition"] == (
+        "attachment; filename=\"G_rten _ __.pdf\"; filename*=utf-8''G%C3%A4rten%20%E2%80%93%20%E5%8C%BA%E7%94%BB.pdf"
+    )
+    res = client.get(f"/runs/{run_id}/files/research.md", headers=headers)
+    assert res.status_code == 200 and res.content == fake.objects[f"projects/{project_id}/runs/{run_id}/research.md"][0]
+    # Nothing but upload staging and the parser's download cache touches the local disk.
+    assert not list((settings.storage_root / "projects" / project_id).glob("runs/*"))
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _create_project_with_epics(client: TestClient, headers: dict[str, str], *, count: int) -> tuple[str, str, list[str]]:
+    res = client.post("/projects", json={"product_request": "Build a fan-out planner"}, headers=headers)
+    assert res.status_code == 201, res.text
+    project_id = res.json()["id"]
+
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    assert res.status_code == 202, res.text
+    run_id = res.json()["id"]
+    for _ in range(50):
+        if client.get(f"/runs/{run_id}/research", headers=headers).status_code == 200:
+            break
+        time.sleep(0.01)
+    else:
+        assert False, "Research appendix not created in time"
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": count}, headers=headers)
+    assert res.status_code == 201, res.text
+    return project_id, res.json()["batch_id"], [e["id"] for e in res.json()["epics"]]
+
+
+def test_generate_all_requires_an_approved_epic(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "fanout-gate@example.com")
+    project_id, _, _ = _create_project_with_epics(client, headers, count=2)
+
+    res = client.post(f"/projects/{project_id}/stories/generate_all", json={}, headers=headers)
+    assert res.status_code == 400, res.text
+
+
+def test_generate_all_creates_one_batch_per_approved_epic(client: TestClient) -> None:
+    headers, _ = _auth_headers_and_token(client, "fanout@example.com")
+    project_id, batch_id, epic_ids = _create_project_with_epics(client, headers, count=3)
+    res = client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    assert res.status_code == 200, res.text
+
+    res = client.post(
+        f"/projects/{project_id}/stories/generate_all",
+        json={"count": 2, "concurrency": 2},
+        headers=headers,
+    )
+    assert res.status_code == 201, res.text
+    body = res.json()
+    assert body["epic_batch_id"] == batch_id
+    assert body["status"] == "completed"
+    assert body["failed"] == []
+    assert [b["epic_id"] for b in body["batches"]] == epic_ids
+    assert all(b["story_count"] == 2 for b in body["batches"])
+
+    for epic_id in epic_ids:
+        res = client.get(f"/projects/{project_id}/stories", params={"epic_id": epic_id}, headers=headers)
+        assert res.status_code == 200, res.text
+        assert len(res.json()["stories"]) == 2
+
+    events = client.get(f"/runs/{body['run_id']}/events", headers=headers).json()
+    completed = [json.loads(e["payload_json"])["epic_id"] for e in events if e["event_type"] == "stories.epic.completed"]
+    assert sorted(completed) == sorted(epic_ids)
+    assert events[-1]["event_type"] == "stories.generated"
+
+
+def test_generate_all_over_ws_streams_per_epic_events(client: TestClient) -> None:
+    headers, token = _auth_headers_and_token(client, "fanout-ws@example.com")
+    project_id, batch_id, epic_ids = _create_project_with_epics(client, headers, count=2)
+    res = client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    assert res.status_code == 200, res.text
+
+    with client.websocket_connect(f"/ws/projects/{project_id}/stories?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ws.connected"
+        ws.send_json({"type": "stories.generate_all", "count": 2})
+
+        started: set[str] = set()
+        summary = None
+        for _ in range(50):
+            msg = ws.receive_json()
+            if msg.get("event_type") == "stories.epic.started":
+                started.add(msg["payload"]["epic_id"])
+            if msg.get("type") == "stories.generate_all.summary":
+                summary = msg
+                break
+
+        assert summary is not None
+        assert [b["epic_id"] for b in summary["batches"]] == epic_ids
+        assert started == set(epic_ids)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.json_stream import JsonStreamScanner
+
+
+def _auth_headers_and_token(client: TestClient, email: str) -> tuple[dict[str, str], str]:
+    res = client.post("/auth/signup", json={"email": email, "password": "password123"})
+    assert res.status_code == 201, res.text
+    res = client.post("/auth/login", data={"username": email, "password": "password123"})
+    assert res.status_code == 200, res.text
+    token = res.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, token
+
+
+def _create_project_and_research(client: TestClient, headers: dict[str, str]) -> str:
+    res = client.post("/projects", json={"product_request": "Build a streaming planner"}, headers=headers)
+    assert res.status_code == 201, res.text
+    project_id = res.json()["id"]
+
+    res = client.post(f"/projects/{project_id}/runs/backlog", headers=headers)
+    assert res.status_code == 202, res.text
+    run_id = res.json()["id"]
+
+    for _ in range(50):
+        rr = client.get(f"/runs/{run_id}/research", headers=headers)
+        if rr.status_code == 200:
+            break
+        time.sleep(0.01)
+    else:
+        assert False, "Research appendix not created in time"
+    return project_id
+
+
+def test_scanner_emits_items_as_soon_as_they_close() -> None:
+    doc = json.dumps({"note": "x, [y]", "epics": [{"title": "A", "dependencies": ["q"]}, {"title": 'B "}]'}]})
+    scanner = JsonStreamScanner(mode="items", array_key="epics")
+
+    seen: list[tuple[int, dict]] = []
+    for i, ch in enumerate(doc):
+        for item in scanner.feed(ch):
+            seen.append((i, item))
+
+    assert [item["title"] for _, item in seen] == ["A", 'B "}]']
+    # Each epic is available the moment its closing brace arrives.
+    assert seen[0][0] == doc.index("}, {")
+
+
+def test_scanner_emits_top_level_members() -> None:
+    doc = json.dumps({"overview": "o", "functional_requirements": [{"a": 1}], "mermaid_er": None})
+    scanner = JsonStreamScanner(mode="members")
+    out = []
+    for i in range(0, len(doc), 4):
+        out.extend(scanner.feed(doc[i : i + 4]))
+    assert out == [("overview", "o"), ("functional_requirements", [{"a": 1}]), ("mermaid_er", None)]
+
+
+def test_scanner_only_keeps_the_open_item_while_scanning() -> None:
+    epics = [{"title": f"Epic {n}", "description": "d" * 200} for n in range(500)]
+    doc = json.dumps({"epics": epics})
+    scanner = JsonStreamScanner(mode="items", array_key="epics")
+
+    out = []
+    largest_window = 0
+    for i in range(0, len(doc), 7):
+        out.extend(scanner.feed(doc[i : i + 7]))
+        largest_window = max(largest_window, sum(len(c) for c in scanner._window))
+
+    assert out == epics
+    assert largest_window < 2 * len(json.dumps(epics[0]))
+    assert scanner.text == doc and scanner.repair() == {"epics": epics}
+
+
+def test_epics_partial_events_from_streamed_completion(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import epic_generation
+
+    # Modules bind get_settings at import time; patch the settings object this module actually sees.
+    monkeypatch.setattr(epic_generation.get_settings(), "openai_api_key", "test-openai-key")
+    completion = json.dumps({"epics": [{"title": f"Epic {i}", "goal": "g", "priority": "P0"} for i in range(3)]})
+
+    def _fake_stream(*, system: str, user: str, temperature: float = 0.2):
+        for i in range(0, len(completion), 7):
+            yield completion[i : i + 7]
+
+    monkeypatch.setattr(epic_generation, "stream_chat_json", _fake_stream)
+
+    headers, _ = _auth_headers_and_token(client, "stream@example.com")
+    project_id = _create_project_and_research(client, headers)
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 3}, headers=headers)
+    assert res.status_code == 201, res.text
+    run_id = res.json()["run_id"]
+
+    events = client.get(f"/runs/{run_id}/events", headers=headers).json()
+    types = [e["event_type"] for e in events]
+    partials = [json.loads(e["payload_json"]) for e in events if e["event_type"] == "epics.partial"]
+    assert [p["epic"]["title"] for p in partials] == ["Epic 0", "Epic 1", "Epic 2"]
+    assert [p["index"] for p in partials] == [0, 1, 2]
+    assert types.index("epics.partial") < types.index("epics.generated")
+
+
+def test_stories_partial_events_stream_over_ws(client: TestClient) -> None:
+    headers, token = _auth_headers_and_token(client, "stream-ws@example.com")
+    project_id = _create_project_and_research(client, headers)
+
+    res = client.post(f"/projects/{project_id}/epics/generate", json={"constraints": "", "count": 2}, headers=headers)
+    assert res.status_code == 201, res.text
+    batch_id = res.json()["batch_id"]
+    epic_id = res.json()["epics"][0]["id"]
+    res = client.post(f"/projects/{project_id}/epics/{batch_id}/approve", json={"approve_all": True}, headers=headers)
+    assert res.status_code == 200, res.text
+
+    with client.websocket_connect(f"/ws/projects/{project_id}/stories?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ws.connected"
+        ws.send_json({"type": "stories.generate", "epic_id": epic_id, "count": 3})
+
+        partial_indexes: list[int] = []
+        summary = None
+        for _ in range(30):
+            msg = ws.receive_json()
+            if msg.get("event_type") == "stories.partial":
+                partial_indexes.append(msg["payload"]["index"])
+            if msg.get("type") == "stories.batch.summary":
+                summary = msg
+                break
+
+        assert summary is not None
+        assert len(summary["stories"]) == 3
+        assert partial_indexes == [0, 1, 2]
@@ -30,3 +30,54 @@ def test_reject_corrupted_pdf(client):
     files = {"file": ("bad.pdf", b"%PDF-1.4\nnotreally", "application/pdf")}
     r = client.post(f"/projects/{project_id}/documents", files=files, headers=headers)
     assert r.status_code == 400
+
+
+def _login_and_project(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "password123"})
+    r = client.post("/auth/login", data={"username": email, "password": "password123"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    r = client.post("/projects", json={"product_request": "X"}, headers=headers)
+    return headers, r.json()["id"]
+
+
+def test_pdf_upload_is_streamed_hashed_and_stored_by_content(client, monkeypatch):
+    import hashlib
+    from pypdf import PdfWriter
+
+    from app.services import storage
+
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_BYTES", 256)  # force many chunks
+    headers, project_id = _login_and_project(client, "u5@example.com")
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    buf = BytesIO()
+    writer.write(buf)
+    pdf = buf.getvalue()
+
+    r = client.post(f"/projects/{project_id}/documents", files={"file": ("spec.pdf", pdf, "application/pdf")}, headers=headers)
+    assert r.status_code == 201, r.text
+    assert r.json()["sha256"] == hashlib.sha256(pdf).hexdigest()
+    r = client.post(f"/projects/{project_id}/documents", files={"file": ("copy.pdf", pdf, "application/pdf")}, headers=headers)
+    assert r.status_code == 201, r.text
+
+    artifacts = client.get(f"/projects/{project_id}", headers=headers).json()["artifacts"]
+    assert {a["size_bytes"] for a in artifacts} == {len(pdf)}
+    [key] = {a["path"] for a in artifacts}  # identical uploads share one file
+    assert key == storage.blob_key(hashlib.sha256(pdf).hexdigest())
+    assert storage.get_storage().read_bytes(key) == pdf
+    assert not list((storage.get_settings().storage_root / ".staging").glob(".*.part"))  # no upload temp files left behind
+
+
+def test_reject_oversized_pdf_while_streaming(client, monkeypatch):
+    from app.services import storage
+
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_BYTES", 64 * 1024)
+    headers, project_id = _login_and_project(client, "u6@example.com")
+
+    too_big = b"%PDF-1.4\n" + b"0" * (1024 * 1024)  # MAX_UPLOAD_MB=1 in tests
+    r = client.post(f"/projects/{project_id}/documents", files={"file": ("big.pdf", too_big, "application/pdf")}, headers=headers)
+    assert r.status_code == 400
+    assert "too large" in r.json()["detail"]
+
+    assert not list((storage.get_settings().storage_root / ".staging").glob(".*.part"))